@@ -0,0 +1,6 @@
+"""
+Micro-benchmarks for model operations. Run from project root, e.g.:
+
+    jython -m benchmarks.validate
+"""
+import my_project  # sets up paths to submodules
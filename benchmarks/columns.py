@@ -0,0 +1,47 @@
+"""
+Compares bulk operations on a model with and without GeometryColumns (which
+need NumPy): computing moved elements for a large selection of nested
+shapes, document bounding box and finding elements in a region. Elements
+have stable ids, so that moving doesn't have to update the children and the
+time goes into finding the containers among selected elements and moving them.
+"""
+from my_project.model import CanvasModel, Insert
+from my_project.model.elements import Rectangle
+from benchmarks.util import best_time
+
+
+COUNT = 20000
+GROUP = 10  # each group is a container followed by its children
+
+
+class _NullEventBus(object):
+    def dispatch(self, evt):
+        pass
+
+
+def build(geometry_columns):
+    model = CanvasModel(_NullEventBus(), stable_ids=True,
+                        geometry_columns=geometry_columns)
+    containers = [Rectangle(i, i, 50, 50) for i in range(0, COUNT, GROUP)]
+    model.commit([Insert(c) for c in containers])
+    model.commit([Insert(Rectangle(c.x + k, c.y, 5, 5, model.ref(c)))
+                  for c in containers for k in range(1, GROUP)])
+    return model
+
+
+def run():
+    print('{0} elements, {1} per container'.format(COUNT, GROUP))
+    print('{0:>12} {1:>14} {2:>14}'.format('operation', 'scan [ms]',
+                                           'columns [ms]'))
+    models = [build(False), build(True)]
+    for name, func in [
+            ('move', lambda m: m.move(list(m.elems), 3, 4)),
+            ('bounds', lambda m: m.bounds()),
+            ('overlapping', lambda m: m.elements_overlapping(0, 0, 500, 500)),
+    ]:
+        times = [best_time(lambda: func(m)) * 1000 for m in models]
+        print('{0:>12} {1:>14.2f} {2:>14.2f}'.format(name, *times))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,40 @@
+"""
+Compares inserting many Rectangles one changelist at a time (creating each
+element and Insert change, then committing them) with CanvasModel.insert_bulk
+given the same geometry in columns.
+"""
+from my_project.model import CanvasModel, Insert
+from my_project.model.elements import Rectangle
+from benchmarks.util import best_time
+
+
+COUNT = 100000
+
+
+class _NullEventBus(object):
+    def dispatch(self, evt):
+        pass
+
+
+def run():
+    xs = [float(i % 1000) * 10 for i in range(COUNT)]
+    ys = [float(i // 1000) * 10 for i in range(COUNT)]
+    ws = hs = [5.0] * COUNT
+
+    def commit():
+        model = CanvasModel(_NullEventBus())
+        model.commit([Insert(Rectangle(*xywh))
+                      for xywh in zip(xs, ys, ws, hs)])
+
+    def insert_bulk():
+        model = CanvasModel(_NullEventBus())
+        model.insert_bulk(Rectangle, xs, ys, ws, hs)
+
+    print('{0} rectangles'.format(COUNT))
+    for name, func in [('commit', commit), ('insert_bulk', insert_bulk)]:
+        t = best_time(func, repeat=1)  # each run creates a whole model
+        print('{0:>12} {1:>10.0f} ms'.format(name, t * 1000))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,52 @@
+"""
+Measures how interning affects operations that run on every drag: moving a
+large Path step by step and moving many small Rectangles, with interning
+disabled, enabled and enabled with Paths interned as well (which they are
+not, since looking a Path up hashes all of its vertices).
+"""
+from my_project.model import elements
+from my_project.model.elements import Rectangle, Path, set_interning
+from benchmarks.util import best_time
+
+
+VERTICES = 100000  # vertices of the dragged path
+STEPS = 100  # drag steps
+COUNT = 20000  # number of moved rectangles
+
+
+def measure(path, rects):
+    def drag_path():
+        p = path
+        for _ in range(STEPS):
+            p = p.move(1, 1)
+
+    def move_rects():
+        for el in rects:
+            el.move(1, 1)
+
+    return best_time(drag_path) * 1000, best_time(move_rects) * 1000
+
+
+def run():
+    modes = [('disabled', False, False), ('enabled', True, False),
+             ('paths interned', True, True)]
+    print('path with {0} vertices moved {1} times, {2} rectangles moved '
+          'once'.format(VERTICES, STEPS, COUNT))
+    print('{0:>16} {1:>16} {2:>16}'.format('interning', 'drag path [ms]',
+                                           'rectangles [ms]'))
+    for name, enabled, paths in modes:
+        set_interning(enabled)
+        elements.Path._internable = paths
+        try:
+            parent = Rectangle(0, 0, 1000, 1000)
+            path = Path([(i, i % 7) for i in xrange(VERTICES)], parent)
+            rects = [Rectangle(i, i, 10, 10, parent) for i in xrange(COUNT)]
+            times = measure(path, rects)
+        finally:
+            elements.Path._internable = False
+            set_interning(False)
+        print('{0:>16} {1:>16.2f} {2:>16.2f}'.format(name, *times))
+
+
+if __name__ == '__main__':
+    run()
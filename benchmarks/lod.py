@@ -0,0 +1,142 @@
+"""
+Compares painting a large document zoomed out with and without level of
+detail in CanvasView: a grid of small Rectangles, Ellipses and Paths with
+Links between neighbours, painted off-screen into an image. Painting needs
+Jython, since the view is a Swing component; elsewhere only the number of
+elements that level of detail skips, draws as points, as boxes or in full
+at each zoom is reported (from elements' bounds, Links aren't counted).
+
+Level of detail is off in the view by default (see CanvasView.set_lod), the
+benchmark compares painting in full with the thresholds in LOD. Paint timings
+haven't been recorded yet, run the benchmark under Jython before enabling
+level of detail by default. Tier counts with LOD (0, 1, 4):
+
+      zoom    skipped     points      boxes       full
+       1.0          0          0          0      22500
+      0.25          0          0      22500          0
+      0.05          0      22500          0          0
+"""
+from my_project import model
+from my_project.model.columns import element_bounds
+from benchmarks.util import best_time
+try:
+    from java.awt.image import BufferedImage
+    from my_project.widgets.canvas.view import CanvasView
+    from my_project.widgets.canvas.elements import (RectangleCE, EllipseCE,
+                                                    PathCE, LinkCE)
+except ImportError:  # not running in Jython
+    CanvasView = None
+
+
+SIDE = 150  # elements in a row and column of the grid
+SPACING = 20
+WIDTH, HEIGHT = 1000, 800
+ZOOMS = (1.0, 0.25, 0.05)
+LOD = (0, 1, 4)  # thresholds compared with painting in full
+
+
+def elements():
+    """Returns list of grid's model elements, each Link after its targets."""
+    elems = []
+    prev = None
+    for i in range(SIDE * SIDE):
+        x, y = (i % SIDE) * SPACING, (i // SIDE) * SPACING
+        kind = i % 3
+        if kind == 0:
+            el = model.Rectangle(x, y, 8, 6)
+        elif kind == 1:
+            el = model.Ellipse(x, y, 6, 8)
+        else:
+            el = model.Path([(x, y), (x + 4, y + 8), (x + 8, y)])
+        elems.append(el)
+        if prev is not None and kind == 1:
+            elems.append(model.Link(prev, el))
+        prev = el
+    return elems
+
+
+def tiers(elems, zoom, lod):
+    """ Returns numbers of elements skipped, drawn as points, as boxes and
+        in full at given zoom, decided the same way as by CanvasView.
+    """
+    skip_size, point_size, box_size = lod
+    counts = [0, 0, 0, 0]
+    for el in elems:
+        bounds = element_bounds(el)
+        if bounds is None:
+            continue
+        x1, y1, x2, y2 = bounds
+        size = max(x2 - x1, y2 - y1) * zoom
+        if size >= box_size:
+            counts[3] += 1
+        elif size < skip_size:
+            counts[0] += 1
+        elif size < point_size:
+            counts[1] += 1
+        else:
+            counts[2] += 1
+    return counts
+
+
+def build(elems):
+    view = CanvasView(WIDTH, HEIGHT)
+    cels = {}
+    for el in elems:
+        if isinstance(el, model.Link):
+            a, b = cels[el.a], cels[el.b]
+            cel = LinkCE(el, a, b, view)
+        elif isinstance(el, model.Rectangle):
+            cel = RectangleCE(el, view)
+        elif isinstance(el, model.Ellipse):
+            cel = EllipseCE(el, view)
+        else:
+            cel = PathCE(el, view)
+        cels[el] = cel
+        view.add(cel)
+    return view
+
+
+def paint(view, image):
+    view.invalidate_layer()  # static elements are rendered again
+    g = image.createGraphics()
+    try:
+        view.paintComponent(g)
+    finally:
+        g.dispose()
+
+
+def run_tiers(elems, lod):
+    print('{0} elements, level of detail {1}'.format(len(elems), lod))
+    print('{0:>6} {1:>10} {2:>10} {3:>10} {4:>10}'.format(
+        'zoom', 'skipped', 'points', 'boxes', 'full'))
+    for zoom in ZOOMS:
+        print('{0:>6} {1:>10} {2:>10} {3:>10} {4:>10}'.format(
+            zoom, *tiers(elems, zoom, lod)))
+
+
+def run():
+    elems = elements()
+    if CanvasView is None:
+        run_tiers(elems, LOD)
+        print('painting needs Jython, run it there to get timings')
+        return
+    view = build(elems)
+    run_tiers(elems, LOD)
+    image = BufferedImage(WIDTH, HEIGHT, BufferedImage.TYPE_INT_RGB)
+    print('{0} elements, {1}x{2} px'.format(len(view._elems), WIDTH, HEIGHT))
+    print('{0:>6} {1:>14} {2:>14} {3:>12}'.format('zoom', 'full [ms]',
+                                                  'lod [ms]', 'simplified'))
+    zoom = 1.0
+    for target in ZOOMS:
+        view.zoom_by(target / zoom)
+        zoom = target
+        times = []
+        for lod in [(0, 0, 0), LOD]:
+            view.set_lod(*lod)
+            times.append(best_time(lambda: paint(view, image)) * 1000)
+        print('{0:>6} {1:>14.2f} {2:>14.2f} {3:>12}'.format(
+            zoom, times[0], times[1], view.paint_stats['simplified']))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,69 @@
+"""
+Measures the cost of Record operations that model code relies on: creating
+elements, hashing them (dict and set lookups), comparing them and making
+modified copies. Elements are nested so that hashing and comparing would
+have to walk the whole parent chain if hashes weren't cached.
+"""
+from my_project.model.elements import Rectangle
+from benchmarks.util import best_time
+
+
+COUNT = 20000
+DEPTH = 20  # number of ancestors of each measured element
+
+
+def nested(depth):
+    el = None
+    for i in range(depth):
+        el = Rectangle(i, i, 100, 100, el)
+    return el
+
+
+def run():
+    parent = nested(DEPTH)
+    elems = [Rectangle(i, i, 10, 10, parent) for i in range(COUNT)]
+    copies = [Rectangle(i, i, 10, 10, nested(DEPTH))
+              for i in range(0, COUNT, 100)]
+    lookup = dict((el, i) for i, el in enumerate(elems))
+
+    def create():
+        for i in xrange(COUNT):
+            Rectangle(i, i, 10, 10, parent)
+
+    def hash_all():
+        for el in elems:
+            hash(el)
+
+    def lookup_all():
+        for el in elems:
+            lookup[el]
+
+    def compare_all():
+        for a, b in zip(elems, elems[1:]):
+            a == b
+
+    def compare_equal_copies():
+        for el in copies:
+            el == elems[int(el.x)]
+
+    def replace_all():
+        for el in elems:
+            el._replace(x=-1)
+
+    print('{0} elements with {1} ancestors'.format(COUNT, DEPTH))
+    print('{0:>24} {1:>10} {2:>12}'.format('operation', 'total [ms]',
+                                           'per op [us]'))
+    for name, func, count in [('create', create, COUNT),
+                              ('hash', hash_all, COUNT),
+                              ('dict lookup', lookup_all, COUNT),
+                              ('compare different', compare_all, COUNT - 1),
+                              ('compare equal copies', compare_equal_copies,
+                               len(copies)),
+                              ('_replace', replace_all, COUNT)]:
+        t = best_time(func)
+        print('{0:>24} {1:>10.2f} {2:>12.2f}'.format(
+            name, t * 1000, t / count * 1000000))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,22 @@
+"""Helpers shared by the benchmarks."""
+import gc
+import time
+
+
+REPEAT = 3
+
+
+def best_time(func, repeat=REPEAT):
+    """ Calls *func* *repeat* times with garbage collection disabled and
+        returns the shortest time it took, in seconds.
+    """
+    times = []
+    gc.disable()  # collections triggered by other allocations add noise
+    try:
+        for _ in range(repeat):
+            start = time.time()
+            func()
+            times.append(time.time() - start)
+    finally:
+        gc.enable()
+    return min(times)
@@ -0,0 +1,35 @@
+"""
+Measures how long _validate takes for changelists of growing size against a
+model of fixed size. Time per change should stay roughly constant, meaning
+that validation scales linearly with the size of the changelist and doesn't
+depend on the size of the model.
+"""
+from my_project.model.CanvasModel import _validate
+from my_project.model.elements import Rectangle, Insert, Modify
+from my_project.model.store import ElementStore
+from benchmarks.util import best_time
+
+
+MODEL_SIZE = 20000
+CHANGELIST_SIZES = [1000, 2000, 4000, 8000, 16000]
+
+
+def run():
+    existing = ElementStore(Rectangle(i, i, 10, 10)
+                            for i in range(MODEL_SIZE))
+    print('model size: {0} elements'.format(MODEL_SIZE))
+    print('{0:>8} {1:>12} {2:>12} {3:>14}'.format(
+        'changes', 'insert [ms]', 'modify [ms]', 'per change [us]'))
+    for size in CHANGELIST_SIZES:
+        inserts = [Insert(Rectangle(-i, -i, 5, 5)) for i in range(1, size + 1)]
+        modifies = [Modify(el, el.move(0.5, 0.5))
+                    for _, el in zip(range(size), existing)]
+        t_ins = best_time(lambda: _validate(inserts, existing))
+        t_mod = best_time(lambda: _validate(modifies, existing))
+        print('{0:>8} {1:>12.2f} {2:>12.2f} {3:>14.2f}'.format(
+            size, t_ins * 1000, t_mod * 1000,
+            (t_ins + t_mod) / (2 * size) * 1000000))
+
+
+if __name__ == '__main__':
+    run()
@@ -1,8 +1,9 @@
 from java.awt import Color, BorderLayout
-from javax.swing import JFrame, JPanel, BoxLayout
+from javax.swing import JFrame, JPanel, BoxLayout, Timer
 from javautils import invokeLater
 import widgets
-from model import CanvasModel, Rectangle, Ellipse
+from model import (CanvasModel, Journal, Autosave, write_binary, Rectangle,
+                   Ellipse, set_interning)
 from hsmpy import HSM, EventBus, State, Initial, T
 from events import Undo_Requested, Redo_Requested
 import logging
@@ -16,6 +17,22 @@ project in a good shape.
 
 logging.basicConfig(level=logging.INFO)
 
+# share single instance among equal elements, see model.set_interning;
+# off until a measurement shows it pays off
+INTERN_ELEMENTS = False
+
+# undo history budget, oldest changes are forgotten when exceeded
+HISTORY_MAX_ENTRIES = 1000
+HISTORY_MAX_BYTES = 64 * 1024 * 1024
+
+# when set, drawing is loaded from this file and every change is appended to it
+DOCUMENT_PATH = None
+
+# when set, drawing is periodically saved to this file in binary format
+AUTOSAVE_PATH = None
+AUTOSAVE_INTERVAL = 30  # seconds
+AUTOSAVE_MAX_CHANGES = 100
+
 
 class LoggingState(State):
     def enter(self, hsm):
@@ -45,8 +62,26 @@ class AppFrame(JFrame):
 @invokeLater
 def run():
     eventbus = EventBus()
-    canvas_model = CanvasModel(eventbus)
-    canvas_model.elems = [Ellipse(20, 30, 40, 50), Rectangle(30, 40, 10, 20)]
+    set_interning(INTERN_ELEMENTS)
+    canvas_model = CanvasModel(eventbus,
+                               max_history_entries=HISTORY_MAX_ENTRIES,
+                               max_history_bytes=HISTORY_MAX_BYTES,
+                               max_catchup_entries=HISTORY_MAX_ENTRIES)
+    default_elems = [Ellipse(20, 30, 40, 50), Rectangle(30, 40, 10, 20)]
+    if DOCUMENT_PATH:
+        journal = Journal(DOCUMENT_PATH)
+        canvas_model.elems = journal.load() or default_elems
+        journal.compact(canvas_model.elems)  # start session from snapshot
+        journal.attach(eventbus)
+    else:
+        canvas_model.elems = default_elems
+
+    if AUTOSAVE_PATH:
+        autosave = Autosave(canvas_model, eventbus,
+                            lambda elems: write_binary(AUTOSAVE_PATH, elems),
+                            AUTOSAVE_INTERVAL, AUTOSAVE_MAX_CHANGES)
+        # timer fires on EDT, same thread that changes the model
+        Timer(1000, lambda _: autosave.poll()).start()
 
     eventbus.register(Undo_Requested, lambda _: canvas_model.undo())
     eventbus.register(Redo_Requested, lambda _: canvas_model.redo())
@@ -1,29 +1,89 @@
 import logging
 _log = logging.getLogger(__name__)
 
-from ..util import duplicates
+import time
+from collections import deque
+from contextlib import contextmanager
+from ..util import remove_duplicates
 from ..events import Model_Changed
-from elements import Remove, Insert, Modify, _BaseElement, Link
+from elements import (Remove, Insert, Modify, _BaseElement, Link, Rectangle,
+                      Ellipse, Ref)
+from store import ElementStore
+from history import History, _normalize, estimate_size, LIST_SIZE
+from columns import (GeometryColumns, element_bounds, overlaps, encloses,
+                     fix_xywh_columns)
 
 
+# default number of recently applied changelists kept for catching up
+CATCHUP_ENTRIES = 1000
+
 
 class CanvasModel(object):
-    def __init__(self, eventbus):
-        self._elems = []
-        self._changelog = []
-        self._redolog = []
+    def __init__(self, eventbus, max_history_entries=None,
+                 max_history_bytes=None, coalesce_window=None,
+                 max_catchup_entries=CATCHUP_ENTRIES, stable_ids=False,
+                 geometry_columns=False, source=None):
+        """ Parameters
+            ----------
+            eventbus : EventBus
+                event bus on which to dispatch Model_Changed events
+            max_history_entries : int or None
+                maximum number of changelists kept for undo/redo
+            max_history_bytes : int or None
+                maximum estimated memory taken by changelists kept for
+                undo/redo, oldest are evicted when budget is exceeded
+            coalesce_window : Number or None
+                if given, changelists modifying same elements committed
+                within this many seconds one after another will be merged
+                into single undo entry, see *commit*
+            max_catchup_entries : int or None
+                maximum number of recently applied changelists kept for
+                *changes_since*, None means unlimited; their estimated size
+                is also kept within *max_history_bytes*
+            stable_ids : bool
+                if True, elements are given stable ids and should reference
+                their parent and link targets by Ref obtained from *ref*;
+                moving container element then changes just the container
+                instead of all of its descendants and links
+            geometry_columns : bool
+                whether to keep geometry of elements in GeometryColumns, so
+                that moving many elements and region queries are vectorized
+                at the cost of updating the columns on every commit;
+                requires NumPy, with *source* all of its elements get built
+            source : BinaryDocument or None
+                elements model starts with, which are built only when
+                they're needed (see ElementStore), e.g. when they're in
+                region given to *elements_overlapping* or get changed;
+                can't be used with *stable_ids*
+        """
+        self._elems = ElementStore(stable_ids=stable_ids, source=source)
+        self._columns = (GeometryColumns(self._elems)
+                         if geometry_columns else None)
+        self._history = History(max_history_entries, max_history_bytes)
         self._eb = eventbus
+        self._coalesce_window = coalesce_window
+        # (group, time, revision, changelog entry) of last Modify changelist
+        self._last_commit = None
+        self._pending = None  # changelists collected during transaction
+        self._savepoints = []  # len(_pending) when each transaction began
+        self._version = 0
+        self._applied = deque()  # (changelist, size) for catching up
+        self._applied_bytes = 0
+        self._max_catchup_entries = max_catchup_entries
 
     @property
     def elems(self):
         """
-            Returns list of all elements in model.
-
-            Modifications of the list will be ignored since this method will
-            return a copy of the list - changes have to be done through
-            *commit* method by submitting a changelist.
+            Returns read-only sequence (ElementsView) of all elements in
+            model, in paint order.
+
+            View is created in constant time without copying the elements
+            and membership testing takes constant time. It keeps showing the
+            elements as they were when it was obtained even after the model
+            changes. Changes have to be done through *commit* method by
+            submitting a changelist.
         """
-        return self._elems[:]
+        return self._elems.view()
 
     @elems.setter
     def elems(self, new_elems):
@@ -31,16 +91,90 @@ class CanvasModel(object):
             Clears the model and sets new elements.
 
             Model will create a changelist containing both old (removed) and
-            new elements and inform listeners with it.
+            new elements and inform listeners with it. Elements that are
+            already in the model in the same order as the leading new
+            elements are left in place. Elements that only change their
+            position have to leave the model before being inserted again,
+            they're removed by a separate changelist committed first (so
+            undo takes two steps then). If new elements turn out to be
+            invalid then, that removal is undone, which puts the removed
+            elements back at the end of paint order.
+
+            Raises
+            ------
+            ValueError if new elements are invalid, or if the order of
+            elements changes while in transaction
         """
-        # make a changelist with elements to be removed
-        old_changes = [Remove(old) for old in self._elems]
-        new_changes = [Insert(new) for new in new_elems]
-        self.commit(old_changes + new_changes)
+        old_elems, new_elems = list(self._elems), list(new_elems)
+        # longest prefix of new elements that are already in model in same
+        # order, those can stay where they are
+        staying = 0
+        for el in old_elems:
+            if staying < len(new_elems) and el == new_elems[staying]:
+                staying += 1
+        kept = set(new_elems[:staying])
+        removed = [Remove(el) for el in old_elems if el not in kept]
+        reordered = set(new_elems) & set(ch.elem for ch in removed)
+        if reordered:
+            # removing and inserting the same element would cancel out
+            if self.in_transaction:
+                raise ValueError("Cannot reorder elements in transaction")
+            self.commit(removed)
+            removed = []
+        try:
+            with self.transaction():
+                self.commit(removed)
+                self.commit([Insert(new) for new in new_elems[staying:]])
+        except ValueError:
+            if reordered:  # nothing gets set, bring removed elements back
+                self.undo()
+            raise
+
+    def snapshot(self):
+        """ Returns immutable tuple of all elements in model, in paint order.
+
+            Snapshot is a copy of the elements (the elements themselves are
+            shared), so it can be safely passed to other threads (e.g. for
+            saving) while model keeps being changed. Copying takes time
+            proportional to number of elements (and builds all elements
+            still in model's source); it's done on first call after each
+            change, following calls return the same tuple.
+        """
+        return self._elems.snapshot()
+
+    @property
+    def _changelog(self):
+        return self._history.changelog
+
+    @property
+    def _redolog(self):
+        return self._history.redolog
 
-    def commit(self, changes):
+    @property
+    def history_footprint(self):
+        """ Returns dict with number of changelists kept in history
+            ('entries'), their estimated size ('bytes') and number of
+            changelists evicted so far ('evicted').
+        """
+        return self._history.footprint
+
+    def commit(self, changes, group=None):
         """ Updates elems, appends changes to changelog, clears redo log
             and notifies listeners.
+
+            Changelist containing only Modify changes is merged with previous
+            changelist (instead of being appended to changelog as a separate
+            entry) if previous one modified elements into exactly those that
+            are being modified now and either:
+              * both were committed with the same *group* (not None), or
+              * no group was given and they were committed within model's
+                coalesce window
+            Merged changelog entry keeps only the first and the last state of
+            elements, so undo reverts all of the merged changes at once.
+            Listeners are notified about each commit as usual.
+
+            When called within transaction, changes are only collected and
+            will be committed when outermost transaction is committed.
         """
         _log.info('Model got changelist {0}'.format(
             ''.join(['\n * ' + str(ch) for ch in changes])))
@@ -48,39 +182,392 @@ class CanvasModel(object):
         if not changes:  # skip empty changelist
             return
 
-        _commit(changes, self._changelog, self._eb, self._elems)
-        self._redolog = []
+        if self.in_transaction:
+            self._pending.append(list(changes))
+            return
 
+        coalesce = self._can_coalesce(changes, group)
+        _commit(changes, self._changelog, self._eb, self._elems,
+                on_applied=self._applied_changes)
+        kept = self._history.committed(merge=coalesce,
+                                       size=self._applied[-1][1])
+        if kept and all(isinstance(ch, Modify) for ch in changes):
+            self._last_commit = (group, time.time(), self.revision,
+                                 self._changelog[-1])
+        else:  # merged changes might have cancelled out, nothing to merge to
+            self._last_commit = None
+
+    def _can_coalesce(self, changes, group):
+        if self._last_commit is None or not self._changelog:
+            return False
+        last_group, last_time, last_revision, last_entry = self._last_commit
+        # entry might have been undone, evicted or merged away meanwhile
+        if (last_revision != self.revision
+                or self._changelog[-1] is not last_entry):
+            return False
+        if group is not None or last_group is not None:
+            if group != last_group:
+                return False
+        elif (self._coalesce_window is None
+              or time.time() - last_time > self._coalesce_window):
+            return False
+        previous = self._changelog[-1]
+        if not all(isinstance(ch, Modify) for ch in list(changes) + previous):
+            return False
+        return (set(ch.modified for ch in previous)
+                == set(ch.elem for ch in changes))
+
+    @property
+    def in_transaction(self):
+        return self._pending is not None
+
+    def begin_transaction(self):
+        """ Starts collecting changelists passed to *commit* instead of
+            committing them one by one. Transactions can be nested, changes
+            are committed when outermost transaction is committed.
+
+            Model elements are not changed until then, so changelists in
+            transaction must be computed by the caller (e.g. inserting and
+            then modifying same element is fine) rather than by reading the
+            model in between.
+        """
+        if self._pending is None:
+            self._pending = []
+        self._savepoints.append(len(self._pending))
+
+    def commit_transaction(self):
+        """ Ends the innermost transaction. If it was the outermost one, all
+            collected changelists are merged into a single net changelist
+            which is validated, applied and appended to changelog as a single
+            entry, and listeners are notified once.
+
+            Changelist may contain mixed change types. If validation fails
+            nothing gets committed and ValueError is raised.
+        """
+        if not self._savepoints:
+            raise ValueError("Not in transaction")
+        self._savepoints.pop()
+        if self._savepoints:
+            return  # nested, outer transaction will commit
+        pending, self._pending = self._pending, None
+        changes = _normalize(pending)
+        if not changes:  # changes cancelled each other out
+            return
+        _commit(changes, self._changelog, self._eb, self._elems,
+                allow_mixed=True, on_applied=self._applied_changes)
+        self._history.committed(size=self._applied[-1][1])
+        self._last_commit = None
+
+    def rollback_transaction(self):
+        """Discards changelists collected since innermost transaction began."""
+        if not self._savepoints:
+            raise ValueError("Not in transaction")
+        del self._pending[self._savepoints.pop():]
+        if not self._savepoints:
+            self._pending = None
+
+    @contextmanager
+    def transaction(self):
+        """ Context manager that commits the transaction on exit, or rolls it
+            back if exception was raised.
+        """
+        self.begin_transaction()
+        try:
+            yield self
+        except:
+            self.rollback_transaction()
+            raise
+        self.commit_transaction()
+
+    def insert_bulk(self, kind, xs, ys, ws, hs, parents=None):
+        """ Creates many Rectangles or Ellipses from columns of values and
+            inserts them at once, e.g. when generating large diagrams.
+
+            Geometry is fixed the same way as when creating elements one by
+            one (see fix_xywh). Whole input is validated at once instead of
+            change by change, elements are committed as a single changelist
+            (so undo removes all of them) and listeners are notified with a
+            single Model_Changed event.
+
+            Parameters
+            ----------
+            kind : Rectangle or Ellipse
+                class of elements to create
+            xs, ys, ws, hs : sequences or arrays of Numbers
+                positions and dimensions of elements, all of same length
+            parents : sequence or None
+                parent of each element (element in model, Ref to it or
+                None), None means that elements have no parents; when
+                keeping stable ids, elements are replaced by Refs to them
+
+            Returns
+            -------
+            list of inserted elements, in order of given values
+
+            Raises
+            ------
+            ValueError if some value is invalid, some parent is not in model
+            or some elements would be equal to each other or to an element
+            already in model; nothing gets inserted then
+        """
+        if kind not in (Rectangle, Ellipse):
+            raise ValueError("Only Rectangles and Ellipses can be inserted "
+                             "in bulk")
+        geometry = fix_xywh_columns(xs, ys, ws, hs)
+        n = len(geometry[0])
+        if parents is None:
+            parents = [None] * n
+        elif len(parents) != n:
+            raise ValueError("Parents and geometry must have same length")
+        is_parent = lambda p: (p in self._elems
+                               and not isinstance(self.resolve(p), Link))
+        if not all(p is None or is_parent(p) for p in set(parents)):
+            raise ValueError(_PARENT)
+        if self._elems.stable_ids:  # store indexes children by Ref
+            refs = dict((p, self.ref(p)) for p in set(parents)
+                        if p is not None and not isinstance(p, Ref))
+            parents = [refs.get(p, p) for p in parents]
+        fields = dict(zip(('x', 'y', 'width', 'height'), geometry),
+                      parent=parents)
+        elems = [kind._make(values)
+                 for values in zip(*[fields[k] for k in kind._keys])]
+        unique = set(elems)
+        if len(unique) != n:
+            raise ValueError(_DUP_INS)
+        if any(el in self._elems for el in unique):
+            raise ValueError(_INS_IN)
+
+        _log.info('Model got {0} {1}s to insert in bulk'.format(
+            n, kind.__name__))
+        if not elems:
+            return elems
+        changes = [Insert._make((el,)) for el in elems]
+        if self.in_transaction:
+            self._pending.append(changes)
+            return elems
+
+        for el in elems:
+            self._elems.append(el)
+        self._changelog.append(changes)
+        # all changes have same size, no need to estimate each of them
+        size = LIST_SIZE + n * (estimate_size(changes[:1]) - LIST_SIZE)
+        self._applied_changes(changes, geometry, size)
+        self._eb.dispatch(Model_Changed(changes[:]))
+        self._history.committed(size=size)
+        self._last_commit = None
+        return elems
 
     def move(self, what, dx, dy):
         """ Move element(s) by given offset. Doesn't commit!
             Returns changelist that has to be committed manually.
         """
-        return _move(what, dx, dy, self._elems)
+        return _move(what, dx, dy, self._elems, self._columns)
+
+    def bounds(self):
+        """ Returns bounding box (x1, y1, x2, y2) around all elements except
+            Links, which is (inf, inf, -inf, -inf) if there are none.
+        """
+        if self._columns is not None:
+            return self._columns.bounds()
+        boxes = [b for b in map(element_bounds, self._elems) if b]
+        inf = float('inf')
+        return (min([b[0] for b in boxes] or [inf]),
+                min([b[1] for b in boxes] or [inf]),
+                max([b[2] for b in boxes] or [-inf]),
+                max([b[3] for b in boxes] or [-inf]))
+
+    def elements_overlapping(self, x1, y1, x2, y2):
+        """ Returns list of elements (in paint order, Links excluded) whose
+            bounding box overlaps given rectangle.
+        """
+        if self._columns is not None:
+            return self._columns.overlapping(x1, y1, x2, y2)
+        return [el for el in self._elems.elements_near(x1, y1, x2, y2)
+                if _overlaps(el, x1, y1, x2, y2)]
+
+    def elements_enclosed(self, x1, y1, x2, y2):
+        """ Returns list of elements (in paint order, Links excluded) whose
+            bounding box is completely within given rectangle.
+        """
+        if self._columns is not None:
+            return self._columns.enclosed(x1, y1, x2, y2)
+        return [el for el in self._elems.elements_near(x1, y1, x2, y2)
+                if _enclosed(el, x1, y1, x2, y2)]
+
+    @property
+    def stable_ids(self):
+        return self._elems.stable_ids
+
+    def ref(self, elem):
+        """ Returns what new elements should use to reference given element
+            as their parent or link target: Ref when model keeps stable ids,
+            element itself otherwise.
+
+            Raises
+            ------
+            ValueError if element is not in model
+        """
+        return self._elems.ref(elem)
+
+    def resolve(self, elem):
+        """ Returns current element referenced by parent or link target, which
+            is either Ref or element itself. Returns None for Ref to element
+            that's not in model.
+        """
+        return self._elems.resolve(elem)
+
+    def get_links_for(self, elem):
+        """Returns list of Links starting or ending at given element."""
+        return get_links_for(elem, self._elems)
+
+    def get_links_between(self, a, b):
+        """Returns list of Links connecting given elements in any direction."""
+        return get_links_between(a, b, self._elems)
+
+    def get_children(self, parent):
+        """Returns list of elements directly nested in given element."""
+        return self._elems.children_of(parent)
+
+    def get_descendants(self, parent):
+        """Returns list of elements nested in given element on any depth."""
+        return self._elems.descendants(parent)
 
     def undo(self):
-        _undo(self._changelog, self._redolog, self._eb, self._elems)
+        if self.in_transaction:
+            raise ValueError("Cannot undo while in transaction")
+        self._last_commit = None
+        _undo(self._changelog, self._redolog, self._eb, self._elems,
+              self._applied_changes)
 
     def redo(self):
-        _redo(self._changelog, self._redolog, self._eb, self._elems)
+        if self.in_transaction:
+            raise ValueError("Cannot redo while in transaction")
+        self._last_commit = None
+        _redo(self._changelog, self._redolog, self._eb, self._elems,
+              self._applied_changes)
+
+    @property
+    def revision(self):
+        """ Returns current position in history, the number of committed
+            changelists that are not undone (evicted ones included).
+        """
+        return self._history.revision
+
+    def goto_revision(self, revision):
+        """ Undoes or redoes as many changelists as needed to get to given
+            revision, applying their net effect to model at once and
+            notifying listeners only once.
+
+            Raises
+            ------
+            ValueError if revision is not available in history
+        """
+        if self.in_transaction:
+            raise ValueError("Cannot change revision while in transaction")
+        self._last_commit = None
+        changes = self._history.goto(revision)
+        if not changes:
+            return
+        _update_model_elements(changes, self._elems)
+        self._applied_changes(changes)
+        self._eb.dispatch(Model_Changed(changes[:]))
+
+    @property
+    def version(self):
+        """ Returns number of changelists applied to model so far, including
+            undone and redone ones.
+
+            Unlike *revision*, which is the position in history and goes back
+            on undo, version only ever grows: it's incremented every time the
+            elements change and listeners are notified with Model_Changed.
+        """
+        return self._version
+
+    def changes_since(self, version):
+        """ Returns net changelist that brings elements as they were at given
+            version up to date, e.g. for a listener that missed some
+            Model_Changed events. Changes cancelling each other out are
+            dropped and chained changes merged, so the changelist never
+            contains more changes than the changelists it's made of.
+
+            Raises
+            ------
+            ValueError if version is newer than current one or so old that
+            changelists since then are no longer kept (see
+            *max_catchup_entries*), in which case consumer has to start over
+            from *elems*
+        """
+        oldest = self._version - len(self._applied)
+        if not oldest <= version <= self._version:
+            raise ValueError("Changes since version {0} are not available, "
+                             "available are since {1} to {2}".format(
+                                 version, oldest, self._version))
+        missed = self._version - version
+        recent = list(self._applied)[len(self._applied) - missed:]
+        return _normalize(cl for cl, _ in recent)
+
+    def _applied_changes(self, changes, geometry=None, size=None):
+        """ Records changelist that was applied to elements. *geometry* is
+            tuple (xs, ys, ws, hs) of elements if all changes are their
+            inserts, which lets columns add them at once. *size* is
+            changelist's estimated size if caller already knows it.
+        """
+        self._version += 1
+        if size is None:
+            size = estimate_size(changes)
+        self._applied.append((changes[:], size))
+        self._applied_bytes += size
+        # same byte budget as history, the newest changelist is always kept
+        max_entries = self._max_catchup_entries
+        max_bytes = self._history.max_bytes
+        over_budget = lambda: (
+            (max_entries is not None and len(self._applied) > max_entries)
+            or (max_bytes is not None and self._applied_bytes > max_bytes))
+        while len(self._applied) > 1 and over_budget():
+            self._applied_bytes -= self._applied.popleft()[1]
+        if self._columns is None:
+            return
+        if geometry is not None:
+            self._columns.extend([ch.elem for ch in changes], *geometry)
+        else:
+            self._columns.apply(changes)
+
+
+def _overlaps(elem, x1, y1, x2, y2):
+    bounds = element_bounds(elem)
+    return bounds is not None and overlaps(bounds, x1, y1, x2, y2)
+
+
+def _enclosed(elem, x1, y1, x2, y2):
+    bounds = element_bounds(elem)
+    return bounds is not None and encloses(x1, y1, x2, y2, bounds)
 
 
 
 def _update_model_elements(changes, model_elements):
-    """Modifies model elements list according to given changes."""
+    """ Modifies model elements according to given changes.
+
+        *model_elements* is either an ElementStore, which is updated in
+        constant time per change, or a plain list.
+    """
     # TODO: maybe move to each element
+    is_store = isinstance(model_elements, ElementStore)
     for ch in changes:
         if isinstance(ch, Remove):
             model_elements.remove(ch.elem)
         elif isinstance(ch, Insert):
-            model_elements += [ch.elem]
+            model_elements.append(ch.elem)
         elif isinstance(ch, Modify):
-            model_elements[model_elements.index(ch.elem)] = ch.modified
+            if is_store:
+                model_elements.replace(ch.elem, ch.modified)
+            else:
+                model_elements[model_elements.index(ch.elem)] = ch.modified
         else:
             assert False, "this cannot happen"
 
 
-def _commit(changes, changelog, eb, existing):
+def _commit(changes, changelog, eb, existing, allow_mixed=False,
+            on_applied=None):
     """ Validates the changes and commits them to model, changing model elems.
 
         Commit performs following actions:
@@ -97,8 +584,14 @@ def _commit(changes, changelog, eb, existing):
             list to append changes to
         eb : EventBus
             event bus on which to dispatch Model_Changed event
-        existing : list
+        existing : ElementStore or list
             elements currently in the model, used for validating
+        allow_mixed : bool
+            whether changes of different types are allowed, passed to
+            _validate
+        on_applied : callable or None
+            called with changes after they've been applied to model elems,
+            before listeners are notified
 
         Returns
         -------
@@ -108,12 +601,14 @@ def _commit(changes, changelog, eb, existing):
         ------
         ValueError if validation fails
     """
-    _validate(changes, existing)
+    _validate(changes, existing, allow_mixed)
 
     _update_model_elements(changes, existing)
 
     # changelog items are lists of changes, wrap in additional list
     changelog += [changes[:]]
+    if on_applied is not None:
+        on_applied(changes)
     eb.dispatch(Model_Changed(changes[:]))
 
 
@@ -122,40 +617,69 @@ def _invert(changelist):
     return [ch.inverse for ch in changelist]
 
 
-def _undo(change_log, redo_log, eb, existing):
+def _undo(change_log, redo_log, eb, existing, on_applied=None):
     """ Undoes last changelist in change_log, removes it from change_log and
-        prepends it to redo_log, and notifies the listeners.
+        pushes it on top of redo_log stack, and notifies the listeners.
+        *on_applied* is called with the applied changelist before listeners
+        are notified.
     """
     if not change_log:
         return  # nothing to do
 
     cl = change_log.pop()
-    redo_log.insert(0, cl)
+    redo_log.append(cl)
     undo_cl = _invert(cl)
     _update_model_elements(undo_cl, existing)
+    if on_applied is not None:
+        on_applied(undo_cl)
     eb.dispatch(Model_Changed(undo_cl))
 
 
-def _redo(change_log, redo_log, eb, existing):
-    """ Redoes first changelist in redo_log, pops it from redo_log and appends
-        it to change_log, and notifies the listeners.
+def _redo(change_log, redo_log, eb, existing, on_applied=None):
+    """ Redoes changelist on top of redo_log stack, pops it from redo_log and
+        appends it to change_log, and notifies the listeners. *on_applied*
+        is called with the applied changelist before listeners are notified.
     """
     if not redo_log:
         return  # nothing to do
 
-    cl = redo_log.pop(0)
+    cl = redo_log.pop()
     change_log.append(cl)
     _update_model_elements(cl, existing)
+    if on_applied is not None:
+        on_applied(cl)
     eb.dispatch(Model_Changed(cl[:]))
 
 
-def _move(what, dx, dy, existing):
+def get_links_for(elem, existing):
+    """ Returns list of Links from *existing* that start or end at *elem*, in
+        the order they appear in *existing*.
+
+        Uses ElementStore's link index if *existing* is one, otherwise scans.
+    """
+    if isinstance(existing, ElementStore):
+        return existing.links_for(elem)
+    return [l for l in existing
+            if isinstance(l, Link) and (l.a == elem or l.b == elem)]
+
+
+def get_links_between(a, b, existing):
+    """ Returns list of Links from *existing* that connect elements *a* and
+        *b* in either direction, in the order they appear in *existing*.
+    """
+    ends = set([a, b])
+    return [l for l in get_links_for(a, existing) if set([l.a, l.b]) == ends]
+
+
+def _move(what, dx, dy, existing, geometry=None):
     """ Returns changelist that'll cause elements to be moved when committed.
 
         Note that number of changed elements might be larger than number of
         elements requested to be moved, e.g. when moving linked element, link
         will be changed also, or when moving an element that contains children
         elements, all of the children (and grandchildren) will be changed also.
+        That's not the case when *existing* keeps stable ids, children and
+        links reference moved elements by Ref and stay unchanged.
 
         Parameters
         ----------
@@ -166,8 +690,12 @@ def _move(what, dx, dy, existing):
         dy : Number
             vertical offset by which to move element(s)
 
-        existing : list/set
-            elements currently in model, needed for finding children and links
+        existing : ElementStore or list
+            elements currently in model, needed for finding children and
+            links; lists are indexed into temporary ElementStore
+        geometry : GeometryColumns or None
+            columns kept in sync with *existing*, if given (and all elements
+            are in them) nested elements are found and moved vectorized
 
         Returns
         -------
@@ -185,61 +713,98 @@ def _move(what, dx, dy, existing):
     is_elem = lambda e: isinstance(e, _BaseElement) and not isinstance(e, Link)
     assert all(is_elem(el) for el in what), "elements only (but not links)"
 
-    def get_parents(el):
-        if el.parent is None:
-            return []
-        return [el.parent] + get_parents(el.parent)
-
-    # TODO: slow and wasteful, optimize
-    def get_children(par):
-        #return [el for el in existing if par in get_parents(el)]
-        return [el for el in existing if el.parent == par]
+    if not isinstance(existing, ElementStore):
+        existing = ElementStore(existing)  # index children and links
 
     # children won't be moved, just updated to point to new parents
     # roots will have updated coordinates, and their children updated
-    parent_also_moved = lambda el: any(p in what for p in get_parents(el))
-    roots = [el for el in what if not parent_also_moved(el)]
+    if geometry is not None and all(el in geometry for el in what):
+        roots = geometry.roots(what)
+        roots = zip(roots, geometry.moved(roots, dx, dy))
+    else:  # some of the elements are not in columns
+        moved = set(what)
+        parent_also_moved = lambda el: any(p in moved
+                                           for p in existing.ancestors(el))
+        roots = [(r, r.move(dx, dy)) for r in what
+                 if not parent_also_moved(r)]
 
     def update_children(old_parent, new_parent):
-        orig_ch = get_children(old_parent)
-        ch_pairs = [(ch, ch._replace(parent=new_parent)) for ch in orig_ch]
-        gr_pairs = [g for o, n in ch_pairs for g in update_children(o, n)]
-        return ch_pairs + gr_pairs  # children and grandchildren pairs
-
-    roots = [(r, r.move(dx, dy)) for r in roots]
+        pairs = []
+        pending = [(old_parent, new_parent)]
+        while pending:  # iterative, deep hierarchies won't hit recursion limit
+            old_par, new_par = pending.pop()
+            for ch in existing.children_of(old_par):
+                pair = (ch, ch._replace(parent=new_par))
+                pairs.append(pair)
+                pending.append(pair)
+        return pairs  # children and grandchildren pairs
+
+    if existing.stable_ids:  # references resolve to moved elements
+        return [Modify(old, new) for old, new in roots]
     children = [pair for o, n in roots for pair in update_children(o, n)]
     all_elems = roots + children
     all_elems_dict = dict(all_elems)
-    orig_elems = all_elems_dict.keys()
 
     def updated_link(lnk):
-        a = lnk.a in orig_elems
-        b = lnk.b in orig_elems
-        if a and b:
-            return lnk._replace(a=all_elems_dict[lnk.a],
-                                b=all_elems_dict[lnk.b])
-        elif a:
-            return lnk._replace(a=all_elems_dict[lnk.a])
-        elif b:
-            return lnk._replace(b=all_elems_dict[lnk.b])
-        return None
-
-    links = [(l, updated_link(l)) for l in existing if isinstance(l, Link)]
-    links = [pair for pair in links if pair[1] is not None]
+        return lnk._replace(a=all_elems_dict.get(lnk.a, lnk.a),
+                            b=all_elems_dict.get(lnk.b, lnk.b))
+
+    # only links attached to changed elements need to be looked at
+    links = remove_duplicates(l for o, _ in all_elems
+                              for l in existing.links_for(o))
+    links = [(l, updated_link(l)) for l in links]
 
     return [Modify(old, new) for old, new in all_elems + links]
 
 
 
-def _validate(changelist, existing):
+# validation errors in order of precedence, when changelist has multiple
+# problems the error listed first is the one that will be raised
+_INVALID_ELEMS = "Changes with invalid elements in changelist"
+_MIXED = "Mixed change types not allowed in same changelist"
+_NO_CHANGES = "Modifying without actual changes"
+_OLD_NOT_IN = "Changing element that's not in the model"
+_RMV_NOT_IN = "Removing element that's not in the model"
+_MOD_IN = "Changing into element that's already in model"
+_INS_IN = "Inserting element already present in the model"
+_DUP_RMV = "Removing same element multiple times"
+_DUP_MOD = "Modifying same element multiple times"
+_DUP_INS = "Inserting same element multiple times"
+_RMV_INS = "Removing and inserting same element"
+_RMV_MOD = "Removing and changing same element"
+_INS_MOD = "Changing and inserting identical elements"
+_NOT_REF = "Parents and link targets must be Refs when keeping stable ids"
+_PARENT = "Element's parent must be member of same model"
+_INS_LINK = "Link's targets must be member of same model"
+_MOD_LINK = "Modified link's targets must be in same model"
+
+_VALIDATION_ERRORS = (
+    _MIXED, _INVALID_ELEMS, _NO_CHANGES, _OLD_NOT_IN, _RMV_NOT_IN, _MOD_IN,
+    _INS_IN, _DUP_RMV, _DUP_MOD, _DUP_INS, _RMV_INS, _RMV_MOD, _INS_MOD,
+    _NOT_REF, _PARENT, _INS_LINK, _MOD_LINK,
+)
+
+
+def _validate(changelist, existing, allow_mixed=False):
     """ Validates changes in changelist.
 
+        Changelist is traversed only once, every element is checked against
+        the model and against other changes using hashed lookups, so the cost
+        is proportional to the size of changelist when *existing* is an
+        ElementStore or a set.
+
         Parameters
         ----------
-        changelist : list/tuple/set
-            list of changes, all must be of same type
-        existing : list/tuple/set
-            elements currently in model
+        changelist : list/tuple
+            list of changes, all must be of same type unless *allow_mixed*
+        existing : ElementStore/list/tuple/set
+            elements currently in model, use ElementStore (or set) to get
+            constant time membership tests; when it's ElementStore keeping
+            stable ids, parents and link targets must be Refs
+        allow_mixed : bool
+            allow different change types in same changelist, each element
+            can still be affected by only one change; inserted elements can
+            then also be parents and link targets of other inserted elements
 
         Returns
         -------
@@ -252,71 +817,92 @@ def _validate(changelist, existing):
     if not changelist:
         raise ValueError("Empty changelist")
 
-    if not all(isinstance(c, (Modify, Remove, Insert)) for c in changelist):
-        raise ValueError("Invalid changes in changelist")
-
+    errors = set()
+    removed, inserted, old, modified = set(), set(), set(), set()
+    parents = []  # parents of all elements in changelist
+    ins_targets = []  # targets of inserted links
+    mod_targets = []  # targets of modified links
     cls = changelist[0].__class__
-    if not all(isinstance(c, cls) for c in changelist):
-        raise ValueError("Mixed change types not allowed in same changelist")
-
-    # TODO: simplify code below now that mixed changes are not allowed
-
-    to_remove = filter(lambda ch: isinstance(ch, Remove), changelist)
-    to_modify = filter(lambda ch: isinstance(ch, Modify), changelist)
-    to_insert = filter(lambda ch: isinstance(ch, Insert), changelist)
-
     is_elem = lambda e: isinstance(e, _BaseElement)
 
-    if not (all(is_elem(c.elem) for c in to_remove + to_insert) and
-            all(is_elem(m.elem) and is_elem(m.modified) for m in to_modify)):
-        raise ValueError("Changes with invalid elements in changelist")
-
-    # element have valid types at this point
-    # now validate element values
-
-    is_elem = lambda e: isinstance(e, _BaseElement) and not isinstance(e, Link)
-
-    if any(m.elem == m.modified for m in to_modify):
-        raise ValueError("Modifying without actual changes")
-
-    elems_old = [m.elem for m in to_modify]
-    elems_mod = [m.modified for m in to_modify]
-    elems_rmv = [r.elem for r in to_remove]
-    elems_ins = [i.elem for i in to_insert]
-    if not all(el in existing for el in elems_old):
-        raise ValueError("Changing element that's not in the model")
-    if not all(el in existing for el in elems_rmv):
-        raise ValueError("Removing element that's not in the model")
-    if any(el in existing for el in elems_mod):
-        raise ValueError("Changing into element that's already in model")
-    if any(el in existing for el in elems_ins):
-        raise ValueError("Inserting element already present in the model")
-
-    if duplicates(elems_rmv):
-        raise ValueError("Removing same element multiple times")
-    if duplicates(elems_old + elems_mod):
-        raise ValueError("Modifying same element multiple times")
-    if duplicates(elems_ins):
-        raise ValueError("Inserting same element multiple times")
-    if duplicates(elems_rmv + elems_ins):
-        raise ValueError("Removing and inserting same element")
-    if duplicates(elems_rmv + elems_old + elems_mod):
-        raise ValueError("Removing and changing same element")
-    if duplicates(elems_ins + elems_old + elems_mod):
-        raise ValueError("Changing and inserting identical elements")
-
-    elems_cur = elems_ins + elems_old + elems_rmv
-
-    parent_ok = lambda e: e.parent is None or (e.parent in existing
-                                               and is_elem(e.parent))
-    if not all(parent_ok(el) for el in elems_cur + elems_mod):
-        raise ValueError("Element's parent must be member of same model")
-
-    ins_links = [l for l in elems_ins if isinstance(l, Link)]
-    if not all(l.a in existing and l.b in existing for l in ins_links):
-        raise ValueError("Link's targets must be member of same model")
-
-    mod_links = [l for l in elems_mod if isinstance(l, Link)]
-    valid_target = lambda t: t in elems_mod or t in existing
-    if not all(valid_target(l.a) and valid_target(l.b) for l in mod_links):
-        raise ValueError("Modified link's targets must be in same model")
+    for ch in changelist:
+        if not isinstance(ch, (Modify, Remove, Insert)):
+            raise ValueError("Invalid changes in changelist")
+        if ch.__class__ is not cls and not allow_mixed:
+            errors.add(_MIXED)
+
+        el = ch.elem
+        if isinstance(ch, Modify):
+            mod = ch.modified
+            if not (is_elem(el) and is_elem(mod)):
+                errors.add(_INVALID_ELEMS)
+                continue
+            if el == mod:
+                errors.add(_NO_CHANGES)
+            if el not in existing:
+                errors.add(_OLD_NOT_IN)
+            if mod in existing:
+                errors.add(_MOD_IN)
+            if el in old or el in modified:
+                errors.add(_DUP_MOD)
+            old.add(el)
+            if mod in old or mod in modified:
+                errors.add(_DUP_MOD)
+            modified.add(mod)
+            parents += [el.parent, mod.parent]
+            if isinstance(mod, Link):
+                mod_targets += [mod.a, mod.b]
+        else:
+            if not is_elem(el):
+                errors.add(_INVALID_ELEMS)
+                continue
+            if isinstance(ch, Remove):
+                if el not in existing:
+                    errors.add(_RMV_NOT_IN)
+                if el in removed:
+                    errors.add(_DUP_RMV)
+                removed.add(el)
+            else:
+                if el in existing:
+                    errors.add(_INS_IN)
+                if el in inserted:
+                    errors.add(_DUP_INS)
+                inserted.add(el)
+                if isinstance(el, Link):
+                    ins_targets += [el.a, el.b]
+            parents.append(el.parent)
+
+    # elements referenced by value would be left behind when the referenced
+    # element is modified, the store indexes them by Ref
+    if getattr(existing, 'stable_ids', False):
+        is_ref = lambda r: r is None or isinstance(r, Ref)
+        if not all(is_ref(r) for r in parents + ins_targets + mod_targets):
+            errors.add(_NOT_REF)
+
+    if removed & inserted:
+        errors.add(_RMV_INS)
+    if removed & (old | modified):
+        errors.add(_RMV_MOD)
+    if inserted & (old | modified):
+        errors.add(_INS_MOD)
+
+    # parent can also be element that is modified in same changelist,
+    # which is the case when moving container elements; mixed changelists
+    # (e.g. net changelist of transaction) can also insert elements together
+    # with their parents and link targets
+    is_parent = lambda p: (not isinstance(p, Link)
+                           and (p in existing or p in modified
+                                or (allow_mixed and p in inserted)))
+    if not all(p is None or is_parent(p) for p in parents):
+        errors.add(_PARENT)
+
+    is_target = lambda t: t in existing or (allow_mixed and t in inserted)
+    if not all(is_target(t) for t in ins_targets):
+        errors.add(_INS_LINK)
+
+    if not all(t in modified or t in existing for t in mod_targets):
+        errors.add(_MOD_LINK)
+
+    for err in _VALIDATION_ERRORS:
+        if err in errors:
+            raise ValueError(err)
@@ -1,2 +1,7 @@
 from elements import *
 from CanvasModel import CanvasModel
+from store import ElementStore
+from journal import Journal
+from binary import BinaryDocument, write_binary
+from autosave import Autosave
+from columns import GeometryColumns
@@ -0,0 +1,168 @@
+import logging
+_log = logging.getLogger(__name__)
+
+import threading
+import time
+from ..events import Model_Changed
+
+
+class Autosave(object):
+    """ Periodically saves model on a background thread.
+
+        Saving is triggered by Model_Changed events once enough changelists
+        were committed since the last save or enough time has passed since
+        then. Model's snapshot is taken on the thread that changes the model
+        and handed over to a writer thread, so editing continues while the
+        snapshot is being written. Taking the snapshot copies the tuple of
+        elements (see CanvasModel.snapshot), which takes time linear in the
+        number of elements but is much faster than writing them, and it's
+        done at most once per save.
+        If saving takes longer than editing, only the latest snapshot waits
+        to be written, older ones are skipped.
+
+        Events alone don't trigger saving once the editing stops, so *poll*
+        should be called periodically (e.g. by a timer) on the thread that
+        changes the model, and *flush* before exiting.
+    """
+
+    def __init__(self, model, eventbus, write, interval=30.0,
+                 max_changes=100):
+        """ Parameters
+            ----------
+            model : CanvasModel
+                model to save
+            eventbus : EventBus
+                event bus on which model dispatches Model_Changed events
+            write : callable
+                called with tuple of elements on writer thread, must write
+                them to storage (e.g. write_binary with given path)
+            interval : Number
+                unsaved changes are saved when this many seconds have passed
+                since the last save
+            max_changes : int
+                unsaved changes are saved as soon as this many changelists
+                have been committed since the last save
+
+            Raises
+            ------
+            ValueError if model keeps stable ids, its elements reference
+            parents and link targets by Ref which can't be written
+        """
+        if model.stable_ids:
+            raise ValueError("Autosave doesn't support models with stable "
+                             "ids")
+        self.interval = interval
+        self.max_changes = max_changes
+        self._model = model
+        self._write = write
+        self._changes = 0  # changelists since last save
+        self._last_save = time.time()
+        self._pending = None  # snapshot waiting for writer thread
+        self._busy = False  # writer thread is writing a snapshot
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {'saves': 0, 'failures': 0,
+                       'last_snapshot': None, 'max_snapshot': 0.0,
+                       'last_write': None, 'max_write': 0.0}
+        self._thread = threading.Thread(target=self._run, name='autosave')
+        self._thread.daemon = True
+        self._thread.start()
+        eventbus.register(Model_Changed, self._on_model_changed)
+
+    @property
+    def stats(self):
+        """ Returns dict with number of successful and failed saves ('saves',
+            'failures') and latest and maximum latency in seconds of taking
+            the snapshot ('last_snapshot', 'max_snapshot') and of writing it
+            ('last_write', 'max_write').
+        """
+        with self._cond:
+            return dict(self._stats)
+
+    @property
+    def dirty(self):
+        """Returns whether there are changes that weren't handed to writer."""
+        return self._changes > 0
+
+    def poll(self):
+        """Saves unsaved changes if interval since the last save has passed."""
+        if self.dirty and time.time() - self._last_save >= self.interval:
+            self.save()
+
+    def save(self):
+        """ Takes model's snapshot and hands it to writer thread, regardless
+            of the thresholds.
+        """
+        if self._closed:
+            raise ValueError("Autosave is closed")
+        start = time.time()
+        snapshot = self._model.snapshot()
+        latency = time.time() - start
+        self._changes = 0
+        self._last_save = time.time()
+        with self._cond:
+            self._stats['last_snapshot'] = latency
+            self._stats['max_snapshot'] = max(latency,
+                                              self._stats['max_snapshot'])
+            self._pending = snapshot
+            self._cond.notify_all()
+
+    def flush(self):
+        """ Saves unsaved changes and waits until everything handed to writer
+            thread has been written.
+        """
+        if self.dirty:
+            self.save()
+        with self._cond:
+            while self._pending is not None or self._busy:
+                self._cond.wait()
+
+    def close(self):
+        """Flushes unsaved changes and stops the writer thread."""
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _on_model_changed(self, evt):
+        if self._closed:
+            return
+        self._changes += 1
+        if (self._changes >= self.max_changes
+                or time.time() - self._last_save >= self.interval):
+            self.save()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:  # closed and nothing left
+                    return
+                snapshot, self._pending = self._pending, None
+                self._busy = True
+            start = time.time()
+            try:
+                self._write(snapshot)
+                failed = False
+            except Exception:
+                _log.exception('autosave failed')
+                failed = True
+            latency = time.time() - start
+            with self._cond:
+                self._busy = False
+                if failed:
+                    self._stats['failures'] += 1
+                else:
+                    self._stats['saves'] += 1
+                    self._stats['last_write'] = latency
+                    self._stats['max_write'] = max(latency,
+                                                   self._stats['max_write'])
+                snapshot_latency = self._stats['last_snapshot']
+                self._cond.notify_all()
+            if not failed:
+                _log.info('autosaved {0} elements (snapshot {1:.1f} ms, '
+                          'write {2:.1f} ms)'.format(len(snapshot),
+                                                    snapshot_latency * 1000,
+                                                    latency * 1000))
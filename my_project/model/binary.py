@@ -0,0 +1,367 @@
+import os
+import struct
+from collections import defaultdict
+from ..util import bounding_box_around_points
+from ..spatial import SpatialIndex
+from elements import Rectangle, Ellipse, Path, Link, Ref
+
+try:
+    import mmap
+except ImportError:  # not available in Jython, java.nio maps the file there
+    mmap = None
+
+try:
+    from java.io import RandomAccessFile
+    from java.nio import ByteOrder
+    from java.nio.channels import FileChannel
+except ImportError:  # not running in Jython
+    RandomAccessFile = None
+
+
+"""
+Fixed-layout binary document for very large drawings. Elements are stored in
+typed columns instead of records, so that opening a document doesn't need to
+parse anything and single elements can be built on demand.
+
+Layout (little-endian), n is number of elements and v number of vertices:
+
+    header     magic, version, reserved, n, v      '<4sHHII'
+    X, Y, W, H bounds of each element              n * float64 each
+    VX, VY     coordinates of all Path vertices    v * float64 each
+    PARENT     index of parent or -1               n * int32
+    A, B       indexes of Link endpoints or -1     n * int32 each
+    VSTART     index of element's first vertex     (n + 1) * uint32
+    KIND       element type, see _KINDS            n * uint8
+
+Bounds of Rectangles and Ellipses are their geometry, Paths have the bounding
+box of their vertices and Links the bounding box of both endpoints. Vertices
+of element i are VSTART[i] up to VSTART[i + 1].
+
+File is memory-mapped by mmap, or by java.nio in Jython (which has no mmap),
+so opening doesn't read the columns. BinaryDocument builds elements lazily
+and can be the source of elements of CanvasModel (CanvasModel(eventbus,
+source=doc)), which then builds only the elements that it needs, e.g. those
+in the queried region or those being edited.
+"""
+
+MAGIC = 'MPCV'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('<4sHHII')
+_KINDS = (Rectangle, Ellipse, Path, Link)
+_KIND_OF = dict((cls, k) for k, cls in enumerate(_KINDS))
+_CHUNK = 4096  # number of values packed or scanned at once
+_SIZE_OF = dict((fmt, struct.calcsize('<' + fmt)) for fmt in 'dIiB')
+
+
+def _layout(n, v):
+    """Returns dict column name -> (struct format char, offset)."""
+    columns = [('X', 'd', n), ('Y', 'd', n), ('W', 'd', n), ('H', 'd', n),
+               ('VX', 'd', v), ('VY', 'd', v),
+               ('PARENT', 'i', n), ('A', 'i', n), ('B', 'i', n),
+               ('VSTART', 'I', n + 1), ('KIND', 'B', n)]
+    res = {}
+    offset = _HEADER.size
+    for name, fmt, count in columns:
+        res[name] = (fmt, offset)
+        offset += struct.calcsize('<' + fmt) * count
+    res['END'] = (None, offset)
+    return res
+
+
+def _bounds(elem):
+    """Returns tuple (x, y, width, height) of element's bounding box."""
+    if isinstance(elem, Link):
+        ax, ay, aw, ah = _bounds(_by_value(elem.a))
+        bx, by, bw, bh = _bounds(_by_value(elem.b))
+        x, y = min(ax, bx), min(ay, by)
+        return x, y, max(ax + aw, bx + bw) - x, max(ay + ah, by + bh) - y
+    if isinstance(elem, Path):
+        x1, y1, x2, y2 = bounding_box_around_points(elem.vertices)
+        return x1, y1, x2 - x1, y2 - y1
+    return elem.x, elem.y, elem.width, elem.height
+
+
+def _by_value(elem):
+    """Returns referenced element, raises ValueError if it's a Ref."""
+    if isinstance(elem, Ref):
+        raise ValueError("Elements referencing by Ref (model with stable "
+                         "ids) can't be written")
+    return elem
+
+
+def write_binary(path, elems):
+    """ Writes elements (in paint order) to binary document. Parents and link
+        endpoints of elements must be among the elements. Document is written
+        to temporary file first, so it's never left incomplete.
+
+        Raises
+        ------
+        ValueError if elements reference parents or link endpoints by Ref
+        (model with stable ids), those can't be resolved
+    """
+    elems = list(elems)
+    index = dict((el, i) for i, el in enumerate(elems))
+    ref = lambda el: -1 if el is None else index[_by_value(el)]
+    bounds = [_bounds(el) for el in elems]
+    vstart = [0]
+    for el in elems:
+        n_verts = len(el.vertices) if isinstance(el, Path) else 0
+        vstart.append(vstart[-1] + n_verts)
+    vertices = [v for el in elems if isinstance(el, Path)
+                for v in el.vertices]
+    is_link = lambda el: isinstance(el, Link)
+    columns = [
+        ('d', [b[0] for b in bounds]), ('d', [b[1] for b in bounds]),
+        ('d', [b[2] for b in bounds]), ('d', [b[3] for b in bounds]),
+        ('d', [vx for vx, _ in vertices]), ('d', [vy for _, vy in vertices]),
+        ('i', [-1 if is_link(el) else ref(el.parent) for el in elems]),
+        ('i', [ref(el.a) if is_link(el) else -1 for el in elems]),
+        ('i', [ref(el.b) if is_link(el) else -1 for el in elems]),
+        ('I', vstart),
+        ('B', [_KIND_OF[type(el)] for el in elems]),
+    ]
+    tmp_path = path + '.tmp'  # existing document is replaced only when done
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(elems),
+                             len(vertices)))
+        for fmt, values in columns:
+            for i in range(0, len(values), _CHUNK):
+                chunk = values[i:i + _CHUNK]
+                f.write(struct.pack('<{0}{1}'.format(len(chunk), fmt),
+                                    *chunk))
+    try:
+        os.rename(tmp_path, path)
+    except OSError:  # rename doesn't replace existing file on Windows
+        os.remove(path)
+        os.rename(tmp_path, path)
+
+
+
+class BinaryDocument(object):
+    """ Read-only view of binary document that builds elements lazily.
+
+        File is memory-mapped (by java.nio in Jython, read at once where
+        neither is available) and only the header is parsed when opening.
+        Element is built when it's first accessed by index, along with its
+        parents and link endpoints, and then cached so that the same
+        instance is returned every time. Bounds of elements can be queried
+        without building them, e.g. to find out which elements are visible:
+
+            doc = BinaryDocument(path)
+            visible = [doc[i] for i in doc.overlapping(0, 0, 800, 600)]
+
+        Document can be source of ElementStore, *find* and *referencing*
+        look elements up without building the others.
+    """
+
+    def __init__(self, path):
+        if mmap is None and RandomAccessFile is not None:
+            self._buf = _NioBuffer(path)
+        else:
+            self._buf = _StructBuffer(path)
+        if len(self._buf) < _HEADER.size:
+            raise ValueError("Not a binary document")
+        magic, version, _, n, v = _HEADER.unpack(
+            self._buf.read(0, _HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("Not a binary document")
+        if version != FORMAT_VERSION:
+            raise ValueError("Unsupported format version {0}".format(version))
+        self._layout = _layout(n, v)
+        if len(self._buf) != self._layout['END'][1]:
+            raise ValueError("Binary document has invalid size")
+        self._len = n
+        self._cache = {}  # index -> built element
+        self._index = None  # SpatialIndex of bounds, built on first query
+        self._by_bounds = None  # (kind, x, y, w, h) -> indexes, for find
+        self._referencing = None  # index -> indexes of elements using it
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("Element index out of range")
+        if i in self._cache:
+            return self._cache[i]
+        pending = [i]  # iterative, deep hierarchies are fine
+        while pending:
+            j = pending[-1]
+            missing = [r for r in self._refs(j) if r not in self._cache]
+            if not missing:
+                self._cache[j] = self._build(j)
+                pending.pop()
+            elif len(pending) > self._len:
+                raise ValueError("Circular element references")
+            else:
+                pending.extend(missing)
+        return self._cache[i]
+
+    def __iter__(self):
+        """Yields all elements in paint order, building them as needed."""
+        for i in range(self._len):
+            yield self[i]
+
+    @property
+    def materialized(self):
+        """Returns number of elements built so far."""
+        return len(self._cache)
+
+    def bounds(self, i):
+        """Returns tuple (x, y, width, height) of element's bounding box."""
+        return tuple(self._value(col, i) for col in ('X', 'Y', 'W', 'H'))
+
+    def overlapping(self, x, y, width, height):
+        """ Returns list of indexes (in paint order) of elements whose
+            bounding box overlaps given rectangle, without building any
+            element. First query indexes bounds of all elements in
+            SpatialIndex (reading the bounds columns once), following ones
+            only visit the part of the index around given rectangle.
+        """
+        if self._index is None:
+            self._index = SpatialIndex()
+            for start in range(0, self._len, _CHUNK):
+                count = min(_CHUNK, self._len - start)
+                xs, ys, ws, hs = [self._values(col, start, count)
+                                  for col in ('X', 'Y', 'W', 'H')]
+                for k in range(count):
+                    self._index.insert(start + k, (xs[k], ys[k],
+                                                   xs[k] + ws[k],
+                                                   ys[k] + hs[k]))
+        return self._index.overlapping((x, y, x + width, y + height))
+
+    def find(self, elem):
+        """ Returns index of element equal to given one, None if there's no
+            such element. First lookup reads kinds and bounds of all
+            elements, following ones only build elements with the same kind
+            and bounds as given element.
+        """
+        kind = _KIND_OF.get(type(elem))
+        if kind is None:
+            return None
+        if self._by_bounds is None:
+            self._by_bounds = defaultdict(list)
+            for start in range(0, self._len, _CHUNK):
+                count = min(_CHUNK, self._len - start)
+                columns = [self._values(col, start, count)
+                           for col in ('KIND', 'X', 'Y', 'W', 'H')]
+                for k, key in enumerate(zip(*columns)):
+                    self._by_bounds[key].append(start + k)
+        key = (kind,) + _bounds(elem)
+        for i in self._by_bounds.get(key, ()):
+            if self[i] == elem:
+                return i
+        return None
+
+    def referencing(self, i):
+        """ Returns list of indexes (in paint order) of elements whose
+            parent or link endpoint is element i. First call reads references
+            of all elements.
+        """
+        if self._referencing is None:
+            referencing = defaultdict(set)
+            for col in ('PARENT', 'A', 'B'):
+                for start in range(0, self._len, _CHUNK):
+                    count = min(_CHUNK, self._len - start)
+                    for k, r in enumerate(self._values(col, start, count)):
+                        if r != -1:
+                            referencing[r].add(start + k)
+            self._referencing = dict((r, sorted(js))
+                                     for r, js in referencing.iteritems())
+        return self._referencing.get(i, [])
+
+    def close(self):
+        self._buf.close()
+        self._buf = None
+
+    def _value(self, column, i):
+        return self._values(column, i, 1)[0]
+
+    def _values(self, column, start, count):
+        fmt, offset = self._layout[column]
+        return self._buf.values(fmt, offset + start * _SIZE_OF[fmt], count)
+
+    def _refs(self, i):
+        """Returns indexes of elements referenced by element i."""
+        refs = [self._value(col, i) for col in ('PARENT', 'A', 'B')]
+        return [r for r in refs if r != -1]
+
+    def _build(self, i):
+        cls = _KINDS[self._value('KIND', i)]
+        if cls is Link:
+            return Link(self._cache[self._value('A', i)],
+                        self._cache[self._value('B', i)])
+        parent_i = self._value('PARENT', i)
+        parent = None if parent_i == -1 else self._cache[parent_i]
+        if cls is Path:
+            start, stop = self._values('VSTART', i, 2)
+            vertices = zip(self._values('VX', start, stop - start),
+                           self._values('VY', start, stop - start))
+            return Path(vertices, parent)
+        return cls(*(self.bounds(i) + (parent,)))
+
+
+
+class _StructBuffer(object):
+    """ Values of document file mapped by mmap, or read at once where mmap
+        isn't available.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if mmap is not None and os.fstat(f.fileno()).st_size:
+                self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:  # empty files can't be mapped
+                self._buf = f.read()
+
+    def __len__(self):
+        return len(self._buf)
+
+    def read(self, offset, size):
+        return self._buf[offset:offset + size]
+
+    def values(self, fmt, offset, count):
+        return struct.unpack_from('<{0}{1}'.format(count, fmt), self._buf,
+                                  offset)
+
+    def close(self):
+        if not isinstance(self._buf, str):
+            self._buf.close()
+
+
+
+class _NioBuffer(object):
+    """Values of document file mapped by java.nio, for Jython."""
+
+    def __init__(self, path):
+        f = RandomAccessFile(path, 'r')
+        try:
+            channel = f.getChannel()
+            self._buf = channel.map(FileChannel.MapMode.READ_ONLY, 0,
+                                    channel.size())
+        finally:
+            f.close()  # mapping stays valid after the file is closed
+        self._buf.order(ByteOrder.LITTLE_ENDIAN)
+        buf = self._buf
+        self._getters = {  # format -> function reading value at offset
+            'd': buf.getDouble,
+            'i': buf.getInt,
+            'I': lambda offset: buf.getInt(offset) & 0xffffffff,
+            'B': lambda offset: buf.get(offset) & 0xff,
+        }
+
+    def __len__(self):
+        return self._buf.capacity()
+
+    def read(self, offset, size):
+        return ''.join(chr(b) for b in self.values('B', offset, size))
+
+    def values(self, fmt, offset, count):
+        get, size = self._getters[fmt], _SIZE_OF[fmt]
+        return tuple(get(offset + k * size) for k in xrange(count))
+
+    def close(self):
+        self._buf = None  # unmapped once garbage collected
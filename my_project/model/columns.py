@@ -0,0 +1,310 @@
+from ..util import bounding_box_around_points
+from elements import Remove, Insert, Rectangle, Ellipse, Path, fix_xywh
+
+try:
+    import numpy
+except ImportError:  # not available in Jython, model falls back to scanning
+    numpy = None
+
+NUMPY_AVAILABLE = numpy is not None
+
+_KINDS = (Rectangle, Ellipse, Path)  # types of elements kept in columns
+_KIND_OF = dict((cls, k) for k, cls in enumerate(_KINDS))
+_EMPTY = -1  # kind of row whose element was removed
+_MIN_CAPACITY = 64
+
+
+def element_bounds(elem):
+    """ Returns tuple (x1, y1, x2, y2) of element's bounding box, or None for
+        elements without geometry of their own (Links).
+    """
+    if isinstance(elem, Path):
+        return bounding_box_around_points(elem.vertices)
+    if isinstance(elem, (Rectangle, Ellipse)):
+        return elem.x, elem.y, elem.x + elem.width, elem.y + elem.height
+    return None
+
+
+def fix_xywh_columns(xs, ys, ws, hs):
+    """ Same as fix_xywh, but for sequences (or arrays) of values of many
+        rectangles at once, vectorized when NumPy is available. Returns tuple
+        of lists of floats (xs, ys, widths, heights).
+
+        Raises
+        ------
+        ValueError if sequences differ in length, some value is not a number
+        or some rectangle has zero dimensions
+    """
+    if not len(xs) == len(ys) == len(ws) == len(hs):
+        raise ValueError("Geometry sequences must have same length")
+    if numpy is None:
+        try:
+            fixed = [fix_xywh(*xywh) for xywh in zip(xs, ys, ws, hs)]
+        except TypeError:
+            raise ValueError("Geometry values must be numbers")
+        return tuple(map(list, zip(*fixed))) if fixed else ([],) * 4
+    try:
+        xs, ys, ws, hs = [numpy.asarray(v, numpy.float64)
+                          for v in (xs, ys, ws, hs)]
+    except (TypeError, ValueError):
+        raise ValueError("Geometry values must be numbers")
+    if ((ws == 0) & (hs == 0)).any():
+        raise ValueError("Cannot have zero dimensions")
+    xs = numpy.where(ws < 0, xs + ws, xs)
+    ys = numpy.where(hs < 0, ys + hs, ys)
+    return (xs.tolist(), ys.tolist(), numpy.abs(ws).tolist(),
+            numpy.abs(hs).tolist())
+
+
+def overlaps(bounds, x1, y1, x2, y2):
+    """Returns whether bounding box overlaps given rectangle (edges count)."""
+    ex1, ey1, ex2, ey2 = bounds
+    return ex1 <= x2 and x1 <= ex2 and ey1 <= y2 and y1 <= ey2
+
+
+def encloses(x1, y1, x2, y2, bounds):
+    """Returns whether given rectangle contains the whole bounding box."""
+    ex1, ey1, ex2, ey2 = bounds
+    return x1 <= ex1 and ex2 <= x2 and y1 <= ey1 and ey2 <= y2
+
+
+
+class GeometryColumns(object):
+    """ Bounding boxes of model elements kept in NumPy arrays (one array per
+        attribute instead of one object per element), so that bulk queries
+        and updates run as vectorized operations.
+
+        Columns are *x*, *y*, *width* and *height* of element's bounding box,
+        *kind* of element (index into _KINDS, _EMPTY for removed) and
+        *parent* row (-1 if element has no parent in columns). Only the first
+        *size* rows are in use, rows are in paint order. Rectangles, Ellipses
+        and Paths are kept, Links (whose geometry comes from their targets)
+        are not.
+
+        Columns are kept in sync with ElementStore by calling *apply* with
+        every changelist after it's been applied to the store. Removed rows
+        are only marked empty and compacted once they make up half of the
+        rows, so that parent rows of other elements stay valid.
+    """
+
+    def __init__(self, store):
+        """ Parameters
+            ----------
+            store : ElementStore
+                store to mirror, used for resolving parents and finding
+                children of elements; its current elements are added
+        """
+        if numpy is None:
+            raise ImportError("GeometryColumns require NumPy")
+        self._store = store
+        self._row_of = {}  # element -> row
+        self._elems = []  # row -> element, None for removed
+        self._removed = 0  # number of empty rows
+        self.size = 0
+        self._allocate(_MIN_CAPACITY)
+        self.apply([Insert(el) for el in store])
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def __contains__(self, elem):
+        return elem in self._row_of
+
+    def apply(self, changes):
+        """Updates columns with changelist that was applied to the store."""
+        left = []  # elements that are gone, their children lose parent
+        touched = []  # elements whose parent row has to be updated
+        for ch in changes:
+            if isinstance(ch, Insert):
+                old, new = None, ch.elem
+            elif isinstance(ch, Remove):
+                old, new = ch.elem, None
+            else:
+                old, new = ch.elem, ch.modified
+            row = self._row_of.pop(old, None)
+            if row is not None:
+                self._elems[row] = None
+                if (new is None or type(new) not in _KIND_OF
+                        or not self._store.stable_ids):  # id not kept
+                    left.append(old)
+            if new is not None and type(new) in _KIND_OF:
+                if row is None:
+                    row = self._append_row()
+                self._set_row(row, new)
+                touched.append(new)
+            elif row is not None:
+                self.kind[row] = _EMPTY
+                self._removed += 1
+            if new is not None:  # (re)inserted parent of existing children
+                touched += self._store.children_of(new)
+        for el in left:
+            touched += self._store.children_of(el)
+        for el in touched:
+            row = self._row_of.get(el)
+            if row is not None:
+                parent = self._store.resolve(el.parent)
+                self.parent[row] = self._row_of.get(parent, -1)
+        if self._removed > _MIN_CAPACITY and self._removed * 2 > self.size:
+            self._compact()
+
+    def extend(self, elems, xs, ys, ws, hs):
+        """ Adds many new Rectangles or Ellipses at once, columns are filled
+            vectorized. Elements must have been appended to the store and
+            their geometry (*xs*, *ys*, *ws*, *hs*) must be exactly what the
+            elements have.
+        """
+        n = len(elems)
+        start = self.size
+        capacity = len(self.x)
+        while capacity < start + n:
+            capacity *= 2
+        if capacity > len(self.x):
+            self._allocate(capacity)
+        stop = start + n
+        self.x[start:stop], self.y[start:stop] = xs, ys
+        self.width[start:stop], self.height[start:stop] = ws, hs
+        self.kind[start:stop] = [_KIND_OF[type(el)] for el in elems]
+        self._elems.extend(elems)
+        self._row_of.update(zip(elems, xrange(start, stop)))
+        self.size = stop
+        resolve, row_of = self._store.resolve, self._row_of
+        self.parent[start:stop] = [row_of.get(resolve(el.parent), -1)
+                                   for el in elems]
+        for el in elems:  # existing elements may reference new ones
+            for child in self._store.children_of(el):
+                if child in row_of:
+                    self.parent[row_of[child]] = row_of[el]
+
+    def rows(self, elems):
+        """ Returns array of rows of given elements.
+
+            Raises
+            ------
+            ValueError if some element is not in columns
+        """
+        try:
+            return numpy.fromiter((self._row_of[el] for el in elems),
+                                  numpy.intp)
+        except KeyError as e:
+            raise ValueError("Element not in columns: {0}".format(e.args[0]))
+
+    def bounds(self):
+        """ Returns bounding box (x1, y1, x2, y2) around all elements, which
+            is (inf, inf, -inf, -inf) if there are none.
+        """
+        live = self._live()
+        if not live.any():
+            inf = float('inf')
+            return inf, inf, -inf, -inf
+        x, y = self.x[:self.size][live], self.y[:self.size][live]
+        return (float(x.min()), float(y.min()),
+                float((x + self.width[:self.size][live]).max()),
+                float((y + self.height[:self.size][live]).max()))
+
+    def overlapping(self, x1, y1, x2, y2):
+        """ Returns list of elements (in paint order) whose bounding box
+            overlaps given rectangle.
+        """
+        x, y = self.x[:self.size], self.y[:self.size]
+        mask = (self._live() & (x <= x2) & (x1 <= x + self.width[:self.size])
+                & (y <= y2) & (y1 <= y + self.height[:self.size]))
+        return self._elements(mask)
+
+    def enclosed(self, x1, y1, x2, y2):
+        """ Returns list of elements (in paint order) whose bounding box is
+            completely within given rectangle.
+        """
+        x, y = self.x[:self.size], self.y[:self.size]
+        mask = (self._live() & (x1 <= x) & (x + self.width[:self.size] <= x2)
+                & (y1 <= y) & (y + self.height[:self.size] <= y2))
+        return self._elements(mask)
+
+    def roots(self, elems):
+        """ Returns list of given elements (in given order) that aren't
+            nested in any other of given elements on any depth.
+
+            Raises
+            ------
+            ValueError if some element is not in columns
+        """
+        elems = list(elems)
+        rows = self.rows(elems)
+        selected = numpy.zeros(self.size, bool)
+        selected[rows] = True
+        nested = numpy.zeros(len(rows), bool)
+        ancestor = self.parent[rows]
+        for _ in xrange(self.size):  # bounded, in case of circular parents
+            pending = ancestor >= 0
+            if not pending.any():
+                break
+            nested[pending] |= selected[ancestor[pending]]
+            ancestor[pending] = self.parent[ancestor[pending]]
+        return [el for el, n in zip(elems, nested.tolist()) if not n]
+
+    def moved(self, elems, dx, dy):
+        """ Returns list of given elements moved by given offset, without
+            changing the columns (they're updated once the moved elements are
+            committed).
+        """
+        elems = list(elems)
+        rows = self.rows(elems)
+        xs = (self.x[rows] + dx).tolist()
+        ys = (self.y[rows] + dy).tolist()
+        return [el.move(dx, dy) if isinstance(el, Path)
+                else el._replace(x=x, y=y)
+                for el, x, y in zip(elems, xs, ys)]
+
+    def _live(self):
+        return self.kind[:self.size] != _EMPTY
+
+    def _elements(self, mask):
+        return [self._elems[row] for row in numpy.flatnonzero(mask).tolist()]
+
+    def _set_row(self, row, elem):
+        x1, y1, x2, y2 = element_bounds(elem)
+        self.x[row], self.y[row] = x1, y1
+        self.width[row], self.height[row] = x2 - x1, y2 - y1
+        self.kind[row] = _KIND_OF[type(elem)]
+        self._row_of[elem] = row
+        self._elems[row] = elem
+
+    def _append_row(self):
+        if self.size == len(self.x):
+            self._allocate(2 * len(self.x))
+        self._elems.append(None)
+        self.size += 1
+        return self.size - 1
+
+    def _allocate(self, capacity):
+        """Resizes columns to given capacity, keeping used rows."""
+        def resized(column, dtype):
+            res = numpy.empty(capacity, dtype)
+            if column is not None:
+                res[:self.size] = column[:self.size]
+            return res
+
+        get = lambda name: getattr(self, name, None)
+        self.x = resized(get('x'), numpy.float64)
+        self.y = resized(get('y'), numpy.float64)
+        self.width = resized(get('width'), numpy.float64)
+        self.height = resized(get('height'), numpy.float64)
+        self.kind = resized(get('kind'), numpy.int8)
+        self.parent = resized(get('parent'), numpy.int32)
+
+    def _compact(self):
+        """Drops empty rows, keeping the order of the remaining ones."""
+        live = self._live()
+        new_row = numpy.cumsum(live) - 1
+        new_row[~live] = -1
+        parent = self.parent[:self.size][live]
+        has_parent = parent >= 0
+        parent[has_parent] = new_row[parent[has_parent]]
+        n = int(live.sum())
+        for name in ('x', 'y', 'width', 'height', 'kind'):
+            column = getattr(self, name)
+            column[:n] = column[:self.size][live]
+        self.parent[:n] = parent
+        self._elems = [el for el in self._elems if el is not None]
+        self._row_of = dict((el, row) for row, el in enumerate(self._elems))
+        self.size = n
+        self._removed = 0
@@ -1,4 +1,8 @@
-from ..util import Record, bounding_box_around_points, remove_duplicates
+import weakref
+from array import array
+from itertools import islice, izip
+from ..util import (Record, RecordMeta, bounding_box_around_points,
+                    remove_duplicates)
 
 
 
@@ -53,11 +57,69 @@ def fix_xywh(x, y, width, height):
     return x, y, width, height
 
 
+# table of interned elements, (class, field values) -> element, None when
+# interning is disabled
+_interned = None
+
+
+def set_interning(enabled):
+    """ Enables or disables interning (hash-consing) of canvas elements.
+
+        While enabled, constructing an element (or getting modified copy of it
+        with *_replace* or *move*) that is equal to some existing element
+        returns the existing instance instead. Equal elements then share
+        memory along with their parents, and comparing them takes a single
+        identity check. Elements are held weakly, interning doesn't keep
+        them alive. Disabling interning forgets all interned elements.
+
+        Paths are never interned: looking one up would hash all of its
+        vertices, so every move of a large path would take time linear in
+        its size instead of constant.
+    """
+    global _interned
+    if not enabled:
+        _interned = None
+    elif _interned is None:
+        _interned = weakref.WeakValueDictionary()
+
+
+def _intern(elem):
+    if _interned is None or not elem._internable:
+        return elem
+    key = (elem.__class__,) + elem._values()
+    existing = _interned.get(key)
+    if existing is None:
+        _interned[key] = elem
+        return elem
+    return existing
+
+
+class _InterningMeta(RecordMeta):
+    def __call__(cls, *args, **kwargs):
+        return _intern(super(_InterningMeta, cls).__call__(*args, **kwargs))
+
+
+class Ref(Record):
+    """ Reference to element by its stable id, used as parent or link target
+        instead of the element itself when model keeps stable ids (see
+        ElementStore). Modifying referenced element doesn't change elements
+        referencing it, the reference resolves to the new version.
+    """
+    def __init__(self, uid):
+        self.uid = uid
+
+
 class _BaseElement(Record):
+    __metaclass__ = _InterningMeta
+    __slots__ = ('__weakref__',)  # needed for interning
+    _internable = True
+
     def __init__(self, parent=None):
-        if parent and (not isinstance(parent, _BaseElement)
-                       or isinstance(parent, Link)):
-            raise ValueError("parent must be element (but not Link) or None")
+        if parent and not (isinstance(parent, Ref)
+                           or (isinstance(parent, _BaseElement)
+                               and not isinstance(parent, Link))):
+            raise ValueError("parent must be element (but not Link), Ref or "
+                             "None")
         self.parent = parent
         # TODO: parent must be member of same model, but this check has to
         # be performed elsewhere
@@ -65,12 +127,20 @@ class _BaseElement(Record):
     def move(self, dx, dy):
         raise NotImplementedError("Forgot to implement 'move' method")
 
+    def _replace(self, **kwargs):
+        return _intern(super(_BaseElement, self)._replace(**kwargs))
+
+    @classmethod
+    def _make(cls, values):
+        return _intern(super(_BaseElement, cls)._make(values))
+
 
 
 class Link(_BaseElement):
     def __init__(self, a, b):
-        assert isinstance(a, _BaseElement) and not isinstance(a, Link)
-        assert isinstance(b, _BaseElement) and not isinstance(b, Link)
+        is_target = lambda t: isinstance(t, Ref) or (
+            isinstance(t, _BaseElement) and not isinstance(t, Link))
+        assert is_target(a) and is_target(b)
         self.a = a
         self.b = b
         super(Link, self).__init__(None)  # Link never has parent
@@ -94,11 +164,87 @@ class Ellipse(_BaseElement):
         return self._replace(x=self.x + dx, y=self.y + dy)
 
 
+class Vertices(object):
+    """ Immutable sequence of (x, y) vertices packed into array of doubles.
+
+        Behaves like tuple of (x, y) tuples (compares and hashes equal to
+        one) while taking 16 bytes per vertex. Moving creates new Vertices
+        that share the packed coordinates and only store the offset, so it
+        takes constant time regardless of number of vertices. Hash is
+        computed only once.
+    """
+    __slots__ = ('_coords', '_dx', '_dy', '_hash')
+
+    def __init__(self, vertices=()):
+        self._coords = array('d')
+        for x, y in vertices:
+            self._coords.append(x)
+            self._coords.append(y)
+        self._dx = self._dy = 0.0
+        self._hash = None
+
+    def moved(self, dx, dy):
+        """Returns new Vertices translated by given offset."""
+        res = Vertices.__new__(Vertices)
+        res._coords = self._coords  # never modified, safe to share
+        res._dx, res._dy = self._dx + dx, self._dy + dy
+        res._hash = None
+        return res
+
+    def __len__(self):
+        return len(self._coords) // 2
+
+    def __iter__(self):
+        c, dx, dy = self._coords, self._dx, self._dy
+        for i in xrange(0, len(c), 2):
+            yield (c[i] + dx, c[i + 1] + dy)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(islice(self, *index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Vertex index out of range")
+        return (self._coords[2 * index] + self._dx,
+                self._coords[2 * index + 1] + self._dy)
+
+    def __eq__(self, other):
+        if isinstance(other, Vertices):
+            same_offset = (self._dx, self._dy) == (other._dx, other._dy)
+            if same_offset and self._coords is other._coords:
+                return True
+            if same_offset and (self._dx, self._dy) == (0.0, 0.0):
+                return self._coords == other._coords  # compares packed
+            if (self._hash is not None and other._hash is not None
+                    and self._hash != other._hash):
+                return False
+            return len(self) == len(other) and all(
+                a == b for a, b in izip(self, other))
+        if isinstance(other, tuple):
+            return tuple(self) == other
+        return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(tuple(self))
+        return self._hash
+
+    def __repr__(self):
+        return '{0}({1})'.format(self.__class__.__name__, tuple(self))
+
+
 class Path(_BaseElement):
+    _internable = False  # hashing all vertices on every move costs too much
+
     def __init__(self, vertices, parent=None):
-        self.vertices = tuple(remove_duplicates(vertices))
+        if not isinstance(vertices, Vertices):
+            vertices = Vertices(remove_duplicates(vertices))
+        self.vertices = vertices
         super(Path, self).__init__(parent)
 
     def move(self, dx, dy):
-        new_verts = tuple((vx + dx, vy + dy) for vx, vy in self.vertices)
-        return self._replace(vertices=new_verts)
+        return self._replace(vertices=self.vertices.moved(dx, dy))
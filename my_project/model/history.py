@@ -0,0 +1,314 @@
+import logging
+_log = logging.getLogger(__name__)
+
+from collections import OrderedDict
+from ..util import Record
+from elements import Remove, Insert, Modify, Vertices
+
+
+# history keeps net changelist of every block of this many consecutive
+# changelists, used for jumping to distant revisions quickly
+CHECKPOINT_INTERVAL = 32
+
+# Rough per-object memory costs in bytes, used to estimate how much memory is
+# held by history. Exact numbers don't matter much, estimate only needs to be
+# proportional to the real footprint.
+LIST_SIZE = 72  # empty list, additional FIELD_SIZE per item
+RECORD_SIZE = 64  # Record instance with its cached hash, without fields
+FIELD_SIZE = 24  # one field or list item (reference plus dict/list entry)
+TUPLE_ITEM_SIZE = 56  # item of tuple field
+VERTEX_SIZE = 16  # Path vertex, two packed doubles
+
+
+def estimate_size(changelist):
+    """ Returns estimated number of bytes held by changelist and elements in
+        it. Elements' parents and link targets are not counted since they're
+        shared with other elements.
+    """
+    def record_size(rec):
+        size = RECORD_SIZE + FIELD_SIZE * len(rec._keys)
+        for k in rec._keys:
+            val = getattr(rec, k)
+            if isinstance(val, Vertices):
+                size += VERTEX_SIZE * len(val)
+            elif isinstance(val, tuple):
+                size += TUPLE_ITEM_SIZE * len(val)
+        return size
+
+    size = LIST_SIZE + FIELD_SIZE * len(changelist)
+    for ch in changelist:
+        size += record_size(ch)
+        for k in ch._keys:
+            el = getattr(ch, k)
+            if isinstance(el, Record):
+                size += record_size(el)
+    return size
+
+
+
+def _normalize(changelists):
+    """ Composes sequence of changelists into a single net changelist that
+        has the same effect on the model when committed.
+
+        Changes that cancel each other out are dropped (e.g. inserting and
+        then removing the same element) and chained changes are merged (e.g.
+        modifying A into B and then B into C becomes modifying A into C).
+        Resulting changelist can contain mixed change types, removals and
+        modifications come first followed by insertions.
+
+        Raises
+        ------
+        ValueError if changelists contradict each other, e.g. when removing
+        an element that was already removed in some previous changelist
+    """
+    current = OrderedDict()  # touched element present now -> its origin
+    holder = OrderedDict()  # touched original element -> what replaced it
+
+    def leave(el, msg):
+        if el in current:
+            origin = current.pop(el)
+            if origin is not None:
+                holder[origin] = None
+            return origin
+        if el in holder:  # original element that's already gone
+            raise ValueError(msg)
+        holder[el] = None
+        return el
+
+    def enter(el, origin, msg):
+        if el in current:
+            raise ValueError(msg)
+        if el in holder:
+            # original element is coming back, let it keep its identity and
+            # let the element that took its place inherit the origin instead
+            took_place = holder[el]
+            current[el] = holder[el] = el
+            if took_place is not None:
+                current[took_place] = origin
+                if origin is not None:
+                    holder[origin] = took_place
+        else:
+            current[el] = origin
+            if origin is not None:
+                holder[origin] = el
+
+    for cl in changelists:
+        for ch in cl:
+            if isinstance(ch, Insert):
+                enter(ch.elem, None,
+                      "Inserting element already present in the model")
+            elif isinstance(ch, Remove):
+                leave(ch.elem, "Removing element that's not in the model")
+            elif isinstance(ch, Modify):
+                origin = leave(ch.elem,
+                               "Changing element that's not in the model")
+                enter(ch.modified, origin,
+                      "Changing into element that's already in model")
+            else:
+                raise ValueError("Invalid changes in changelist")
+
+    res = []
+    for origin, el in holder.items():
+        if el is None:
+            res.append(Remove(origin))
+        elif not el == origin:
+            res.append(Modify(origin, el))
+    res += [Insert(el) for el, origin in current.items() if origin is None]
+    return res
+
+
+
+class History(object):
+    """ Keeps changelogs needed for undoing and redoing changes within given
+        memory budget.
+
+        *changelog* is the list of committed changelists, oldest first, and
+        *redolog* is a stack of undone changelists, the one to be redone next
+        is the last one. Both are meant to be manipulated directly by model's
+        undo and redo functions, moving changelists between them doesn't
+        affect the footprint. After new changelist has been appended to
+        changelog *committed* must be called, which clears the redo log and
+        evicts oldest changelists if budget has been exceeded.
+
+        Revision is the number of changelists committed (and not undone)
+        since the beginning, including the evicted ones. Net changelist of
+        every CHECKPOINT_INTERVAL consecutive changelists is cached once it's
+        needed so that jumping between distant revisions composes a few
+        checkpoints instead of every single changelist in between.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        """ Parameters
+            ----------
+            max_entries : int or None
+                maximum number of changelists kept for undo and redo, None
+                means unlimited
+            max_bytes : int or None
+                maximum estimated size of all kept changelists, None means
+                unlimited; the most recent changelist is always kept even if
+                it's larger than the budget
+        """
+        if max_entries is not None and max_entries < 1:
+            raise ValueError("History must be able to keep at least 1 entry")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.changelog = []
+        self.redolog = []
+        self._sizes = {}  # id(changelist) -> estimated size
+        self._bytes = 0
+        self._evicted = 0
+        self._checkpoints = {}  # block number -> net changelist of block
+
+    @property
+    def footprint(self):
+        """ Returns dict describing current state of history:
+              * entries - number of changelists kept for undo and redo
+              * bytes - their estimated size in bytes
+              * evicted - number of changelists evicted so far
+        """
+        return {
+            'entries': len(self.changelog) + len(self.redolog),
+            'bytes': self._bytes,
+            'evicted': self._evicted,
+        }
+
+    @property
+    def revision(self):
+        """Returns number of currently applied changelists."""
+        return self._evicted + len(self.changelog)
+
+    @property
+    def oldest_revision(self):
+        """Returns the oldest revision that can be reached by undoing."""
+        return self._evicted
+
+    @property
+    def newest_revision(self):
+        """Returns the newest revision that can be reached by redoing."""
+        return self.revision + len(self.redolog)
+
+    def committed(self, merge=False, size=None):
+        """ Accounts for changelist just appended to changelog, discards
+            redo log and enforces the budget.
+
+            If *merge* is True, changelist is merged with the previous one
+            into single net changelist, which is removed altogether if the
+            changes cancel each other out. *size* is changelist's estimated
+            size if caller already knows it (see estimate_size), ignored
+            when merging.
+
+            Returns False if merged changes cancelled each other out and
+            the entry was dropped, True otherwise.
+        """
+        for cl in self.redolog:
+            self._forget(cl)
+        self.redolog[:] = []
+
+        if merge and len(self.changelog) > 1:
+            self._drop_checkpoints(self.revision - 2, None)
+            self._forget(self.changelog[-2])
+            merged = _normalize(self.changelog[-2:])
+            del self.changelog[-2:]
+            if not merged:
+                return False
+            self.changelog.append(merged)
+            size = None
+        else:
+            self._drop_checkpoints(self.revision - 1, None)
+
+        cl = self.changelog[-1]
+        if size is None:
+            size = estimate_size(cl)
+        self._sizes[id(cl)] = size
+        self._bytes += size
+        self._enforce_budget()
+        return True
+
+    def goto(self, revision):
+        """ Moves changelists between changelog and redo log so that given
+            revision becomes current and returns net changelist that has to
+            be applied to the model to get to it from the current revision.
+
+            Raises
+            ------
+            ValueError if revision is out of reachable range
+        """
+        if not self.oldest_revision <= revision <= self.newest_revision:
+            raise ValueError("Revision {0} is not in history, available are "
+                             "{1} to {2}".format(revision,
+                                                 self.oldest_revision,
+                                                 self.newest_revision))
+        current = self.revision
+        if revision < current:
+            changes = [ch.inverse for ch in self._net(revision, current)]
+            i = revision - self._evicted
+            undone = self.changelog[i:]
+            del self.changelog[i:]
+            self.redolog.extend(reversed(undone))
+        elif revision > current:
+            changes = self._net(current, revision)
+            i = len(self.redolog) - (revision - current)
+            redone = self.redolog[i:]
+            del self.redolog[i:]
+            self.changelog.extend(reversed(redone))
+        else:
+            changes = []
+        return changes
+
+    def _entry(self, rev):
+        """Returns changelist that takes model from rev to rev + 1."""
+        if rev < self.revision:
+            return self.changelog[rev - self._evicted]
+        return self.redolog[-1 - (rev - self.revision)]
+
+    def _net(self, start, stop):
+        """Returns net changelist taking model from start to stop revision."""
+        parts = []
+        rev = start
+        while rev < stop:
+            block, offset = divmod(rev, CHECKPOINT_INTERVAL)
+            if offset == 0 and rev + CHECKPOINT_INTERVAL <= stop:
+                if block not in self._checkpoints:
+                    self._checkpoints[block] = _normalize(
+                        self._entry(r)
+                        for r in range(rev, rev + CHECKPOINT_INTERVAL))
+                parts.append(self._checkpoints[block])
+                rev += CHECKPOINT_INTERVAL
+            else:
+                parts.append(self._entry(rev))
+                rev += 1
+        return _normalize(parts)
+
+    def _drop_checkpoints(self, start, stop):
+        """ Drops checkpoints of blocks that contain any of revisions from
+            start up to stop (to the end if None).
+        """
+        first = start // CHECKPOINT_INTERVAL
+        for block in self._checkpoints.keys():
+            if block >= first and (stop is None
+                                   or block * CHECKPOINT_INTERVAL < stop):
+                del self._checkpoints[block]
+
+    def _forget(self, changelist):
+        self._bytes -= self._sizes.pop(id(changelist))
+
+    def _over_budget(self, entries, size):
+        return ((self.max_entries is not None and entries > self.max_entries)
+                or (self.max_bytes is not None and size > self.max_bytes))
+
+    def _enforce_budget(self):
+        entries = len(self.changelog) + len(self.redolog)
+        size = self._bytes
+        n = 0  # number of oldest changelists to evict
+        while n < len(self.changelog) - 1 and self._over_budget(entries, size):
+            size -= self._sizes[id(self.changelog[n])]
+            entries -= 1
+            n += 1
+        if n:
+            for cl in self.changelog[:n]:
+                self._forget(cl)
+            del self.changelog[:n]
+            self._drop_checkpoints(self._evicted, self._evicted + n)
+            self._evicted += n
+            _log.debug('evicted {0} oldest changelists from history, {1} '
+                       'left taking ~{2} bytes'.format(n, entries, size))
@@ -0,0 +1,357 @@
+import logging
+_log = logging.getLogger(__name__)
+
+import json
+import os
+from itertools import count
+from ..events import Model_Changed
+from elements import (Remove, Insert, Modify, Rectangle, Ellipse, Path, Link,
+                      Ref)
+from store import ElementStore
+
+
+"""
+Document file is a sequence of records, one JSON array per line:
+
+    ["snapshot", FORMAT_VERSION, [[id, definition], ...]]
+    ["commit", [change, ...]]
+
+Snapshot lists all elements in paint order, commit records one committed
+changelist. Loading starts from the last snapshot and replays commits after
+it, so saving a commit costs only as much as the changelist itself.
+
+Element definition is [tag, field, ...] where fields are listed in _TYPES and
+parents and link endpoints are referenced by id. Ids are assigned by journal,
+modified element keeps the id of the element it replaced. Changes are
+["+", id, definition] (Insert), ["-", id] (Remove) and ["~", id, definition]
+(Modify).
+"""
+
+FORMAT_VERSION = 1
+
+_TYPES = (  # tag, element class, fields in definition
+    ('R', Rectangle, ('x', 'y', 'width', 'height', 'parent')),
+    ('E', Ellipse, ('x', 'y', 'width', 'height', 'parent')),
+    ('P', Path, ('vertices', 'parent')),
+    ('L', Link, ('a', 'b')),
+)
+_TAG_OF = dict((cls, (tag, fields)) for tag, cls, fields in _TYPES)
+_CLASS_OF = dict((tag, (cls, fields)) for tag, cls, fields in _TYPES)
+_REFS = frozenset(['parent', 'a', 'b'])  # fields referencing elements
+
+
+class Journal(object):
+    """ Append-only document file that records changes committed to model.
+
+        Typical use is to *load* the document (creating it if needed), put
+        the loaded elements into the model and then *attach* the journal to
+        model's event bus so that every change gets appended to the file:
+
+            journal = Journal(path)
+            model.elems = journal.load()
+            journal.attach(eventbus)
+
+        Since the file only grows, *compact* should be called once in a while
+        (e.g. when saving explicitly) to replace the whole history in the file
+        with a single snapshot.
+
+        Models with stable ids aren't supported, their elements reference
+        parents and link targets by Ref which journal can't resolve, so
+        recording such elements raises ValueError.
+    """
+
+    def __init__(self, path, sync=False):
+        """ Parameters
+            ----------
+            path : str
+                path of document file
+            sync : bool
+                whether to fsync the file after every record, otherwise the
+                records are only flushed to the operating system
+        """
+        self.path = path
+        self.sync = sync
+        self._file = None
+        self._ids = {}  # element -> id
+        self._elems = {}  # id -> element
+        self._next_id = count()
+
+    def load(self):
+        """ Reads the document and opens it for appending, document is
+            created if it doesn't exist. Incomplete record at the end of
+            the file (e.g. left by a crash while writing) is discarded.
+
+            Returns
+            -------
+            list of elements in paint order
+
+            Raises
+            ------
+            ValueError if document is corrupted
+        """
+        if self._file is not None:
+            raise ValueError("Journal is already open")
+        records, valid_size = [], 0
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                records, valid_size = _read_records(f)
+        store = ElementStore()
+        self._reset()
+        for kind, rec in records:
+            if kind == 'snapshot':
+                store = ElementStore()
+                self._reset()
+                built = self._build(dict((i, d) for i, d in rec))
+                for i, _ in rec:
+                    self._register(i, built[i])
+                    store.append(built[i])
+            else:
+                for ch in self._decode(rec):
+                    if isinstance(ch, Remove):
+                        store.remove(ch.elem)
+                    elif isinstance(ch, Insert):
+                        store.append(ch.elem)
+                    else:
+                        store.replace(ch.elem, ch.modified)
+        if records and os.path.getsize(self.path) != valid_size:
+            _log.warning('discarding incomplete record at the end of '
+                         '{0}'.format(self.path))
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_size)
+        self._next_id = count(max(self._elems) + 1 if self._elems else 0)
+        self._file = open(self.path, 'wb' if not records else 'ab')
+        if not records:
+            self.snapshot([])
+        return list(store)
+
+    def attach(self, eventbus):
+        """Starts appending changes from Model_Changed events to journal."""
+        eventbus.register(Model_Changed, self._on_model_changed)
+
+    def append(self, changes):
+        """ Appends changelist to document.
+
+            Elements being removed or modified must be known to journal, i.e.
+            they must have been loaded, snapshotted or inserted by changes
+            appended earlier.
+        """
+        if not changes:
+            return
+        self._write(['commit', self._encode(changes)])
+
+    def snapshot(self, elems):
+        """ Appends snapshot of given elements (in paint order) to document,
+            changes appended afterwards are relative to it.
+        """
+        self._reset()
+        for el in elems:
+            self._register(next(self._next_id), el)
+        self._write(['snapshot', FORMAT_VERSION,
+                     [[self._ids[el], _definition(el, self._ids)]
+                      for el in elems]])
+
+    def compact(self, elems):
+        """ Rewrites the document so that it contains only snapshot of given
+            elements. New content is written to temporary file first, so the
+            document is never left incomplete.
+        """
+        self.close()
+        tmp_path = self.path + '.tmp'
+        self._file = open(tmp_path, 'wb')
+        try:
+            self.snapshot(elems)
+            self._file.close()
+        except:
+            self._file.close()
+            self._file = None
+            os.remove(tmp_path)
+            raise
+        try:
+            os.rename(tmp_path, self.path)
+        except OSError:  # rename doesn't replace existing file on Windows
+            os.remove(self.path)
+            os.rename(tmp_path, self.path)
+        self._file = open(self.path, 'ab')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _on_model_changed(self, evt):
+        if self._file is not None:
+            self.append(evt.data)
+
+    def _write(self, record):
+        if self._file is None:
+            raise ValueError("Journal is not open")
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+
+    def _reset(self):
+        self._ids.clear()
+        self._elems.clear()
+        self._next_id = count()
+
+    def _register(self, id_, elem):
+        self._ids[elem] = id_
+        self._elems[id_] = elem
+
+    def _encode(self, changes):
+        """ Returns JSON-ready list of changes, updating ids of elements.
+
+            Ids of all new elements are assigned before any definition gets
+            encoded, since new elements can reference each other (e.g. moved
+            child references its moved parent).
+        """
+        ids = []
+        for ch in changes:
+            if isinstance(ch, Insert):
+                ids.append(next(self._next_id))
+            else:
+                ids.append(self._ids.pop(ch.elem))
+                del self._elems[ids[-1]]
+        res = []
+        for ch, id_ in zip(changes, ids):
+            if isinstance(ch, Remove):
+                res.append(['-', id_])
+            else:
+                new = ch.modified if isinstance(ch, Modify) else ch.elem
+                self._register(id_, new)
+                res.append(['~' if isinstance(ch, Modify) else '+', id_])
+        for ch, rec in zip(changes, res):
+            if rec[0] != '-':
+                new = ch.modified if isinstance(ch, Modify) else ch.elem
+                rec.append(_definition(new, self._ids))
+        return res
+
+    def _decode(self, records):
+        """Returns changelist for given JSON change records, updating ids."""
+        defs = dict((rec[1], rec[2]) for rec in records if rec[0] != '-')
+        changes = []
+        for rec in records:
+            op, id_ = rec[0], rec[1]
+            if op == '+':
+                changes.append((Insert, id_))
+            elif op in '-~':
+                if id_ not in self._elems:
+                    raise ValueError("Unknown element id {0}".format(id_))
+                changes.append((Remove if op == '-' else Modify,
+                                self._elems.pop(id_)))
+            else:
+                raise ValueError("Invalid change record {0}".format(rec))
+        built = self._build(defs)
+        res = []
+        for rec, (change_cls, elem) in zip(records, changes):
+            if change_cls is Insert:
+                res.append(Insert(built[rec[1]]))
+            elif change_cls is Remove:
+                res.append(Remove(elem))
+            else:
+                res.append(Modify(elem, built[rec[1]]))
+        for id_, el in built.items():
+            self._register(id_, el)
+        return res
+
+    def _build(self, defs):
+        """ Builds elements from definitions (dict id -> definition) and
+            returns dict id -> element. References are resolved to elements
+            being built first, then to elements known to journal.
+        """
+        built = {}
+
+        def resolve(id_):
+            if id_ is None:
+                return None
+            if id_ in built:
+                return built[id_]
+            if id_ in self._elems:
+                return self._elems[id_]
+            raise ValueError("Unknown element id {0}".format(id_))
+
+        for root in defs:
+            stack = [root]  # iterative, deep hierarchies are fine
+            while stack:
+                id_ = stack[-1]
+                if id_ in built:
+                    stack.pop()
+                    continue
+                missing = [r for r in _references(defs[id_])
+                           if r in defs and r not in built]
+                if not missing:
+                    built[id_] = _element(defs[id_], resolve)
+                    stack.pop()
+                elif len(stack) > len(defs):
+                    raise ValueError("Circular element references")
+                else:
+                    stack.extend(missing)
+        return built
+
+
+
+def _read_records(f):
+    """ Reads records from the last snapshot onwards, returns tuple (list of
+        (kind, content) tuples, size of file part with complete records).
+    """
+    records = []
+    valid_size = 0
+    for line in f:
+        if not line.endswith('\n'):
+            break  # incomplete record, writing was interrupted
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            raise ValueError("Corrupted record at byte {0}".format(valid_size))
+        if rec[0] == 'snapshot':
+            if rec[1] != FORMAT_VERSION:
+                raise ValueError("Unsupported format version {0}".format(
+                    rec[1]))
+            records = [('snapshot', rec[2])]
+        elif rec[0] == 'commit':
+            records.append(('commit', rec[1]))
+        else:
+            raise ValueError("Unknown record {0}".format(rec[0]))
+        valid_size += len(line)
+    if records and records[0][0] != 'snapshot':
+        raise ValueError("Document doesn't start with snapshot")
+    return records, valid_size
+
+
+def _definition(elem, ids):
+    tag, fields = _TAG_OF[type(elem)]
+    res = [tag]
+    for k in fields:
+        val = getattr(elem, k)
+        if k in _REFS:
+            if isinstance(val, Ref):
+                raise ValueError("Journal doesn't support elements "
+                                 "referencing by Ref (model with stable "
+                                 "ids)")
+            res.append(None if val is None else ids[val])
+        elif k == 'vertices':
+            res.append(list(val))
+        else:
+            res.append(val)
+    return res
+
+
+def _references(definition):
+    _, fields = _CLASS_OF[definition[0]]
+    return [v for k, v in zip(fields, definition[1:])
+            if k in _REFS and v is not None]
+
+
+def _element(definition, resolve):
+    if definition[0] not in _CLASS_OF:
+        raise ValueError("Unknown element type {0}".format(definition[0]))
+    cls, fields = _CLASS_OF[definition[0]]
+    kwargs = {}
+    for k, v in zip(fields, definition[1:]):
+        if k in _REFS:
+            v = resolve(v)
+        elif k == 'vertices':
+            v = [tuple(vert) for vert in v]
+        kwargs[k] = v
+    return cls(**kwargs)
@@ -0,0 +1,549 @@
+import weakref
+from bisect import bisect
+from collections import OrderedDict, defaultdict
+from itertools import count
+from operator import itemgetter
+from elements import Link, Ref
+
+
+class ElementStore(object):
+    """ Indexed container for model elements.
+
+        Keeps elements in paint order (order of insertion, modified elements
+        retain their position) while providing constant time membership
+        testing, insertion, removal and replacement. Elements are also
+        partitioned by their type so that e.g. all Links can be retrieved
+        without scanning the whole model, and indexed by their parent so that
+        children of any element can be found without scanning. Links are
+        indexed by both of their endpoints.
+
+        Elements are used as keys, so every element can be present only once.
+
+        With *stable_ids* every element gets an id which passes to its
+        modified version when it's replaced, so elements can reference their
+        parent and link targets by Ref (see *ref*) instead of by value and
+        don't have to be modified along with them. Removed element gets its
+        id back when it's appended again (e.g. on undo) unless the id has
+        been taken meanwhile. Indexes are then keyed by Refs, but queries
+        accept elements as well as Refs; parents and link targets of stored
+        elements must be Refs.
+
+        *snapshot* returns immutable copy of elements that can be handed to
+        other threads, it's copied (in linear time) on first call after each
+        mutation and reused until the next one. *view*
+        returns read-only ElementsView which isn't copied when the store is
+        modified: store records its changes instead, so that the view can
+        restore its elements if it's used afterwards.
+
+        Store can start with elements of *source* (e.g. BinaryDocument),
+        which come first in paint order and are taken from it only when
+        they're needed: when looked up by value (e.g. to be removed or
+        replaced), when their parent's children or their link targets'
+        links are queried, when elements of their type are queried or when
+        iterating over the store. *source* is sequence of elements that
+        also has *find(elem)* returning index of element equal to given one
+        (None if there's no such) and *referencing(i)* returning indexes of
+        elements whose parent or link target is element i, and
+        *overlapping(x, y, width, height)* returning indexes of elements
+        whose bounds overlap given rectangle. Elements from source can't
+        have stable ids.
+    """
+
+    def __init__(self, elems=(), stable_ids=False, source=None):
+        if stable_ids and source is not None:
+            raise ValueError("Elements from source can't have stable ids")
+        self.stable_ids = stable_ids
+        self._uid_of = {}  # element -> id, when keeping stable ids
+        self._holder = {}  # id -> element
+        self._retired = weakref.WeakKeyDictionary()  # gone element -> id
+        self._next_uid = count()
+        self._slot_of = {}  # element -> slot key
+        self._order = OrderedDict()  # slot key -> element, in paint order
+        self._by_type = defaultdict(OrderedDict)  # type -> slot -> element
+        self._children = defaultdict(OrderedDict)  # parent -> slot -> child
+        self._links_out = defaultdict(OrderedDict)  # link.a -> slot -> link
+        self._links_in = defaultdict(OrderedDict)  # link.b -> slot -> link
+        self._source = source
+        self._first_slot = len(source) if source is not None else 0
+        self._from_source = {}  # slot -> element taken from source into it
+        self._taken = set()  # source indexes already taken, slots as well
+        self._next_slot = count(self._first_slot)
+        self._snapshot = None if self._first_slot else ()
+        self._head = _Change()  # to be filled by the next change
+        self._view = None  # view sharing store's state, until it changes
+        for el in elems:
+            self.append(el)
+
+    def __len__(self):
+        return len(self._slot_of) + self._first_slot - len(self._taken)
+
+    def __iter__(self):
+        if not self._first_slot:
+            return self._order.itervalues()
+        return self._iter_with_source()
+
+    def __contains__(self, elem):
+        if isinstance(elem, Ref):
+            return elem.uid in self._holder
+        return elem in self._slot_of or self._in_source(elem) is not None
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and list(self) == list(other)
+        except TypeError:
+            return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None  # mutable container
+
+    def __repr__(self):
+        return '{0}({1})'.format(self.__class__.__name__, list(self))
+
+    def snapshot(self):
+        """ Returns tuple of elements in paint order. Elements are immutable,
+            so the tuple shares them with the store and is safe to use from
+            other threads while store keeps being modified. Same tuple is
+            returned until the store is modified.
+        """
+        if self._snapshot is None:
+            self._snapshot = tuple(self)
+        return self._snapshot
+
+    def view(self):
+        """ Returns read-only ElementsView of elements, which is created in
+            constant time and keeps showing the current elements even after
+            the store is modified. Same view is returned until the store is
+            modified.
+        """
+        if self._view is None:
+            self._view = ElementsView(self)
+        return self._view
+
+    def of_type(self, cls):
+        """ Returns list of elements (in paint order) whose type is exactly
+            *cls*, subclasses are not included.
+        """
+        for i in xrange(self._first_slot):
+            if i not in self._taken:
+                self._take(i)
+        return self._by_type[cls].values() if cls in self._by_type else []
+
+    def elements_near(self, x1, y1, x2, y2):
+        """ Returns list of elements (in paint order) that includes all
+            elements whose bounding box overlaps given rectangle. That's
+            all elements, unless some are still in source: then just those
+            taken from it so far, elements appended since and elements of
+            source that overlap the rectangle.
+        """
+        if len(self._taken) == self._first_slot:
+            return list(self)
+        found = [(i, self._source[i]) for i in self._source.overlapping(
+            x1, y1, x2 - x1, y2 - y1) if i not in self._taken]
+        found += [(slot, el) for el, slot in self._slot_of.iteritems()]
+        found.sort(key=itemgetter(0))
+        return [el for _, el in found]
+
+    def ref(self, elem):
+        """ Returns Ref to element in store when keeping stable ids, element
+            itself otherwise, to be used as parent or link target.
+
+            Raises
+            ------
+            ValueError if element is not in store
+        """
+        self._take_equal(elem)
+        if elem not in self._slot_of:
+            raise ValueError("Element not in store: {0}".format(elem))
+        if not self.stable_ids:
+            return elem
+        return Ref(self._uid_of[elem])
+
+    def resolve(self, elem):
+        """ Returns element referenced by Ref (None if it's not in store) or
+            given element itself if it's not a Ref.
+        """
+        if isinstance(elem, Ref):
+            return self._holder.get(elem.uid)
+        return elem
+
+    def children_of(self, parent):
+        """Returns list of elements (in paint order) nested in *parent*."""
+        self._take_referencing(parent)
+        parent = self._key(parent)
+        if parent not in self._children:
+            return []
+        return self._children[parent].values()
+
+    def ancestors(self, elem):
+        """ Returns list of element's parent, grandparent etc. going upwards.
+        """
+        res = []
+        while elem is not None and elem.parent is not None:
+            elem = self.resolve(elem.parent)
+            if elem is not None:
+                res.append(elem)
+        return res
+
+    def descendants(self, parent):
+        """ Returns list of all elements nested in *parent* on any depth,
+            breadth first.
+        """
+        res = self.children_of(parent)
+        i = 0
+        while i < len(res):
+            res.extend(self.children_of(res[i]))
+            i += 1
+        return res
+
+    def links_from(self, elem):
+        """Returns list of Links (in paint order) starting at *elem*."""
+        self._take_referencing(elem)
+        elem = self._key(elem)
+        if elem not in self._links_out:
+            return []
+        return self._links_out[elem].values()
+
+    def links_to(self, elem):
+        """Returns list of Links (in paint order) ending at *elem*."""
+        self._take_referencing(elem)
+        elem = self._key(elem)
+        if elem not in self._links_in:
+            return []
+        return self._links_in[elem].values()
+
+    def links_for(self, elem):
+        """ Returns list of Links (in paint order) that are starting or ending
+            at *elem*, self-links are included only once.
+        """
+        self._take_referencing(elem)
+        elem = self._key(elem)
+        outgoing = self._links_out.get(elem, {})
+        incoming = self._links_in.get(elem, {})
+        if not incoming:
+            return outgoing.values()
+        if not outgoing:
+            return incoming.values()
+        slots = sorted(set(outgoing.keys()) | set(incoming.keys()))
+        return [self._ordering(slot)[slot] for slot in slots]
+
+    def links_between(self, a, b):
+        """ Returns list of Links (in paint order) connecting elements *a* and
+            *b* in either direction.
+        """
+        ends = set([self._key(a), self._key(b)])
+        return [l for l in self.links_for(a) if set([l.a, l.b]) == ends]
+
+    def append(self, elem):
+        """Adds element to the end of paint order."""
+        if elem in self:
+            raise ValueError("Element already in store: {0}".format(elem))
+        self._check_refs(elem)
+        slot = next(self._next_slot)
+        uid = None
+        if self.stable_ids:
+            uid = self._retired.pop(elem, None)
+            if uid is None or uid in self._holder:  # taken meanwhile
+                uid = next(self._next_uid)
+        self._changing(slot, uid, None)
+        if self.stable_ids:
+            self._uid_of[elem] = uid
+            self._holder[uid] = elem
+        self._order[slot] = elem
+        self._add(elem, slot)
+
+    def remove(self, elem):
+        """Removes element, raises ValueError if it's not in store."""
+        self._take_equal(elem)
+        if elem not in self._slot_of:
+            raise ValueError("Element not in store: {0}".format(elem))
+        slot = self._slot_of.pop(elem)
+        self._changing(slot, self._uid_of.get(elem), elem)
+        if self.stable_ids:
+            uid = self._uid_of.pop(elem)
+            del self._holder[uid]
+            self._retired[elem] = uid
+        del self._ordering(slot)[slot]
+        del self._by_type[type(elem)][slot]
+        if elem.parent is not None:
+            self._unindex(self._children, elem.parent, slot)
+        if isinstance(elem, Link):
+            self._unindex(self._links_out, elem.a, slot)
+            self._unindex(self._links_in, elem.b, slot)
+
+    def replace(self, old, new):
+        """ Replaces element with its modified version, keeping its position
+            in paint order.
+        """
+        if new in self:
+            raise ValueError("Element already in store: {0}".format(new))
+        self._take_equal(old)
+        if old not in self._slot_of:
+            raise ValueError("Element not in store: {0}".format(old))
+        self._check_refs(new)
+        slot = self._slot_of.pop(old)
+        self._changing(slot, self._uid_of.get(old), old)
+        if self.stable_ids:
+            uid = self._uid_of.pop(old)
+            self._uid_of[new] = uid
+            self._holder[uid] = new
+            self._retired.pop(new, None)
+            self._retired[old] = uid  # for going back to it, e.g. by undo
+        if type(old) is not type(new):
+            del self._by_type[type(old)][slot]
+        self._slot_of[new] = slot
+        self._ordering(slot)[slot] = new
+        self._index(self._by_type, type(new), slot, new)
+        if old.parent is not None and old.parent != new.parent:
+            self._unindex(self._children, old.parent, slot)
+        if new.parent is not None:
+            self._index(self._children, new.parent, slot, new)
+        if isinstance(old, Link):
+            if not isinstance(new, Link) or old.a != new.a:
+                self._unindex(self._links_out, old.a, slot)
+            if not isinstance(new, Link) or old.b != new.b:
+                self._unindex(self._links_in, old.b, slot)
+        if isinstance(new, Link):
+            self._index(self._links_out, new.a, slot, new)
+            self._index(self._links_in, new.b, slot, new)
+
+    def _add(self, elem, slot):
+        """Indexes element that's been put into given slot."""
+        self._slot_of[elem] = slot
+        self._index(self._by_type, type(elem), slot, elem)
+        if elem.parent is not None:
+            self._index(self._children, elem.parent, slot, elem)
+        if isinstance(elem, Link):
+            self._index(self._links_out, elem.a, slot, elem)
+            self._index(self._links_in, elem.b, slot, elem)
+
+    def _by_slot(self):
+        """Returns dict of all elements in store keyed by their slots."""
+        res = dict(self._order)
+        if self._first_slot:
+            res.update(self._from_source)
+            source = self._source
+            res.update((i, source[i]) for i in xrange(self._first_slot)
+                       if i not in self._taken)
+        return res
+
+    def _ordering(self, slot):
+        """Returns dict holding element in given slot."""
+        return self._order if slot >= self._first_slot else self._from_source
+
+    def _iter_with_source(self):
+        source, from_source = self._source, self._from_source
+        for i in xrange(self._first_slot):
+            if i in from_source:
+                yield from_source[i]
+            elif i not in self._taken:  # still in source
+                yield source[i]
+        for elem in self._order.itervalues():
+            yield elem
+
+    def _in_source(self, elem):
+        """ Returns index of source element equal to given one that hasn't
+            been taken yet, None if there's no such.
+        """
+        if len(self._taken) == self._first_slot:
+            return None
+        i = self._source.find(elem)
+        return None if i is None or i in self._taken else i
+
+    def _take(self, i):
+        """Takes element from source, it keeps its slot in paint order."""
+        elem = self._source[i]
+        self._taken.add(i)
+        self._from_source[i] = elem
+        self._add(elem, i)
+
+    def _take_equal(self, elem):
+        """Takes source element equal to given one, if there's such."""
+        if elem not in self._slot_of and not isinstance(elem, Ref):
+            i = self._in_source(elem)
+            if i is not None:
+                self._take(i)
+
+    def _take_referencing(self, elem):
+        """ Takes source elements whose parent or link target is equal to
+            given element, so that they're in indexes.
+        """
+        if len(self._taken) == self._first_slot or isinstance(elem, Ref):
+            return
+        i = self._source.find(elem)
+        if i is not None:
+            for j in self._source.referencing(i):
+                if j not in self._taken:
+                    self._take(j)
+
+    def _changing(self, slot, uid, before):
+        """ Must be called before modifying the store with slot that's
+            changing, id of element in it (None without stable ids) and
+            element that's been there so far (None if the slot was empty).
+            Records the change for views created until now, so that they
+            can restore elements as they were.
+        """
+        head = self._head
+        head.slot, head.uid, head.before = slot, uid, before
+        head.next = self._head = _Change()
+        self._view = None
+        self._snapshot = None
+
+    def _check_refs(self, elem):
+        """ Raises ValueError if keeping stable ids and element references
+            its parent or link targets by value.
+        """
+        if not self.stable_ids:
+            return
+        refs = [elem.a, elem.b] if isinstance(elem, Link) else [elem.parent]
+        if not all(r is None or isinstance(r, Ref) for r in refs):
+            raise ValueError("Parent and link targets must be Refs: "
+                             "{0}".format(elem))
+
+    def _key(self, elem):
+        """ Returns key under which indexes refer to given element, removed
+            or replaced element is referred to by the id it had.
+        """
+        if self.stable_ids and elem in self._uid_of:
+            return Ref(self._uid_of[elem])
+        if self.stable_ids and elem in self._retired:
+            return Ref(self._retired[elem])
+        return elem
+
+    def _index(self, index, key, slot, elem):
+        """ Puts element under its slot into index entry, keeping the entry
+            in paint order. Slot already in the entry keeps its position,
+            slot that isn't last (e.g. of replaced element) is inserted
+            among the others by rebuilding the entry.
+        """
+        entry = index[key]
+        if slot in entry or not entry or slot > next(reversed(entry)):
+            entry[slot] = elem
+            return
+        items = entry.items()
+        items.insert(bisect(entry.keys(), slot), (slot, elem))
+        index[key] = OrderedDict(items)
+
+    def _unindex(self, index, key, slot):
+        """Removes slot from index entry, drops the entry when empty."""
+        entry = index[key]
+        del entry[slot]
+        if not entry:
+            del index[key]
+
+
+class _Change(object):
+    """ Node of list of changes made to ElementStore, the last node is
+        empty and gets filled by the next change.
+    """
+    __slots__ = ('slot', 'uid', 'before', 'next')
+
+    def __init__(self):
+        self.slot = self.uid = self.before = self.next = None
+
+
+class ElementsView(object):
+    """ Read-only sequence of elements in ElementStore as they were when the
+        view was created.
+
+        View shares state with the store, so creating it doesn't copy
+        anything and membership testing takes constant time. Modifying the
+        store doesn't copy anything either: view keeps the store's list of
+        changes starting at its creation, and when it's first used after the
+        store has changed, it takes over the store's current elements and
+        rolls the changes back, which takes time of sorting the elements
+        plus time linear in number of changes. Views are meant to be used
+        on the same thread that modifies the store, use store's *snapshot*
+        for handing elements over to other threads.
+    """
+
+    def __init__(self, store):
+        self._store = store  # None once detached
+        self._since = store._head  # first change made after creation
+        self._elems = None  # tuple of elements, set when detached
+        self._members = None  # set of elements, set when detached
+        self._holder = None  # id -> element, set when detached
+
+    def __len__(self):
+        if self._attached():
+            return len(self._store)
+        return len(self._elems)
+
+    def __iter__(self):
+        return iter(self._sequence())
+
+    def __contains__(self, elem):
+        if self._attached():
+            return elem in self._store
+        if isinstance(elem, Ref):
+            return elem.uid in self._holder
+        return elem in self._members
+
+    def __getitem__(self, index):
+        return self._sequence()[index]
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and list(self) == list(other)
+        except TypeError:
+            return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None  # compares equal to lists
+
+    def __repr__(self):
+        return '{0}({1})'.format(self.__class__.__name__, list(self))
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def index(self, elem):
+        return self._sequence().index(elem)
+
+    def _sequence(self):
+        if self._attached():
+            return self._store.snapshot()
+        return self._elems
+
+    def _attached(self):
+        """ Returns whether store hasn't changed since the view was created,
+            otherwise detaches the view.
+        """
+        if self._store is None:
+            return False
+        if self._since.next is None:
+            return True
+        self._detach()
+        return False
+
+    def _detach(self):
+        """ Takes over the current elements of the store and rolls back the
+            changes made since the view was created.
+        """
+        store = self._store
+        by_slot = store._by_slot()
+        holder = dict(store._holder)
+        changes = []
+        change = self._since
+        while change.next is not None:
+            changes.append(change)
+            change = change.next
+        for change in reversed(changes):
+            if change.before is None:
+                del by_slot[change.slot]
+                if change.uid is not None:
+                    del holder[change.uid]
+            else:
+                by_slot[change.slot] = change.before
+                if change.uid is not None:
+                    holder[change.uid] = change.before
+        self._elems = tuple(by_slot[slot] for slot in sorted(by_slot))
+        self._members = set(self._elems)
+        self._holder = holder
+        self._store = self._since = None
@@ -0,0 +1,209 @@
+from quadpy.quadtree import fits, overlaps
+
+
+# leaf node is split into quadrants once it holds more than this many items
+NODE_CAPACITY = 16
+
+# nodes at this depth are never split, keeps degenerate inputs (e.g. many
+# items at the same point) from building endless chains of nodes
+MAX_DEPTH = 24
+
+_INF = float('inf')
+
+
+class SpatialIndex(object):
+    """ Quadtree of items with bounding boxes (x1, y1, x2, y2), for finding
+        items under a point, overlapping a rectangle or enclosed in it
+        without checking every item.
+
+        Item is kept in the smallest node its bounds fit into, so items
+        spanning node's quadrants stay in the node itself. Root grows (by
+        getting parent nodes) whenever item outside of it is inserted, so the
+        index doesn't need to know the extent of items in advance.
+
+        Query results are in the order in which items were inserted, updating
+        item's bounds keeps its position. Items must be hashable.
+    """
+
+    def __init__(self):
+        self._root = None
+        self._entries = {}  # item -> (node, bounds, insertion number)
+        self._counter = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, item):
+        return item in self._entries
+
+    def bounds(self, item):
+        """Returns bounds item was inserted (or last updated) with."""
+        return self._entries[item][1]
+
+    def insert(self, item, bounds):
+        """ Adds item with given bounds, raises ValueError if it's already
+            in the index.
+        """
+        if item in self._entries:
+            raise ValueError("Item already in index: {0}".format(item))
+        self._counter += 1
+        self._place(item, bounds, self._counter)
+
+    def remove(self, item):
+        """Removes item, raises ValueError if it's not in the index."""
+        if item not in self._entries:
+            raise ValueError("Item not in index: {0}".format(item))
+        node, _, _ = self._entries.pop(item)
+        del node.items[item]
+
+    def update(self, item, bounds):
+        """ Changes bounds of item, which is moved to other node only if its
+            new bounds don't belong to the current one.
+        """
+        node, old_bounds, number = self._entries[item]
+        if bounds == old_bounds:
+            return
+        if fits(bounds, node.bounds) and (node.children is None
+                                          or _quadrant(node, bounds) is None):
+            node.items[item] = bounds
+            self._entries[item] = (node, bounds, number)
+        else:
+            del node.items[item]
+            self._place(item, bounds, number)
+
+    def in_order(self, items):
+        """Returns list of given items sorted in order of insertion."""
+        return sorted(items, key=lambda item: self._entries[item][2])
+
+    def under(self, x, y):
+        """Returns items whose bounds contain given point (edges included)."""
+        contains = lambda b: b[0] <= x <= b[2] and b[1] <= y <= b[3]
+        return self._query(contains, contains)
+
+    def overlapping(self, bounds):
+        """Returns items whose bounds overlap given bounds."""
+        return self._query(lambda b: overlaps(b, bounds),
+                           lambda b: overlaps(b, bounds))
+
+    def enclosed(self, bounds):
+        """Returns items whose bounds fit within given bounds."""
+        return self._query(lambda b: overlaps(b, bounds),
+                           lambda b: fits(b, bounds))
+
+    def _query(self, visit, match):
+        """ Returns items in nodes whose bounds satisfy *visit* and whose own
+            bounds satisfy *match*, in order of insertion.
+        """
+        if self._root is None:
+            return []
+        found = []
+        pending = [self._root]
+        while pending:
+            node = pending.pop()
+            if not visit(node.bounds):
+                continue
+            found.extend(item for item, b in node.items.iteritems()
+                         if match(b))
+            if node.children is not None:
+                pending.extend(node.children)
+        found.sort(key=lambda item: self._entries[item][2])
+        return found
+
+    def _place(self, item, bounds, number):
+        if not all(_INF > abs(v) for v in bounds):  # would grow forever
+            raise ValueError("Bounds must be finite: {0}".format(bounds))
+        if self._root is None:
+            self._root = _Node(_square_around(bounds), 0)
+        while not fits(bounds, self._root.bounds):
+            self._grow_towards(bounds)
+        node = self._root
+        while True:
+            if node.children is None:
+                if len(node.items) < NODE_CAPACITY or node.depth >= MAX_DEPTH:
+                    break
+                self._split(node)
+            quadrant = _quadrant(node, bounds)
+            if quadrant is None:
+                break
+            node = node.children[quadrant]
+        node.items[item] = bounds
+        self._entries[item] = (node, bounds, number)
+
+    def _split(self, node):
+        node.children = [_Node(b, node.depth + 1)
+                         for b in _quadrants(node.bounds)]
+        for item, bounds in node.items.items():
+            quadrant = _quadrant(node, bounds)
+            if quadrant is not None:
+                child = node.children[quadrant]
+                del node.items[item]
+                child.items[item] = bounds
+                self._entries[item] = (child,) + self._entries[item][1:]
+
+    def _grow_towards(self, bounds):
+        """Makes root a quadrant of twice as large root, extended to bounds."""
+        old = self._root
+        x1, y1, x2, y2 = old.bounds
+        size = x2 - x1
+        # extend left (up) if item sticks out on that side, otherwise right
+        left, up = bounds[0] < x1, bounds[1] < y1
+        nx1 = x1 - size if left else x1
+        ny1 = y1 - size if up else y1
+        root = _Node((nx1, ny1, nx1 + 2 * size, ny1 + 2 * size), 0)
+        root.children = [_Node(b, 1) for b in _quadrants(root.bounds)]
+        root.children[2 * up + left] = old  # order of _quadrants
+        _deepen(old)
+        self._root = root
+
+
+
+class _Node(object):
+    __slots__ = ('bounds', 'depth', 'items', 'children')
+
+    def __init__(self, bounds, depth):
+        self.bounds = bounds
+        self.depth = depth
+        self.items = {}  # item -> bounds
+        self.children = None  # list of 4 quadrant nodes once split
+
+
+def _square_around(bounds):
+    x1, y1, x2, y2 = bounds
+    size = max(x2 - x1, y2 - y1, 1)
+    return (x1, y1, x1 + size, y1 + size)
+
+
+def _quadrants(bounds):
+    x1, y1, x2, y2 = bounds
+    mx, my = (x1 + x2) / 2.0, (y1 + y2) / 2.0
+    return [(x1, y1, mx, my), (mx, y1, x2, my),
+            (x1, my, mx, y2), (mx, my, x2, y2)]
+
+
+def _quadrant(node, bounds):
+    """ Returns index of node's quadrant (see _quadrants) that given bounds
+        fit into, or None if they span multiple quadrants.
+    """
+    x1, y1, x2, y2 = node.bounds
+    mx, my = (x1 + x2) / 2.0, (y1 + y2) / 2.0
+    if bounds[2] <= mx:
+        col = 0
+    elif bounds[0] >= mx:
+        col = 1
+    else:
+        return None
+    if bounds[3] <= my:
+        return col
+    elif bounds[1] >= my:
+        return 2 + col
+    return None
+
+
+def _deepen(node):
+    """Increments depth of node and all its descendants."""
+    pending = [node]
+    while pending:
+        n = pending.pop()
+        n.depth += 1
+        if n.children is not None:
+            pending.extend(n.children)
@@ -1,6 +1,7 @@
 import collections
 import inspect
-from copy import copy
+import operator
+from itertools import izip
 
 
 def duplicates(ls):
@@ -58,6 +59,50 @@ def bounding_box_around_points(point_list):
     return reduce(expand_box, point_list, (pos_inf, pos_inf, neg_inf, neg_inf))
 
 
+def simplify_polyline(points, tolerance):
+    """ Returns list of (x, y) points of polyline simplified so that it
+        doesn't deviate from the original one by more than *tolerance*.
+
+        Points closer than half the tolerance to the previous kept point are
+        dropped first (radial distance), which is cheap and removes most of
+        the points of densely sampled polylines. The rest is simplified by
+        Douglas-Peucker with the other half of the tolerance. First and last
+        points are always kept.
+    """
+    half2 = (tolerance / 2.0) ** 2
+    pts = []
+    for p in points:
+        if (not pts or (p[0] - pts[-1][0]) ** 2
+                + (p[1] - pts[-1][1]) ** 2 > half2):
+            pts.append(tuple(p))
+    if pts and pts[-1] != tuple(p):
+        pts.append(tuple(p))  # last point must stay
+    if len(pts) < 3:
+        return pts
+
+    keep = [False] * len(pts)
+    keep[0] = keep[-1] = True
+    pending = [(0, len(pts) - 1)]  # not recursive, polylines can be long
+    while pending:
+        first, last = pending.pop()
+        ax, ay = pts[first]
+        dx, dy = pts[last][0] - ax, pts[last][1] - ay
+        length2 = float(dx * dx + dy * dy)
+        farthest, max_dist2 = None, half2
+        for i in xrange(first + 1, last):
+            px, py = pts[i][0] - ax, pts[i][1] - ay
+            t = (px * dx + py * dy) / length2 if length2 else 0
+            t = min(1, max(0, t))  # distance to segment, not to line
+            dist2 = (px - t * dx) ** 2 + (py - t * dy) ** 2
+            if dist2 > max_dist2:
+                farthest, max_dist2 = i, dist2
+        if farthest is not None:
+            keep[farthest] = True
+            pending.append((first, farthest))
+            pending.append((farthest, last))
+    return [p for p, k in izip(pts, keep) if k]
+
+
 def partition(ls, pred=lambda el: el):
     """ Partitions list (or other iterable) into two lists and returns tuple
         (matched_elems_list, unmatched_elems_list).
@@ -117,6 +162,10 @@ class keydefaultdict(dict):
 #            re.match("[_A-Za-z][_a-zA-Z0-9]*$", str_val) is not None)
 
 
+_FIELDS_ERROR = ("Must assign only and all fields specified by __init__ "
+                 "parameters")
+
+
 class RecordMeta(type):
     def __new__(mcs, name, bases, dct):
         if len(bases) != 1:
@@ -127,7 +176,7 @@ class RecordMeta(type):
             argspec = inspect.getargspec(init)
             if (argspec.varargs, argspec.keywords) != (None, None):
                 raise TypeError("Varargs and keywords are not allowed")
-            if '_keys' in argspec.args or '_frozen' in argspec.args:
+            if any(k in argspec.args for k in ('_keys', '_frozen', '_hash')):
                 raise TypeError("No cheating")
 
             for k in argspec.args[1:]:
@@ -143,37 +192,64 @@ class RecordMeta(type):
             # add 1/subtract 1 logic makes sure that _frozen has value 1 only
             # when outermost (child class') __init__ exits.
             def wrapped_init(self, *args, **kwargs):
-                if not hasattr(self, '_frozen'):
-                    self._frozen = 2
-                else:
-                    self._frozen += 1
+                frozen = getattr(self, '_frozen', None)
+                object.__setattr__(self, '_frozen',
+                                   2 if frozen is None else frozen + 1)
                 init(self, *args, **kwargs)  # call user-defined __init__
-                self._frozen -= 1
+                object.__setattr__(self, '_frozen', self._frozen - 1)
                 if self._frozen == 1:  # last __init__ has exited, check values
-                    assigned_keys = self.__dict__.keys()
-                    assigned_keys.remove('_frozen')
-                    if sorted(all_keys) != sorted(assigned_keys):
-                        raise TypeError("Must assign only and all fields "
-                                        "specified by __init__ parameters")
+                    try:
+                        values = self._values()
+                    except AttributeError:  # some field wasn't assigned
+                        raise TypeError(_FIELDS_ERROR)
                     # it is ok to pass unhashable values to __init__, but user
                     # must take care to convert them to hashable. after
-                    # outermost __init__ exits, all fields must be hashable
-                    for v in self.__dict__.values():
-                        hash(v)
-
+                    # outermost __init__ exits, all fields must be hashable,
+                    # computing the hash checks that and caches it right away
+                    object.__setattr__(self, '_hash',
+                                       hash((self.__class__,) + values))
 
             dct['__init__'] = wrapped_init
-            dct['_keys'] = tuple(all_keys)
+        own_keys = [k for k in all_keys if bases[0] is object
+                    or k not in bases[0]._keys]
+        # fields are kept in slots instead of __dict__, instance of Record
+        # itself also has slots for freezing counter and cached hash, other
+        # slots can be declared by class (e.g. __weakref__)
+        dct['__slots__'] = tuple(dct.get('__slots__', ())) + tuple(
+            own_keys) + (('_frozen', '_hash') if bases[0] is object else ())
+        dct['_keys'] = tuple(all_keys)
+        dct['_key_set'] = frozenset(all_keys)
+        dct['_values'] = _values_getter(all_keys)
         return type.__new__(mcs, name, bases, dct)
 
 
+def _values_getter(keys):
+    """Returns function returning tuple of instance's values of given keys."""
+    if not keys:
+        return lambda self: ()
+    getter = operator.attrgetter(*keys)
+    if len(keys) == 1:
+        return lambda self: (getter(self),)
+    return lambda self: getter(self)  # attrgetter itself doesn't bind self
+
+
 class Record(object):
+    """ Immutable record with named fields, similar to namedtuple.
+
+        Fields are declared as parameters of __init__ which must assign all
+        of them (and nothing else), after outermost __init__ exits instance
+        is frozen. Fields are kept in slots and hash is computed once, when
+        the instance is created, so records containing other records (e.g.
+        element's parent) don't have to hash the whole chain again.
+    """
     __metaclass__ = RecordMeta
 
     def __setattr__(self, name, value):
-        if hasattr(self, '_frozen') and self._frozen == 1:
+        if getattr(self, '_frozen', None) == 1:
             raise TypeError('{0} is immutable'.format(self.__class__.__name__))
-        self.__dict__[name] = value
+        if name not in self._key_set:
+            raise TypeError(_FIELDS_ERROR)
+        object.__setattr__(self, name, value)
 
     def __init__(self):
         pass  # safeguard to assure metaclass has something to wrap
@@ -181,26 +257,56 @@ class Record(object):
     def _replace(self, **kwargs):
         if '_frozen' in kwargs.keys():
             raise TypeError("Nope")
-        if any(k not in self._keys for k in kwargs.keys()):
+        if any(k not in self._key_set for k in kwargs.keys()):
             raise TypeError("Invalid parameter name, only field names allowed")
-        dup = copy(self)
-        dup.__dict__.update(kwargs)
+        cls = self.__class__
+        dup = cls.__new__(cls)
+        for k in self._keys:
+            object.__setattr__(dup, k,
+                               kwargs[k] if k in kwargs else getattr(self, k))
+        object.__setattr__(dup, '_frozen', 1)
+        object.__setattr__(dup, '_hash', None)  # computed when needed
         return dup
 
+    @classmethod
+    def _make(cls, values):
+        """ Creates record from sequence of field values (in order of
+            *_keys*) without calling __init__, so the values are neither
+            checked nor converted. Meant for creating many records at once
+            from values that have already been validated.
+        """
+        if len(values) != len(cls._keys):
+            raise TypeError(_FIELDS_ERROR)
+        rec = cls.__new__(cls)
+        for k, v in izip(cls._keys, values):
+            object.__setattr__(rec, k, v)
+        object.__setattr__(rec, '_frozen', 1)
+        object.__setattr__(rec, '_hash', None)  # computed when needed
+        return rec
+
     def __eq__(self, other):
-        if isinstance(other, tuple):
-            return tuple(getattr(self, k) for k in self._keys) == other
-        elif type(other) == type(self):
-            return all(getattr(self, k) == getattr(other, k)
-                       for k in self._keys)
+        if self is other:
+            return True
+        if type(other) is type(self):
+            if self._hash is not None and other._hash is not None:
+                if self._hash != other._hash:
+                    return False
+            return self._values() == other._values()
+        elif isinstance(other, tuple):
+            return self._values() == other
         return False
 
+    def __ne__(self, other):
+        return not self == other
+
     def __repr__(self):
         keyvals = ['{0}={1}'.format(k, getattr(self, k)) for k in self._keys]
         return '{0}({1})'.format(self.__class__.__name__, ', '.join(keyvals))
 
     def __hash__(self):
-        vals = tuple(getattr(self, k) for k in self._keys)
-        # prevent records of different types with same fields from having same
-        # hashes by including class itself along with values
-        return hash((self.__class__,) + vals)
+        if self._hash is None:
+            # prevent records of different types with same fields from having
+            # same hashes by including class itself along with values
+            object.__setattr__(self, '_hash',
+                               hash((self.__class__,) + self._values()))
+        return self._hash
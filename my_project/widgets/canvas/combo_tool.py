@@ -41,7 +41,8 @@ def make(eb, view, event_pack, elem_map, canvas_model):
     data = Dummy(start_x=float('inf'),
                  start_y=float('inf'),
                  marquee=None,
-                 moved=())
+                 moved=(),
+                 live=())
 
     selection = []  # this one keeps elements after tool has finished
     # TODO: don't store cel instances in selection or at least make sure that
@@ -92,7 +93,7 @@ def make(eb, view, event_pack, elem_map, canvas_model):
             data.marquee.elem = rect
         else:
             data.marquee = MarqueeCE(rect, view)
-            view.add(data.marquee)
+            view.add(data.marquee, live=True)
 
     def clear_marquee(*_):
         if data.marquee:
@@ -100,7 +101,7 @@ def make(eb, view, event_pack, elem_map, canvas_model):
             data.marquee = None
 
     def redraw_view(*_):
-        view.repaint()
+        view.repaint_damaged()
 
     def simulate_move(evt, hsm):
         x, y = data.start_x, data.start_y
@@ -111,15 +112,42 @@ def make(eb, view, event_pack, elem_map, canvas_model):
             # remember original model elements and corresponding canvas elems
             # to be able to undo this fake move later
             data.moved = [(chg.elem, elem_map[chg.elem]) for chg in changes]
+            make_live(orig_el for orig_el, _ in data.moved)
         for (_, cel), chg in zip(data.moved, changes):
             # TODO: will these two lists always be in same order?
             cel.elem = chg.modified
+        invalidate_links(orig_el for orig_el, _ in data.moved)
 
     def undo_simulated_move(*_):
         for orig_el, cel in data.moved:
             cel.elem = orig_el
+        invalidate_links(orig_el for orig_el, _ in data.moved)
         data.moved = ()
 
+    def make_live(elems):
+        # elements being dragged (and links attached to them) are drawn on
+        # top of view's cached layer, so it's not re-rendered on every move
+        elems = list(elems)  # iterated twice, might be a generator
+        cels = [elem_map[el] for el in elems]
+        cels += [elem_map[lnk] for el in elems
+                 for lnk in canvas_model.get_links_for(el) if lnk in elem_map]
+        for cel in cels:
+            view.set_live(cel, True)
+        data.live = tuple(cels)
+
+    def make_static(*_):
+        for cel in data.live:
+            view.set_live(cel, False)
+        data.live = ()
+
+    def invalidate_links(elems):
+        # with stable ids links referencing moved elements aren't among
+        # the changes, their shapes have to be updated anyway
+        if canvas_model.stable_ids:
+            for el in elems:
+                for lnk in canvas_model.get_links_for(el):
+                    elem_map[lnk].invalidate()
+
     def commit_real_move(evt, hsm):
         x, y = data.start_x, data.start_y
         dx, dy = evt.x - x, evt.y - y
@@ -143,6 +171,7 @@ def make(eb, view, event_pack, elem_map, canvas_model):
 
     def clean_up(*_):
         undo_simulated_move()
+        make_static()
         clear_marquee()
         data.reset()
 
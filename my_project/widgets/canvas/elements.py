@@ -1,6 +1,8 @@
+from math import floor, log
 import java.awt as awt
 from view import CanvasElement
 from ... import model
+from ...util import simplify_polyline
 from org.six11.util.gui.shape import ShapeFactory
 from org.six11.util.pen import Pt
 
@@ -13,6 +15,12 @@ SELECTED_FILL_COLOR = ELEMENT_FILL_COLOR
 LINE_STROKE_WIDTH = 9
 PATH_PRECISION = 1
 
+# paths are drawn and hit-tested simplified so that they don't deviate from
+# their exact shape by more than this many pixels on screen
+SIMPLIFY_TOLERANCE = 0.5
+# number of zoom levels (powers of two) whose simplified path shapes are kept
+SIMPLIFIED_SHAPES_KEPT = 4
+
 
 class CanvasModelElement(CanvasElement):
     def __init__(self, elem, canvas):
@@ -28,7 +36,7 @@ class CanvasModelElement(CanvasElement):
     def elem(self, new_elem):
         assert type(new_elem) == type(self.elem), "must be same type as old"
         self._elem = new_elem
-        self._must_update = True
+        self.invalidate()
 
     def __repr__(self):
         return '{0}({1})'.format(self.__class__.__name__, self.elem)
@@ -39,7 +47,9 @@ class CanvasModelElement(CanvasElement):
 
     @is_selected.setter
     def is_selected(self, true_or_false):
-        self._is_selected = true_or_false
+        if true_or_false != self._is_selected:
+            self._is_selected = true_or_false
+            self.canvas.damage_element(self)  # painted in other colors
 
     @property
     def fill_color(self):
@@ -81,12 +91,31 @@ class PathCE(CanvasModelElement):
     def __init__(self, elem, canvas):
         assert isinstance(elem, model.Path)
         super(PathCE, self).__init__(elem, canvas)
+        self._simplified = {}  # zoom level -> simplified shape
 
     def _make_shape(self):
-        shape = awt.geom.Path2D.Float()
-        shape.moveTo(*self.elem.vertices[0])
-        for v in self.elem.vertices[1:]:
-            shape.lineTo(*v)
+        return _polyline_shape(self.elem.vertices)
+
+    def invalidate(self):
+        self._simplified = {}
+        super(PathCE, self).invalidate()
+
+    def shape_for_zoom(self, zoom):
+        """ Returns shape simplified for given zoom, built once for every
+            zoom level between two powers of two. Vertices that are closer
+            than SIMPLIFY_TOLERANCE pixels to the rest of the path are left
+            out.
+        """
+        level = int(floor(log(zoom, 2)))
+        shape = self._simplified.get(level)
+        if shape is None:
+            if len(self._simplified) >= SIMPLIFIED_SHAPES_KEPT:
+                self._simplified.clear()
+            # pixel is the smallest at the highest zoom of the level
+            tolerance = SIMPLIFY_TOLERANCE / 2.0 ** (level + 1)
+            shape = _polyline_shape(simplify_polyline(self.elem.vertices,
+                                                      tolerance))
+            self._simplified[level] = shape
         return shape
 
     @property
@@ -96,13 +125,15 @@ class PathCE(CanvasModelElement):
     def hit_test(self, x, y):
         # have to check against the stroke since Java's path is
         # implicitly closed and behaves like a polygon
-        stroke_width = LINE_STROKE_WIDTH / self.canvas.zoom
-        sh = awt.BasicStroke(stroke_width).createStrokedShape(self.shape)
+        zoom = self.canvas.zoom
+        sh = awt.BasicStroke(LINE_STROKE_WIDTH / zoom).createStrokedShape(
+            self.shape_for_zoom(zoom))
         return sh.contains(x, y)
 
     def intersects(self, x1, y1, x2, y2):
-        stroke_width = LINE_STROKE_WIDTH / self.canvas.zoom
-        sh = awt.BasicStroke(stroke_width).createStrokedShape(self.shape)
+        zoom = self.canvas.zoom
+        sh = awt.BasicStroke(LINE_STROKE_WIDTH / zoom).createStrokedShape(
+            self.shape_for_zoom(zoom))
         return sh.intersects(x1, y1, x2 - x1, y2 - y1)
 
 
@@ -116,6 +147,9 @@ class LinkCE(PathCE):
         self.a = a
         self.b = b
 
+    def shape_for_zoom(self, zoom):
+        return self.shape  # just a line or an arc, nothing to simplify
+
     def _make_shape(self):
         if self.a == self.b:  # draw self-loop
             x1, y1, x2, y2 = self.a.bounds
@@ -159,6 +193,15 @@ from jarray import zeros
 from java.awt.geom import PathIterator
 
 
+def _polyline_shape(vertices):
+    shape = awt.geom.Path2D.Float()
+    vertices = iter(vertices)
+    shape.moveTo(*next(vertices))
+    for v in vertices:
+        shape.lineTo(*v)
+    return shape
+
+
 def iterpath(shape):
     """Python iterator for shape.getPathIterator"""
     #piter = awt.geom.FlatteningPathIterator(shape.getPathIterator(None), 3)
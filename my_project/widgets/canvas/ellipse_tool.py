@@ -30,14 +30,14 @@ def make(eb, view, event_pack, elem_map, canvas_model):
             data.preview.elem = ellipse
         else:
             data.preview = EllipseCE(ellipse, view)
-            view.add(data.preview)
+            view.add(data.preview, live=True)
 
     def remove_preview(*_):
         view.remove(data.preview) if data.preview else ''
         data.preview = None
 
     def redraw_view(*_):
-        view.repaint()
+        view.repaint_damaged()
 
     def commit_to_model(evt, _):
         x, y = view.transformed(data.start_x, data.start_y)
@@ -60,7 +60,8 @@ def make(eb, view, event_pack, elem_map, canvas_model):
         view.remove(data.preview) if data.preview else ''
         # preview is a link if mouse is over element
         if data.end_elem:
-            elem = model.Link(data.start_elem, data.end_elem)
+            elem = model.Link(canvas_model.ref(data.start_elem),
+                              canvas_model.ref(data.end_elem))
             start_cel = elem_map[data.start_elem]
             end_cel = elem_map[data.end_elem]
             data.preview = LinkCE(elem, start_cel, end_cel, view)
@@ -70,17 +71,18 @@ def make(eb, view, event_pack, elem_map, canvas_model):
                      view.transformed(data.end_x, data.end_y))
             elem = model.Path(verts)
             data.preview = PathCE(elem, view)
-        view.add(data.preview)
+        view.add(data.preview, live=True)
 
     def remove_preview(*_):
         view.remove(data.preview) if data.preview else ''
         data.preview = None
 
     def redraw_view(*_):
-        view.repaint()
+        view.repaint_damaged()
 
     def commit_to_model(*_):
-        link = model.Link(data.start_elem, data.end_elem)
+        link = model.Link(canvas_model.ref(data.start_elem),
+                          canvas_model.ref(data.end_elem))
         _log.info('about to commit link {0}'.format(link))
         canvas_model.commit([model.Insert(link)])
 
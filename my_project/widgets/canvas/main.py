@@ -73,8 +73,10 @@ def make(eventbus, canvas_model):
             model.Rectangle: lambda: RectangleCE(el, view),
             model.Ellipse: lambda: EllipseCE(el, view),
             model.Path: lambda: PathCE(el, view),
-            model.Link: lambda: LinkCE(el, elem_map[el.a],
-                                       elem_map[el.b], view),
+            model.Link: lambda: LinkCE(el,
+                                       elem_map[canvas_model.resolve(el.a)],
+                                       elem_map[canvas_model.resolve(el.b)],
+                                       view),
         }
         cel = factory[el.__class__]()
         return cel
@@ -102,6 +104,12 @@ def make(eventbus, canvas_model):
             cel.elem = ch.modified
             # line above will make CanvasElement return new Shape to be
             # rendered once its shape property gets accessed next time
+            if canvas_model.stable_ids:
+                # links reference modified element by id, so they don't get
+                # modified along with it, but their shapes still change
+                for lnk in canvas_model.get_links_for(ch.modified):
+                    if lnk in elem_map:
+                        elem_map[lnk].invalidate()
 
         switch = {
             model.Insert: insert,
@@ -122,7 +130,7 @@ def make(eventbus, canvas_model):
 
     # draw elements that are already in the model
     apply_changes(model.Insert(el) for el in canvas_model._elems)
-    view.repaint()
+    view.repaint_all()
 
 
     data = Dummy(prev_cursor_pos=None)
@@ -138,7 +146,10 @@ def make(eventbus, canvas_model):
 
 
     def redraw_view(*_):
-        view.repaint()
+        view.repaint_damaged()
+
+    def redraw_whole_view(*_):
+        view.repaint_all()
 
     def get_tool(_, hsm):
         return hsm.data.canvas_tool or DEFAULT_TOOL
@@ -210,7 +221,7 @@ def make(eventbus, canvas_model):
                     redraw_view)),
                 Canvas_Wheel: Internal(fseq(
                     zoom_view,
-                    redraw_view)),
+                    redraw_whole_view)),
             },
             'idle': {
                 Initial: Choice(
@@ -240,7 +251,7 @@ def make(eventbus, canvas_model):
                 Canvas_Move: Internal(fseq(
                     pan_view,
                     remember_cursor_pos,
-                    redraw_view)),
+                    redraw_whole_view)),
                 Canvas_Middle_Up: T('idle'),
             },
         }
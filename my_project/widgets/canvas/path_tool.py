@@ -44,14 +44,14 @@ def make(eb, view, event_pack, elem_map, canvas_model):
             data.preview.elem = path
         else:
             data.preview = PathCE(path, view)
-            view.add(data.preview)
+            view.add(data.preview, live=True)
 
     def remove_preview(*_):
         view.remove(data.preview) if data.preview else ''
         data.preview = None
 
     def redraw_view(*_):
-        view.repaint()
+        view.repaint_damaged()
 
     def commit_to_model(*_):
         path = model.Path(data.vertices)
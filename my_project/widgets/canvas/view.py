@@ -1,12 +1,25 @@
+from collections import OrderedDict
+from math import ceil
 import java.awt as awt
+from java.awt.image import BufferedImage
 from javax.swing import JPanel
-from quadpy.quadtree import fits, overlaps, fix_bounds
+from quadpy.quadtree import fix_bounds, overlaps
+from ...spatial import SpatialIndex
 
 BACKGROUND_COLOR = awt.Color.WHITE
 
-# TODO:
-# switch to quadtree completely (under, overlapping, enclosed)
-# repaint dirty regions only
+# extra pixels repainted around damaged regions, covers strokes that stick
+# out of elements' bounds and antialiasing
+DAMAGE_MARGIN = 2
+
+# Level of detail: elements whose larger dimension on screen (in pixels) is
+# below LOD_SKIP_SIZE aren't drawn at all, those below LOD_POINT_SIZE are
+# drawn as a single pixel and those below LOD_BOX_SIZE as their bounding box.
+# Defaults for CanvasView, see CanvasView.set_lod; off until paint timings
+# (benchmarks/lod.py) show which thresholds pay off.
+LOD_SKIP_SIZE = 0
+LOD_POINT_SIZE = 0
+LOD_BOX_SIZE = 0
 
 
 class CanvasElement(object):
@@ -34,6 +47,7 @@ class CanvasElement(object):
     @fill_color.setter
     def fill_color(self, color):
         self._fill_color = color
+        self._canvas.damage_element(self)
 
     @property
     def stroke_color(self):
@@ -42,6 +56,7 @@ class CanvasElement(object):
     @stroke_color.setter
     def stroke_color(self, color):
         self._stroke_color = color
+        self._canvas.damage_element(self)
 
     @property
     def bounds(self):
@@ -51,9 +66,22 @@ class CanvasElement(object):
     def __repr__(self):
         return '{0}({1})'.format(self.__class__.__name__)
 
+    def invalidate(self):
+        """ Makes shape to be recreated when it's accessed next time, must be
+            called whenever element's geometry changes.
+        """
+        self._must_update = True
+        self._canvas.element_changed(self)
+
     def _make_shape(self):
         raise NotImplementedError("override me")
 
+    def shape_for_zoom(self, zoom):
+        """ Returns shape to be drawn at given zoom, elements with lots of
+            detail can return simplified shape.
+        """
+        return self.shape
+
     def hit_test(self, x, y):
         return self.shape.contains(x, y)
 
@@ -65,27 +93,158 @@ class CanvasElement(object):
 class CanvasView(JPanel):
     """ Java Swing component responsible for drawing CanvasElement instances
         that are added to it.
+
+        View keeps track of damaged region, which is the bounding box (in
+        model coordinates) around old and new bounds of elements added,
+        removed or changed since the last repaint. *repaint_damaged* repaints
+        just that region and painting draws only elements overlapping the
+        area being repainted, so e.g. dragging a small element around doesn't
+        repaint the whole canvas.
+
+        Elements are either static or live (see *set_live*). Static elements
+        are rendered into a cached image layer, which is re-rendered only
+        where static elements changed, or completely when the transform or
+        size of the view changes. Live elements (e.g. those being dragged,
+        previews) are drawn on top of the layer on every paint, so changing
+        them doesn't touch the layer at all.
+
+        Elements small on screen (e.g. when zoomed out) can be drawn with
+        lower level of detail, see *set_lod*.
     """
 
     def __init__(self, width, height):
         super(self.__class__, self).__init__()
         self.size = (width, height)
         self.preferredSize = (width, height)
-        self._elems = []
+        self._elems = OrderedDict()  # element -> None, in order of adding
         self._transform = awt.geom.AffineTransform()
-
-
-    def add(self, canvas_element, repaint=False):
+        self._index = SpatialIndex()  # bounds of elements, in paint order
+        self._changed = set()  # elements whose bounds in index are stale
+        self._damaged = None  # (x1, y1, x2, y2) to be repainted, or None
+        self._live = set()  # elements drawn on top of the layer
+        self._layer = None  # BufferedImage with static elements rendered
+        self._layer_transform = None  # transform layer was rendered with
+        self._layer_damage = None  # (x1, y1, x2, y2) stale part of layer
+        self._in_layer = set()  # static elements within layer's area
+        self._lod = (LOD_SKIP_SIZE, LOD_POINT_SIZE, LOD_BOX_SIZE)
+        self._stats = dict.fromkeys(
+            ['drawn', 'simplified', 'skipped', 'cached', 'culled'], 0)
+
+
+    def add(self, canvas_element, repaint=False, live=False):
         assert isinstance(canvas_element, CanvasElement)
-        self._elems.append(canvas_element)
+        self._elems[canvas_element] = None
+        self._index.insert(canvas_element, canvas_element.bounds)
+        if live:
+            self._live.add(canvas_element)
+        self._damage_element(canvas_element, canvas_element.bounds)
         if repaint:
             self.repaint()
 
     def remove(self, canvas_element, repaint=False):
-        self._elems.remove(canvas_element)
+        del self._elems[canvas_element]
+        self._damage_element(canvas_element,
+                             self._index.bounds(canvas_element))
+        self._index.remove(canvas_element)
+        self._changed.discard(canvas_element)
+        self._live.discard(canvas_element)
+        self._in_layer.discard(canvas_element)
         if repaint:
             self.repaint()
 
+    def set_live(self, canvas_element, live):
+        """ Makes element live (drawn on top of cached layer on every paint)
+            or static (rendered into the layer). Elements that change often,
+            e.g. while being dragged, should be live so that the layer
+            doesn't have to be re-rendered. Live elements are painted above
+            static ones. Does nothing for elements not in the view.
+        """
+        if (canvas_element not in self._index
+                or live == (canvas_element in self._live)):
+            return
+        if live:
+            self._live.add(canvas_element)
+            self._in_layer.discard(canvas_element)
+        else:
+            self._live.remove(canvas_element)
+        bounds = self._index.bounds(canvas_element)
+        self._layer_damage = _union(self._layer_damage, bounds)
+        self.damage(*bounds)
+
+    def element_changed(self, canvas_element):
+        """ Called by CanvasElement when its geometry changes. Index is
+            updated only when it's queried next time, so elements that change
+            repeatedly (e.g. while being dragged) aren't re-indexed each time.
+            Bounds in index are the ones element was last painted with, so
+            they're damaged now and the new ones once index gets updated.
+        """
+        if (canvas_element in self._index
+                and canvas_element not in self._changed):
+            self._damage_element(canvas_element,
+                                 self._index.bounds(canvas_element))
+        self._changed.add(canvas_element)
+
+    def damage(self, x1, y1, x2, y2):
+        """ Marks region given in model coordinates to be repainted by next
+            *repaint_damaged*.
+        """
+        self._damaged = _union(self._damaged, (x1, y1, x2, y2))
+
+    def damage_element(self, canvas_element):
+        """ Marks region of element to be repainted, e.g. when its colors
+            change.
+        """
+        if canvas_element in self._index:  # new bounds damaged on update
+            self._damage_element(canvas_element,
+                                 self._index.bounds(canvas_element))
+        else:
+            self.damage(*canvas_element.bounds)
+
+    def repaint_damaged(self):
+        """ Schedules repaint of the region damaged since last repaint, does
+            nothing if there's none.
+        """
+        self._updated_index()  # damages new bounds of changed elements
+        if self._damaged is None:
+            return
+        rect = self._screen_rect(self._damaged)
+        self._damaged = None
+        self.repaint(rect)
+
+    def repaint_all(self):
+        """ Schedules repaint of the whole view, needed when the transform
+            changes.
+        """
+        self._updated_index()
+        self._damaged = None
+        self.repaint()
+
+    def set_lod(self, skip_size=LOD_SKIP_SIZE, point_size=LOD_POINT_SIZE,
+                box_size=LOD_BOX_SIZE):
+        """ Sets level of detail thresholds, in pixels of element's larger
+            dimension on screen: smaller than *skip_size* isn't drawn,
+            smaller than *point_size* is drawn as a single pixel and smaller
+            than *box_size* as its bounding box. Zeros disable the level of
+            detail, every element is drawn as it is.
+        """
+        if not 0 <= skip_size <= point_size <= box_size:
+            raise ValueError("LOD sizes must be non-negative and ordered "
+                             "skip <= point <= box")
+        self._lod = (skip_size, point_size, box_size)
+        self.invalidate_layer()
+
+    @property
+    def lod(self):
+        """Returns tuple (skip_size, point_size, box_size), see set_lod."""
+        return self._lod
+
+    def invalidate_layer(self):
+        """ Makes the whole cached layer of static elements to be rendered
+            again on next paint and schedules repaint.
+        """
+        self._layer = None
+        self.repaint_all()
+
     def zoom_by(self, value):
         """Zooms the view by given value (added to previous zoom value)."""
         self._transform.scale(value, value)
@@ -119,10 +278,106 @@ class CanvasView(JPanel):
         return ((x - self.pan_x) / self.zoom, (y - self.pan_y) / self.zoom)
 
 
-    def paintComponent(self, g):
-        g.color = self.background
-        g.fillRect(0, 0, self.width, self.height)
+    @property
+    def paint_stats(self):
+        """ Returns dict describing the last paint:
+              * drawn - number of elements painted, live ones and static ones
+                rendered into the cached layer
+              * simplified - number of drawn elements that were drawn as
+                points or bounding boxes
+              * skipped - number of elements being painted that were too
+                small to be drawn at all (see set_lod)
+              * cached - number of static elements within the view that
+                weren't rendered again, they're taken from the cached layer
+              * culled - number of elements out of the area being painted:
+                static ones out of the view, live ones out of the repainted
+                part of it
+        """
+        return dict(self._stats)
 
+    def visible_bounds(self):
+        """ Returns tuple (x1, y1, x2, y2) of the model area visible in the
+            view.
+        """
+        x1, y1 = self.transformed(0, 0)
+        x2, y2 = self.transformed(self.width, self.height)
+        return x1, y1, x2, y2
+
+    def paintComponent(self, g):
+        visible = awt.Rectangle(0, 0, self.width, self.height)
+        if visible.isEmpty():
+            return
+        clip = g.getClipBounds()
+        clip = visible if clip is None else clip.intersection(visible)
+        stats = self._update_layer()
+        g.drawImage(self._layer, 0, 0, None)
+
+        # only live elements overlapping the visible part of clip are
+        # painted, static ones are in the layer
+        area = self._model_bounds(clip)
+        live = [cel for cel in self._live
+                if overlaps(self._index.bounds(cel), area)]
+        stats['culled'] += len(self._live) - len(live)
+        drawn, simplified, skipped = self._paint_elements(
+            g, self._index.in_order(live))
+        stats['drawn'] += drawn
+        stats['simplified'] += simplified
+        stats['skipped'] += skipped
+        self._stats = stats
+
+    def _update_layer(self):
+        """ Renders stale part of the layer of static elements, whole layer
+            if transform or size changed. Returns dict of paint stats of
+            static elements (see paint_stats).
+        """
+        index = self._updated_index()
+        static = len(self._elems) - len(self._live)
+        stats = {'drawn': 0, 'simplified': 0, 'skipped': 0,
+                 'cached': len(self._in_layer),
+                 'culled': static - len(self._in_layer)}
+        visible = awt.Rectangle(0, 0, self.width, self.height)
+        layer = self._layer
+        if (layer is None or layer.width != visible.width
+                or layer.height != visible.height
+                or not self._layer_transform.equals(self._transform)):
+            self._layer = layer = BufferedImage(visible.width,
+                                                visible.height,
+                                                BufferedImage.TYPE_INT_RGB)
+            self._layer_transform = awt.geom.AffineTransform(self._transform)
+            self._in_layer.clear()
+            stale = visible
+        elif self._layer_damage is not None:
+            stale = self._screen_rect(self._layer_damage).intersection(
+                visible)
+        else:
+            return stats
+        self._layer_damage = None
+        if stale.isEmpty():
+            return stats
+
+        # static elements out of the stale part are either cached or out of
+        # the view, which the elements in the layer tell apart
+        cels = [cel for cel in index.overlapping(self._model_bounds(stale))
+                if cel not in self._live]
+        self._in_layer.update(cels)
+        stats['cached'] = len(self._in_layer) - len(cels)
+        stats['culled'] = static - len(self._in_layer)
+        g = layer.createGraphics()
+        try:
+            g.clip(stale)
+            g.color = self.background
+            g.fillRect(stale.x, stale.y, stale.width, stale.height)
+            stats['drawn'], stats['simplified'], stats['skipped'] = (
+                self._paint_elements(g, cels))
+        finally:
+            g.dispose()
+        return stats
+
+    def _paint_elements(self, g, cels):
+        """ Paints elements with level of detail depending on their size on
+            screen, returns tuple of numbers of elements drawn, of those drawn
+            simplified and of elements skipped for being too small.
+        """
         g.setRenderingHint(awt.RenderingHints.KEY_ANTIALIASING,
                            awt.RenderingHints.VALUE_ANTIALIAS_ON)
         g.setRenderingHint(awt.RenderingHints.KEY_TEXT_ANTIALIASING,
@@ -133,15 +388,69 @@ class CanvasView(JPanel):
         new_trans.concatenate(self._transform)
         g.setTransform(new_trans)
 
-        for el in self._elems:
+        skip_size, point_size, box_size = self._lod
+        zoom = self.zoom
+        pixel = 1.0 / zoom  # in model coordinates
+        drawn = simplified = skipped = 0
+        for el in cels:
+            x1, y1, x2, y2 = self._index.bounds(el)
+            size = max(x2 - x1, y2 - y1) * zoom
+            if size >= box_size:
+                shape = el.shape_for_zoom(zoom)
+            elif size < skip_size:
+                skipped += 1
+                continue
+            elif size < point_size:
+                color = el.stroke_color or el.fill_color
+                if color is not None:
+                    g.color = color
+                    g.fill(awt.geom.Rectangle2D.Double(
+                        (x1 + x2 - pixel) / 2.0, (y1 + y2 - pixel) / 2.0,
+                        pixel, pixel))
+                drawn += 1
+                simplified += 1
+                continue
+            else:
+                shape = awt.geom.Rectangle2D.Double(x1, y1, x2 - x1, y2 - y1)
+                simplified += 1
             if el.fill_color is not None:
                 g.color = el.fill_color
-                g.fill(el.shape)
+                g.fill(shape)
             if el.stroke_color is not None:
                 g.color = el.stroke_color
-                g.draw(el.shape)
+                g.draw(shape)
+            drawn += 1
 
         g.setTransform(old_trans)
+        return drawn, simplified, skipped
+
+    def _damage_element(self, canvas_element, bounds):
+        """Damages element's bounds, in the layer too if it's static."""
+        self.damage(*bounds)
+        if canvas_element not in self._live:
+            self._layer_damage = _union(self._layer_damage, bounds)
+
+    def _screen_rect(self, bounds):
+        """ Returns awt.Rectangle in screen coordinates covering given model
+            bounds, with margin for strokes and antialiasing.
+        """
+        x1, y1, x2, y2 = bounds
+        zoom = self.zoom
+        margin = int(ceil(zoom)) + DAMAGE_MARGIN
+        sx1 = int(x1 * zoom + self.pan_x) - margin
+        sy1 = int(y1 * zoom + self.pan_y) - margin
+        sx2 = int(ceil(x2 * zoom + self.pan_x)) + margin
+        sy2 = int(ceil(y2 * zoom + self.pan_y)) + margin
+        return awt.Rectangle(sx1, sy1, sx2 - sx1, sy2 - sy1)
+
+    def _model_bounds(self, rect):
+        """ Returns model bounds (x1, y1, x2, y2) covering given screen
+            awt.Rectangle, with margin for strokes and antialiasing.
+        """
+        margin = (int(ceil(self.zoom)) + DAMAGE_MARGIN) / self.zoom
+        x1, y1 = self.transformed(rect.x, rect.y)
+        x2, y2 = self.transformed(rect.x + rect.width, rect.y + rect.height)
+        return x1 - margin, y1 - margin, x2 + margin, y2 + margin
 
 
     def elements_at(self, x, y, precise=True):
@@ -171,23 +480,29 @@ class CanvasView(JPanel):
 
 
     def _under(self, x, y):
-        def is_under(cel):  # TODO: switch to quadtree
-            el_x1, el_y1, el_x2, el_y2 = cel.bounds
-            return (el_x1 <= x <= el_x2) and (el_y1 <= y <= el_y2)
-
-        res = filter(is_under, self._elems)
-        return res
+        return self._updated_index().under(x, y)
 
     def _enclosed(self, x1, y1, x2, y2):
-        def is_enclosed(cel):  # TODO: switch to quadtree
-            return fits(cel.bounds, (x1, y1, x2, y2))
-
-        res = filter(is_enclosed, self._elems)
-        return res
+        return self._updated_index().enclosed((x1, y1, x2, y2))
 
     def _overlapped(self, x1, y1, x2, y2):
-        def is_overlapped(cel):  # TODO: switch to quadtree
-            return overlaps(cel.bounds, (x1, y1, x2, y2))
-
-        res = filter(is_overlapped, self._elems)
-        return res
+        return self._updated_index().overlapping((x1, y1, x2, y2))
+
+    def _updated_index(self):
+        """Returns spatial index after updating bounds of changed elements."""
+        for cel in self._changed:
+            if cel in self._index:  # might have changed before being added
+                self._index.update(cel, cel.bounds)
+                self._damage_element(cel, cel.bounds)
+                self._in_layer.discard(cel)  # back once rendered, if visible
+        self._changed.clear()
+        return self._index
+
+
+
+def _union(bounds, other):
+    """Returns bounding box around both bounds, *bounds* can be None."""
+    if bounds is None:
+        return other
+    return (min(bounds[0], other[0]), min(bounds[1], other[1]),
+            max(bounds[2], other[2]), max(bounds[3], other[3]))
@@ -1,3 +1,4 @@
+import pytest
 from my_project.model import Remove, Modify, Insert, CanvasModel
 from my_project.model.elements import Rectangle as R
 from my_project.events import Model_Changed
@@ -50,8 +51,10 @@ class Test_CanvasModel(object):
         assert self.received_events[0].data == self.model._changelog[0]
 
     def test_cant_modify_elems_through_getter(self):
-        self.model.elems[1] = 'abc'
-        self.model.elems.pop(0)
+        with pytest.raises(TypeError):
+            self.model.elems[1] = 'abc'
+        with pytest.raises(AttributeError):
+            self.model.elems.pop(0)
         assert self.model.elems == self.initial_elements
 
     def test_cant_inject_changes_to_changelog_through_event(self):
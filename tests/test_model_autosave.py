@@ -0,0 +1,115 @@
+import threading
+import time
+import pytest
+from hsmpy import EventBus
+from my_project.model import Insert, Remove, CanvasModel, Autosave
+from my_project.model.elements import Rectangle as R
+
+
+class Test_Autosave:
+    def setup_method(self, method):
+        self.eb = EventBus()
+        self.model = CanvasModel(self.eb)
+        self.saved = []
+        self.autosave = None
+
+    def teardown_method(self, method):
+        if self.autosave is not None:
+            self.autosave.close()
+
+    def make_autosave(self, write=None, **kwargs):
+        self.autosave = Autosave(self.model, self.eb,
+                                 write or self.saved.append, **kwargs)
+        return self.autosave
+
+    def insert(self, i):
+        self.model.commit([Insert(R(i, i, 1, 1))])
+
+    def test_saves_after_max_changes(self):
+        autosave = self.make_autosave(max_changes=3)
+        self.insert(1)
+        self.insert(2)
+        assert self.saved == [] and autosave.dirty
+        self.insert(3)
+        assert not autosave.dirty
+        autosave.flush()
+        assert self.saved == [(R(1, 1, 1, 1), R(2, 2, 1, 1), R(3, 3, 1, 1))]
+        assert autosave.stats['saves'] == 1
+
+    def test_saves_after_interval(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(time, 'time', lambda: now[0])
+        autosave = self.make_autosave(interval=10)
+        self.insert(1)
+        autosave.poll()
+        assert not self.saved and autosave.dirty
+        now[0] += 10
+        autosave.poll()
+        autosave.flush()
+        assert self.saved == [(R(1, 1, 1, 1),)]
+        assert not autosave.dirty
+        now[0] += 20
+        autosave.poll()  # nothing changed, nothing to save
+        self.insert(2)  # interval passed, saved immediately
+        autosave.flush()
+        assert self.saved == [(R(1, 1, 1, 1),), (R(1, 1, 1, 1), R(2, 2, 1, 1))]
+
+    def test_flush_saves_unsaved_changes(self):
+        autosave = self.make_autosave()
+        self.insert(1)
+        autosave.flush()
+        assert self.saved == [(R(1, 1, 1, 1),)]
+        autosave.flush()
+        assert len(self.saved) == 1
+
+    def test_editing_continues_while_writing(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_write(snapshot):
+            started.set()
+            release.wait(5)
+            self.saved.append(snapshot)
+
+        autosave = self.make_autosave(slow_write, max_changes=1)
+        self.insert(1)
+        started.wait(5)
+        self.insert(2)  # writer is busy, these wait as a single snapshot
+        self.model.commit([Remove(R(1, 1, 1, 1))])
+        assert self.model.elems == [R(2, 2, 1, 1)]
+        release.set()
+        autosave.flush()
+        assert self.saved == [(R(1, 1, 1, 1),), (R(2, 2, 1, 1),)]
+
+    def test_reports_latency(self):
+        autosave = self.make_autosave()
+        assert autosave.stats['last_write'] is None
+        self.insert(1)
+        autosave.flush()
+        stats = autosave.stats
+        assert stats['saves'] == 1 and stats['failures'] == 0
+        assert 0 <= stats['last_snapshot'] <= stats['max_snapshot']
+        assert 0 <= stats['last_write'] <= stats['max_write']
+
+    def test_counts_failures(self):
+        def failing_write(snapshot):
+            raise IOError("disk full")
+
+        autosave = self.make_autosave(failing_write)
+        self.insert(1)
+        autosave.flush()
+        assert autosave.stats['failures'] == 1
+        assert autosave.stats['saves'] == 0
+
+    def test_rejects_model_with_stable_ids(self):
+        with pytest.raises(ValueError):
+            Autosave(CanvasModel(self.eb, stable_ids=True), self.eb,
+                     self.saved.append)
+
+    def test_close_stops_saving(self):
+        autosave = self.make_autosave(max_changes=1)
+        autosave.close()
+        self.autosave = None
+        self.insert(1)
+        assert self.saved == []
+        with pytest.raises(ValueError):
+            autosave.save()
@@ -0,0 +1,195 @@
+import pytest
+from hsmpy import EventBus
+from my_project.model import (Rectangle as R, Ellipse as E, Path, Link,
+                              BinaryDocument, write_binary, CanvasModel,
+                              Insert, Remove, Ref)
+
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir.join('drawing.bin'))
+
+
+def drawing():
+    parent = R(0, 0, 100, 100)
+    child = E(10, 10, 20, 20, parent)
+    grandchild = Path([(12, 12), (15, 18), (20, 14)], child)
+    other = R(500, 500, 10, 10)
+    return [parent, child, grandchild, other, Link(grandchild, other)]
+
+
+class Test_BinaryDocument:
+    def test_round_trip(self, path):
+        elems = drawing()
+        write_binary(path, elems)
+        doc = BinaryDocument(path)
+        assert len(doc) == 5
+        assert list(doc) == elems
+        doc.close()
+
+    def test_empty_document(self, path):
+        write_binary(path, [])
+        doc = BinaryDocument(path)
+        assert len(doc) == 0
+        assert list(doc) == []
+        assert list(doc.overlapping(0, 0, 10, 10)) == []
+
+    def test_opening_builds_nothing(self, path):
+        write_binary(path, drawing())
+        assert BinaryDocument(path).materialized == 0
+
+    def test_builds_element_with_its_references(self, path):
+        write_binary(path, drawing())
+        doc = BinaryDocument(path)
+        assert doc[2] == drawing()[2]
+        assert doc.materialized == 3  # path, its parent and grandparent
+        assert doc[4] == drawing()[4]
+        assert doc.materialized == 5
+        assert doc[4].a is doc[2]
+        assert doc[2].parent is doc[1]
+        assert doc[-1] is doc[4]
+
+    def test_raises_on_index_out_of_range(self, path):
+        write_binary(path, drawing())
+        with pytest.raises(IndexError):
+            BinaryDocument(path)[5]
+
+    def test_rejects_elements_referencing_by_ref(self, path):
+        parent = R(0, 0, 10, 10)
+        with pytest.raises(ValueError):
+            write_binary(path, [parent, R(1, 1, 1, 1, Ref(0))])
+        with pytest.raises(ValueError):
+            write_binary(path, [parent, Link(parent, Ref(0))])
+
+    def test_bounds(self, path):
+        write_binary(path, drawing())
+        doc = BinaryDocument(path)
+        assert doc.bounds(1) == (10, 10, 20, 20)
+        assert doc.bounds(2) == (12, 12, 8, 6)
+        assert doc.bounds(4) == (12, 12, 498, 498)
+        assert doc.materialized == 0
+
+    def test_overlapping_doesnt_build_elements(self, path):
+        write_binary(path, drawing())
+        doc = BinaryDocument(path)
+        assert list(doc.overlapping(400, 400, 200, 200)) == [3, 4]
+        assert list(doc.overlapping(0, 0, 5, 5)) == [0]
+        assert doc.materialized == 0
+
+    def test_many_elements(self, path):
+        elems = [R(i, i, 1, 1) for i in range(10000)]
+        write_binary(path, elems)
+        doc = BinaryDocument(path)
+        assert list(doc.overlapping(5000.5, 5000.5, 0.1, 0.1)) == [5000]
+        assert doc[9999] == R(9999, 9999, 1, 1)
+        assert doc.materialized == 1
+
+    def test_reads_file_without_mmap(self, path, monkeypatch):
+        from my_project.model import binary
+        monkeypatch.setattr(binary, 'mmap', None)
+        monkeypatch.setattr(binary, 'RandomAccessFile', None)
+        write_binary(path, drawing())
+        doc = BinaryDocument(path)
+        assert list(doc) == drawing()
+        assert doc.overlapping(0, 0, 5, 5) == [0]
+        doc.close()
+
+    def test_raises_on_invalid_file(self, path):
+        with open(path, 'wb') as f:
+            f.write('not a drawing at all')
+        with pytest.raises(ValueError):
+            BinaryDocument(path)
+
+    def test_raises_on_truncated_file(self, path):
+        write_binary(path, drawing())
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:-3])
+        with pytest.raises(ValueError):
+            BinaryDocument(path)
+
+    def test_find_and_referencing(self, path):
+        write_binary(path, drawing())
+        doc = BinaryDocument(path)
+        assert doc.find(E(10, 10, 20, 20, R(0, 0, 100, 100))) == 1
+        assert doc.materialized == 2
+        assert doc.find(E(10, 10, 20, 20)) is None
+        assert doc.find(drawing()[4]) == 4
+        assert doc.find('something else') is None
+        assert doc.referencing(0) == [1]
+        assert doc.referencing(2) == [4]
+        assert doc.referencing(3) == [4]
+        assert doc.referencing(4) == []
+
+
+
+class Test_CanvasModel_with_document_source:
+    def open(self, path, elems):
+        write_binary(path, elems)
+        self.doc = BinaryDocument(path)
+        return CanvasModel(EventBus(), source=self.doc)
+
+    def test_opening_builds_nothing(self, path):
+        model = self.open(path, drawing())
+        assert len(model.elems) == 5
+        assert drawing()[3] in model.elems
+        assert R(1, 1, 1, 1) not in model.elems
+        assert list(model.elems) == drawing()
+
+    def test_builds_only_queried_elements(self, path):
+        model = self.open(path, [R(i, i, 1, 1) for i in range(1000)])
+        assert model.elements_overlapping(500.2, 500.2, 500.5, 500.5) == [
+            R(500, 500, 1, 1)]
+        assert model.elements_enclosed(10, 10, 12.5, 12.5) == [
+            R(10, 10, 1, 1), R(11, 11, 1, 1)]
+        assert self.doc.materialized == 5  # R(9, 9, 1, 1) touches region
+        model.commit([Remove(R(7, 7, 1, 1))])
+        model.commit([Insert(R(7, 7, 2, 2))])
+        assert model.elements_overlapping(6.5, 6.5, 8.5, 8.5) == [
+            R(6, 6, 1, 1), R(8, 8, 1, 1), R(7, 7, 2, 2)]
+        assert len(model.elems) == 1000
+        assert self.doc.materialized == 8
+
+    def test_changes_keep_paint_order(self, path):
+        model = self.open(path, drawing())
+        parent, child, grandchild, other, link = drawing()
+        model.commit(model.move(parent, 1, 1))
+        model.commit(model.move(other, 1, 1))
+        model.commit([Insert(R(9, 9, 9, 9))])
+        moved = [parent.move(1, 1)]
+        moved.append(child._replace(parent=moved[0]))
+        moved.append(grandchild._replace(parent=moved[1]))
+        moved.append(other.move(1, 1))
+        moved_link = Link(moved[2], moved[3])
+        assert list(model.elems) == moved + [moved_link, R(9, 9, 9, 9)]
+        assert model.get_children(moved[0]) == [moved[1]]
+        assert model.get_links_for(moved[3]) == [moved_link]
+        model.undo()
+        model.undo()
+        model.undo()
+        assert list(model.elems) == drawing()
+        assert model.get_children(parent) == [child]
+
+    def test_children_and_links_of_source_elements(self, path):
+        model = self.open(path, drawing())
+        parent, child, grandchild, other, link = drawing()
+        assert model.get_descendants(parent) == [child, grandchild]
+        assert model.get_links_for(other) == [link]
+
+    def test_validates_against_source_elements(self, path):
+        model = self.open(path, drawing())
+        with pytest.raises(ValueError) as err:
+            model.commit([Insert(R(500, 500, 10, 10))])
+        assert err.value.message == "Inserting element already present " \
+                                    "in the model"
+        child = drawing()[1]
+        model.commit([Insert(R(1, 2, 3, 4, child))])
+        assert model.get_children(child) == [drawing()[2],
+                                             R(1, 2, 3, 4, child)]
+
+    def test_stable_ids_not_supported(self, path):
+        write_binary(path, drawing())
+        with pytest.raises(ValueError):
+            CanvasModel(EventBus(), stable_ids=True,
+                        source=BinaryDocument(path))
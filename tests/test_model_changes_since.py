@@ -0,0 +1,116 @@
+import pytest
+from hsmpy import EventBus
+from my_project.events import Model_Changed
+from my_project.model import Insert, Modify, Remove, CanvasModel
+from my_project.model.CanvasModel import CATCHUP_ENTRIES
+from my_project.model.history import estimate_size
+from my_project.model.elements import Rectangle as R
+
+
+def replay(elems, changes):
+    elems = list(elems)
+    for ch in changes:
+        if isinstance(ch, Insert):
+            elems.append(ch.elem)
+        elif isinstance(ch, Remove):
+            elems.remove(ch.elem)
+        else:
+            elems[elems.index(ch.elem)] = ch.modified
+    return elems
+
+
+class Test_changes_since:
+    def setup_method(self, method):
+        self.eb = EventBus()
+        self.model = CanvasModel(self.eb)
+
+    def test_version_counts_applied_changelists(self):
+        assert self.model.version == 0
+        self.model.commit([Insert(R(1, 1, 1, 1))])
+        self.model.commit([Insert(R(2, 2, 2, 2))])
+        self.model.undo()
+        assert self.model.revision == 1
+        assert self.model.version == 3
+        self.model.redo()
+        self.model.goto_revision(0)
+        assert self.model.version == 5
+
+    def test_version_not_changed_without_changes(self):
+        self.model.undo()
+        self.model.commit([])
+        with self.model.transaction():
+            self.model.commit([Insert(R(1, 1, 1, 1))])
+            self.model.commit([Remove(R(1, 1, 1, 1))])
+        assert self.model.version == 0
+
+    def test_version_updated_before_listeners_notified(self):
+        seen = []
+        self.eb.register(Model_Changed,
+                         lambda _: seen.append(self.model.version))
+        self.model.commit([Insert(R(1, 1, 1, 1))])
+        self.model.undo()
+        assert seen == [1, 2]
+
+    def test_nothing_since_current_version(self):
+        self.model.commit([Insert(R(1, 1, 1, 1))])
+        assert self.model.changes_since(self.model.version) == []
+
+    def test_compacts_changes(self):
+        el = R(1, 1, 1, 1)
+        self.model.commit([Insert(el)])
+        version = self.model.version
+        for _ in range(10):
+            self.model.commit([Modify(el, el.move(1, 0))])
+            el = el.move(1, 0)
+        self.model.commit([Insert(R(5, 5, 5, 5))])
+        self.model.commit([Remove(R(5, 5, 5, 5))])
+        assert self.model.changes_since(version) == [
+            Modify(R(1, 1, 1, 1), R(11, 1, 1, 1))]
+
+    def test_consumer_catches_up(self):
+        elems = []
+        version = self.model.version
+        self.model.commit([Insert(R(1, 1, 1, 1)), Insert(R(2, 2, 2, 2))])
+        self.model.commit([Remove(R(1, 1, 1, 1))])
+        elems = replay(elems, self.model.changes_since(version))
+        version = self.model.version
+        assert elems == self.model.elems
+        self.model.commit([Insert(R(3, 3, 3, 3))])
+        self.model.commit([Modify(R(2, 2, 2, 2), R(4, 4, 4, 4))])
+        self.model.undo()
+        self.model.undo()
+        self.model.redo()
+        elems = replay(elems, self.model.changes_since(version))
+        assert elems == self.model.elems
+
+    def test_raises_on_unavailable_version(self):
+        model = CanvasModel(self.eb, max_catchup_entries=2)
+        for i in range(5):
+            model.commit([Insert(R(i, i, 1, 1))])
+        assert model.changes_since(3) == [Insert(R(3, 3, 1, 1)),
+                                          Insert(R(4, 4, 1, 1))]
+        with pytest.raises(ValueError):
+            model.changes_since(2)
+        with pytest.raises(ValueError):
+            model.changes_since(6)
+
+    def test_catchup_log_is_bounded_by_default(self):
+        model = CanvasModel(self.eb)
+        for i in range(CATCHUP_ENTRIES + 10):
+            model.commit([Insert(R(i, i, 1, 1))])
+        assert len(model._applied) == CATCHUP_ENTRIES
+        with pytest.raises(ValueError):
+            model.changes_since(5)
+
+    def test_catchup_log_kept_within_history_byte_budget(self):
+        size = estimate_size([Insert(R(0, 0, 1, 1))])
+        model = CanvasModel(self.eb, max_history_bytes=3 * size)
+        for i in range(10):
+            model.commit([Insert(R(i, i, 1, 1))])
+        assert len(model._applied) == 3
+        assert model.changes_since(7) == [Insert(R(i, i, 1, 1))
+                                          for i in range(7, 10)]
+        with pytest.raises(ValueError):
+            model.changes_since(6)
+        model.insert_bulk(R, range(50), [100] * 50, [1] * 50, [1] * 50)
+        assert len(model._applied) == 1  # newest is kept even if too large
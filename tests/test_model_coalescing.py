@@ -0,0 +1,139 @@
+import time
+from hsmpy import EventBus
+from my_project.events import Model_Changed
+from my_project.model import Insert, Modify, CanvasModel
+from my_project.model.elements import Rectangle as R, Link
+
+
+class Test_coalescing:
+    def setup_method(self, method):
+        self.eb = EventBus()
+        self.events = []
+        self.eb.register(Model_Changed, lambda e: self.events.append(e))
+        self.el = R(0, 0, 10, 10)
+        self.other = R(50, 50, 10, 10)
+        self.link = Link(self.el, self.other)
+
+    def make_model(self, **kwargs):
+        model = CanvasModel(self.eb, **kwargs)
+        model.commit([Insert(self.el), Insert(self.other)])
+        model.commit([Insert(self.link)])
+        return model
+
+    def nudge(self, model, dx, group=None):
+        el = [e for e in model.elems if isinstance(e, R) and e.y == 0][0]
+        model.commit(model.move(el, dx, 0), group=group)
+
+    def test_not_coalescing_by_default(self):
+        model = self.make_model()
+        self.nudge(model, 1)
+        self.nudge(model, 1)
+        assert len(model._changelog) == 4
+
+    def test_coalescing_with_same_group(self):
+        model = self.make_model()
+        for _ in range(5):
+            self.nudge(model, 1, group='nudge')
+        assert len(model._changelog) == 3
+        moved = R(5, 0, 10, 10)
+        assert set(model._changelog[-1]) == set([
+            Modify(self.el, moved),
+            Modify(self.link, Link(moved, self.other)),
+        ])
+        assert len(self.events) == 7  # listeners informed about each commit
+
+    def test_undo_reverts_merged_changes_at_once(self):
+        model = self.make_model()
+        for _ in range(5):
+            self.nudge(model, 1, group='nudge')
+        model.undo()
+        assert set(model.elems) == set([self.el, self.other, self.link])
+        model.redo()
+        assert R(5, 0, 10, 10) in model.elems
+
+    def test_not_coalescing_different_groups(self):
+        model = self.make_model()
+        self.nudge(model, 1, group='a')
+        self.nudge(model, 1, group='b')
+        self.nudge(model, 1)
+        assert len(model._changelog) == 5
+
+    def test_not_coalescing_after_undo(self):
+        model = self.make_model()
+        self.nudge(model, 1, group='a')
+        self.nudge(model, 1, group='a')
+        model.undo()
+        self.nudge(model, 1, group='a')
+        assert len(model._changelog) == 3
+        assert model._redolog == []
+
+    def test_not_coalescing_different_elements(self):
+        model = self.make_model()
+        self.nudge(model, 1, group='a')
+        model.commit([Modify(self.other, R(60, 60, 10, 10))], group='a')
+        assert len(model._changelog) == 4
+
+    def test_not_coalescing_after_other_change_types(self):
+        model = self.make_model()
+        self.nudge(model, 1, group='a')
+        model.commit([Insert(R(9, 9, 9, 9))], group='a')
+        self.nudge(model, 1, group='a')
+        assert len(model._changelog) == 5
+
+    def test_changes_cancelling_out_remove_entry(self):
+        model = self.make_model()
+        self.nudge(model, 3, group='a')
+        self.nudge(model, -3, group='a')
+        assert len(model._changelog) == 2
+        assert model.revision == 2
+        assert model.history_footprint['entries'] == 2
+
+    def test_commit_after_changes_cancelled_out(self):
+        model = self.make_model()
+        self.nudge(model, 3, group='a')
+        self.nudge(model, -3, group='a')
+        self.nudge(model, 2, group='a')  # previous entry inserted elements
+        assert len(model._changelog) == 3
+        self.nudge(model, 2, group='a')
+        assert len(model._changelog) == 3
+        model.undo()
+        assert set(model.elems) == set([self.el, self.other, self.link])
+
+    def test_not_coalescing_into_entry_merged_with_other_changes(self):
+        model = self.make_model()
+        self.nudge(model, 1, group='a')
+        with model.transaction():  # becomes entry with mixed changes
+            self.nudge(model, 1, group='a')
+            model.commit([Insert(R(9, 9, 9, 9))])
+        self.nudge(model, 1, group='a')
+        assert len(model._changelog) == 5
+
+    def test_not_coalescing_after_goto_revision(self):
+        model = self.make_model()
+        self.nudge(model, 1, group='a')
+        self.nudge(model, 1, group='b')
+        model.goto_revision(3)
+        model.goto_revision(4)
+        self.nudge(model, 1, group='b')
+        assert len(model._changelog) == 5
+
+    def test_coalescing_within_time_window(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(time, 'time', lambda: now[0])
+        model = self.make_model(coalesce_window=0.5)
+        self.nudge(model, 1)
+        now[0] += 0.4
+        self.nudge(model, 1)
+        assert len(model._changelog) == 3
+        now[0] += 0.6
+        self.nudge(model, 1)
+        assert len(model._changelog) == 4
+
+    def test_merged_entry_keeps_history_footprint_accurate(self):
+        model = self.make_model()
+        for _ in range(20):
+            self.nudge(model, 1, group='a')
+        single = self.make_model()
+        self.nudge(single, 20)
+        assert (model.history_footprint['bytes'] ==
+                single.history_footprint['bytes'])
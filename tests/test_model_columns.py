@@ -0,0 +1,101 @@
+import pytest
+from hsmpy import EventBus
+from my_project.model import Insert, Remove, CanvasModel
+from my_project.model.elements import (Rectangle as R, Ellipse as E,
+                                       Path as P, Link as L)
+from my_project.model.columns import element_bounds
+
+numpy = pytest.importorskip('numpy')
+
+
+def check_in_sync(model):
+    """Asserts that model's columns describe exactly the model's elements."""
+    cols = model._columns
+    elems = [el for el in model.elems if not isinstance(el, L)]
+    live = [cols._elems[r] for r in range(cols.size)
+            if cols._elems[r] is not None]
+    assert live == elems
+    rows = cols.rows(elems)
+    for el, row in zip(elems, rows):
+        x1, y1, x2, y2 = element_bounds(el)
+        assert (cols.x[row], cols.y[row]) == (x1, y1)
+        assert (cols.width[row], cols.height[row]) == (x2 - x1, y2 - y1)
+        parent = model.resolve(el.parent)
+        if parent in model.elems:
+            assert cols.parent[row] == cols.rows([parent])[0]
+        else:
+            assert cols.parent[row] == -1
+
+
+
+class Test_GeometryColumns:
+    def setup_method(self, method):
+        self.model = CanvasModel(EventBus(), geometry_columns=True)
+        self.parent = R(0, 0, 100, 100)
+        self.child = E(10, 10, 10, 10, self.parent)
+        self.path = P([(50, 60), (150, 70)])
+        self.model.commit([Insert(self.parent)])
+        self.model.commit([Insert(self.child), Insert(self.path)])
+        self.model.commit([Insert(L(self.parent, self.path))])
+
+    def test_in_sync_after_changes(self):
+        check_in_sync(self.model)
+        self.model.commit(self.model.move(self.parent, 5, 5))
+        check_in_sync(self.model)
+        self.model.undo()
+        check_in_sync(self.model)
+        self.model.commit([Remove(self.parent)])
+        check_in_sync(self.model)
+        self.model.undo()
+        check_in_sync(self.model)
+
+    def test_in_sync_after_compacting(self):
+        rects = [R(i, i, 1, 1, self.parent) for i in range(200)]
+        self.model.commit([Insert(r) for r in rects])
+        self.model.commit([Remove(r) for r in rects[:150]])
+        assert self.model._columns.size < 150
+        check_in_sync(self.model)
+
+    def test_in_sync_with_stable_ids(self):
+        model = CanvasModel(EventBus(), stable_ids=True,
+                            geometry_columns=True)
+        model.commit([Insert(self.parent)])
+        child = R(1, 1, 1, 1, model.ref(self.parent))
+        model.commit([Insert(child)])
+        model.commit(model.move(self.parent, 5, 5))
+        check_in_sync(model)
+        model.commit([Remove(self.parent.move(5, 5))])
+        check_in_sync(model)
+        model.undo()
+        check_in_sync(model)
+
+    def test_bounds(self):
+        assert self.model.bounds() == (0, 0, 150, 100)
+        empty = CanvasModel(EventBus(), geometry_columns=True)
+        inf = float('inf')
+        assert empty.bounds() == (inf, inf, -inf, -inf)
+
+    def test_region_queries(self):
+        assert self.model.elements_overlapping(15, 15, 55, 65) == [
+            self.parent, self.child, self.path]
+        assert self.model.elements_overlapping(110, 0, 200, 50) == []
+        assert self.model.elements_enclosed(5, 5, 200, 200) == [
+            self.child, self.path]
+
+    def test_queries_same_as_without_columns(self):
+        plain = CanvasModel(EventBus(), geometry_columns=False)
+        for el in self.model.elems:
+            plain.commit([Insert(el)])
+        assert plain.bounds() == self.model.bounds()
+        for region in [(15, 15, 55, 65), (0, 0, 20, 20), (110, 0, 200, 50)]:
+            assert (plain.elements_overlapping(*region)
+                    == self.model.elements_overlapping(*region))
+            assert (plain.elements_enclosed(*region)
+                    == self.model.elements_enclosed(*region))
+
+    def test_move_same_as_without_columns(self):
+        plain = CanvasModel(EventBus(), geometry_columns=False)
+        for el in self.model.elems:
+            plain.commit([Insert(el)])
+        what = [self.child, self.path, self.parent]
+        assert self.model.move(what, 3, 4) == plain.move(what, 3, 4)
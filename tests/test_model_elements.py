@@ -1,5 +1,6 @@
 import pytest
-from my_project.model.elements import Ellipse, Path, Rectangle
+from my_project.model.elements import (Ellipse, Path, Rectangle, Vertices,
+                                      set_interning)
 from my_project.model import Remove, Modify, Insert
 
 
@@ -30,6 +31,32 @@ def test_can_compare_Paths():
     assert p1 != p3
 
 
+def test_Path_vertices_behave_like_tuple():
+    p = Path([(1, 2), (3, 4), (5, 6), (3, 4)])
+    assert isinstance(p.vertices, Vertices)
+    assert len(p.vertices) == 3  # duplicates removed
+    assert p.vertices == ((1, 2), (3, 4), (5, 6))
+    assert list(p.vertices) == [(1, 2), (3, 4), (5, 6)]
+    assert p.vertices[0] == (1, 2)
+    assert p.vertices[-1] == (5, 6)
+    assert p.vertices[1:] == ((3, 4), (5, 6))
+    assert hash(p.vertices) == hash(((1, 2), (3, 4), (5, 6)))
+    with pytest.raises(IndexError):
+        p.vertices[3]
+
+
+def test_moved_Path_shares_packed_vertices():
+    p = Path([(1, 2), (3, 4)])
+    moved = p.move(10, 20)
+    assert moved.vertices._coords is p.vertices._coords
+    assert moved.vertices == ((11, 22), (13, 24))
+    assert p.vertices == ((1, 2), (3, 4))
+    assert moved == Path([(11, 22), (13, 24)])
+    assert hash(moved) == hash(Path([(11, 22), (13, 24)]))
+    assert moved.move(-10, -20) == p
+    assert moved != p.move(10, 21)
+
+
 def test_Rectangle_raises_on_invalid_values():
     with pytest.raises(TypeError):
         Rectangle(None, 9, 9, 9)
@@ -135,3 +162,39 @@ def test_comparing_Remove_and_Insert_gives_False():
     e = R(1, 2, 9, 9)
     assert Remove(e) != Insert(e)
     assert Insert(e) != Remove(e)
+
+
+class Test_interning:
+    def setup_method(self, method):
+        set_interning(True)
+
+    def teardown_method(self, method):
+        set_interning(False)
+
+    def test_equal_elements_are_same_instance(self):
+        parent = Rectangle(0, 0, 100, 100)
+        a = Ellipse(1, 2, 3, 4, Rectangle(0, 0, 100, 100))
+        b = Ellipse(1, 2, 3, 4, parent)
+        assert a is b
+        assert a.parent is parent
+        assert Ellipse(1, 2, 3, 5, parent) is not a
+
+    def test_modified_copies_are_interned(self):
+        r = Rectangle(1, 1, 1, 1)
+        assert r.move(1, 1) is Rectangle(2, 2, 1, 1)
+        assert r._replace(x=2).move(-1, 0) is r
+
+    def test_paths_are_not_interned(self):
+        p = Path([(1, 1), (2, 2)], Rectangle(0, 0, 9, 9))
+        assert p.move(1, 0) is not Path([(2, 1), (3, 2)])
+        assert p.move(1, 0) == Path([(2, 1), (3, 2)], Rectangle(0, 0, 9, 9))
+        assert p.move(1, 0).vertices._hash is None  # vertices weren't hashed
+        assert p.parent is Rectangle(0, 0, 9, 9)
+
+    def test_different_types_are_not_shared(self):
+        assert Rectangle(1, 1, 1, 1) is not Ellipse(1, 1, 1, 1)
+
+    def test_disabled_interning_creates_new_instances(self):
+        set_interning(False)
+        assert Rectangle(1, 1, 1, 1) is not Rectangle(1, 1, 1, 1)
+        assert Rectangle(1, 1, 1, 1) == Rectangle(1, 1, 1, 1)
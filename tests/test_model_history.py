@@ -0,0 +1,178 @@
+import pytest
+from hsmpy import EventBus
+from my_project.model import Insert, Modify, CanvasModel
+from my_project.model.elements import Rectangle as R, Path
+from my_project.model.history import History, estimate_size, VERTEX_SIZE
+from my_project.events import Model_Changed
+
+
+def commit(history, changelist):
+    history.changelog.append(changelist)
+    history.committed()
+
+
+class Test_estimate_size:
+    def test_grows_with_changelist_size(self):
+        one = estimate_size([Insert(R(1, 1, 1, 1))])
+        two = estimate_size([Insert(R(1, 1, 1, 1)), Insert(R(2, 2, 2, 2))])
+        assert 0 < one < two
+
+    def test_modify_holds_two_elements(self):
+        ins = estimate_size([Insert(R(1, 1, 1, 1))])
+        mod = estimate_size([Modify(R(1, 1, 1, 1), R(2, 2, 2, 2))])
+        assert mod > ins
+
+    def test_counts_path_vertices(self):
+        short = estimate_size([Insert(Path([(1, 1), (2, 2)]))])
+        long = estimate_size([Insert(Path([(i, i) for i in range(100)]))])
+        assert long - short == 98 * VERTEX_SIZE
+
+
+class Test_History:
+    def test_unlimited_by_default(self):
+        h = History()
+        for i in range(100):
+            commit(h, [Insert(R(i, i, 1, 1))])
+        assert len(h.changelog) == 100
+        assert h.footprint['entries'] == 100
+        assert h.footprint['evicted'] == 0
+
+    def test_tracks_bytes(self):
+        h = History()
+        cl1, cl2 = [Insert(R(1, 1, 1, 1))], [Insert(R(2, 2, 2, 2))]
+        commit(h, cl1)
+        commit(h, cl2)
+        assert h.footprint['bytes'] == estimate_size(cl1) + estimate_size(cl2)
+        h.redolog.insert(0, h.changelog.pop())  # moving doesn't change it
+        assert h.footprint['bytes'] == estimate_size(cl1) + estimate_size(cl2)
+
+    def test_commit_discards_redo_log(self):
+        h = History()
+        commit(h, [Insert(R(1, 1, 1, 1))])
+        commit(h, [Insert(R(2, 2, 2, 2))])
+        h.redolog.insert(0, h.changelog.pop())
+        cl = [Insert(R(3, 3, 3, 3))]
+        commit(h, cl)
+        assert h.redolog == []
+        assert h.footprint['entries'] == 2
+        assert h.footprint['bytes'] == 2 * estimate_size(cl)
+
+    def test_evicts_oldest_over_entry_limit(self):
+        h = History(max_entries=3)
+        for i in range(5):
+            commit(h, [Insert(R(i, i, 1, 1))])
+        assert h.changelog == [[Insert(R(i, i, 1, 1))] for i in range(2, 5)]
+        assert h.footprint['entries'] == 3
+        assert h.footprint['evicted'] == 2
+        assert h.footprint['bytes'] == sum(estimate_size(cl)
+                                           for cl in h.changelog)
+
+    def test_evicts_oldest_over_byte_limit(self):
+        size = estimate_size([Insert(R(1, 1, 1, 1))])
+        h = History(max_bytes=size * 2)
+        for i in range(5):
+            commit(h, [Insert(R(i, i, 1, 1))])
+        assert h.changelog == [[Insert(R(i, i, 1, 1))] for i in range(3, 5)]
+        assert h.footprint['bytes'] == size * 2
+        assert h.footprint['evicted'] == 3
+
+    def test_keeps_most_recent_even_if_over_budget(self):
+        h = History(max_bytes=1)
+        commit(h, [Insert(R(1, 1, 1, 1))])
+        commit(h, [Insert(R(2, 2, 2, 2))])
+        assert h.changelog == [[Insert(R(2, 2, 2, 2))]]
+
+    def test_raises_on_invalid_entry_limit(self):
+        with pytest.raises(ValueError):
+            History(max_entries=0)
+
+
+def test_model_undo_is_limited_by_budget():
+    model = CanvasModel(EventBus(), max_history_entries=2)
+    for i in range(4):
+        model.commit([Insert(R(i, i, 1, 1))])
+    assert model.history_footprint['entries'] == 2
+    assert model.history_footprint['evicted'] == 2
+    model.undo()
+    model.undo()
+    model.undo()  # nothing left to undo, does nothing
+    assert model.elems == [R(0, 0, 1, 1), R(1, 1, 1, 1)]
+    model.redo()
+    assert model.elems == [R(0, 0, 1, 1), R(1, 1, 1, 1), R(2, 2, 1, 1)]
+    assert model.history_footprint['entries'] == 2
+
+
+
+class Test_goto_revision:
+    def setup_method(self, method):
+        self.eb = EventBus()
+        self.events = []
+        self.eb.register(Model_Changed, lambda e: self.events.append(e))
+        self.model = CanvasModel(self.eb)
+        self.states = [self.model.elems]  # states[rev] = elems at revision
+        el = R(0, 0, 1, 1)
+        self.model.commit([Insert(el)])
+        self.states.append(self.model.elems)
+        for i in range(1, 100):
+            if i % 10 == 0:
+                cl = [Insert(R(i, i, 1, 1))]
+            else:
+                cl = [Modify(el, el.move(1, 0))]
+                el = el.move(1, 0)
+            self.model.commit(cl)
+            self.states.append(self.model.elems)
+        self.events[:] = []
+
+    @pytest.mark.parametrize('rev', [0, 1, 31, 32, 33, 64, 65, 99, 100])
+    def test_goto_past_revision(self, rev):
+        self.model.goto_revision(rev)
+        assert self.model.revision == rev
+        assert set(self.model.elems) == set(self.states[rev])
+        assert len(self.events) == (1 if rev != 100 else 0)
+
+    def test_goto_past_and_back(self):
+        self.model.goto_revision(3)
+        self.model.goto_revision(70)
+        assert set(self.model.elems) == set(self.states[70])
+        self.model.goto_revision(100)
+        assert self.model.elems == self.states[100]
+        assert len(self.events) == 3
+
+    def test_undo_redo_after_goto(self):
+        self.model.goto_revision(50)
+        self.model.undo()
+        assert set(self.model.elems) == set(self.states[49])
+        self.model.redo()
+        self.model.redo()
+        assert set(self.model.elems) == set(self.states[51])
+        assert self.model.revision == 51
+
+    def test_commit_after_goto_discards_future(self):
+        self.model.goto_revision(40)
+        self.model.goto_revision(80)  # caches checkpoints of future blocks
+        self.model.goto_revision(40)
+        self.model.commit([Insert(R(-5, -5, 1, 1))])
+        assert self.model.revision == 41
+        with pytest.raises(ValueError):
+            self.model.goto_revision(42)
+        self.model.goto_revision(0)
+        assert self.model.elems == []
+        self.model.goto_revision(41)
+        assert set(self.model.elems) == set(self.states[40] +
+                                            [R(-5, -5, 1, 1)])
+
+    def test_raises_on_unavailable_revision(self):
+        with pytest.raises(ValueError):
+            self.model.goto_revision(-1)
+        with pytest.raises(ValueError):
+            self.model.goto_revision(101)
+
+    def test_cant_go_before_evicted(self):
+        model = CanvasModel(self.eb, max_history_entries=2)
+        for i in range(5):
+            model.commit([Insert(R(i, i, 1, 1))])
+        assert model.revision == 5
+        with pytest.raises(ValueError):
+            model.goto_revision(2)
+        model.goto_revision(3)
+        assert model.elems == [R(i, i, 1, 1) for i in range(3)]
@@ -0,0 +1,93 @@
+import pytest
+from hsmpy import EventBus
+from my_project.events import Model_Changed
+from my_project.model import Insert, Remove, CanvasModel
+from my_project.model.elements import Rectangle as R, Ellipse as E, Link
+
+
+class Test_insert_bulk:
+    def setup_method(self, method):
+        self.eb = EventBus()
+        self.model = CanvasModel(self.eb)
+        self.parent = R(100, 100, 50, 50)
+        self.model.commit([Insert(self.parent)])
+
+    def test_inserts_elements_same_as_created_one_by_one(self):
+        elems = self.model.insert_bulk(R, [1, 2, 3], [4, 5, 6], [7, -8, 9],
+                                       [10, 11, -12])
+        expected = [R(1, 4, 7, 10), R(2, 5, -8, 11), R(3, 6, 9, -12)]
+        assert elems == expected
+        assert list(self.model.elems) == [self.parent] + expected
+        assert all(type(el.x) is float for el in elems)
+
+    def test_inserts_ellipses_with_parents(self):
+        elems = self.model.insert_bulk(E, [1, 2], [1, 2], [1, 1], [1, 1],
+                                       [self.parent, None])
+        assert elems == [E(1, 1, 1, 1, self.parent), E(2, 2, 1, 1)]
+        assert self.model.get_children(self.parent) == elems[:1]
+
+    def test_parents_converted_to_refs_with_stable_ids(self):
+        model = CanvasModel(EventBus(), stable_ids=True)
+        model.commit([Insert(self.parent)])
+        ref = model.ref(self.parent)
+        elems = model.insert_bulk(R, [1, 2, 3], [1, 2, 3], [1, 1, 1],
+                                  [1, 1, 1], [self.parent, ref, None])
+        assert [el.parent for el in elems] == [ref, ref, None]
+        moved = self.parent.move(5, 5)
+        model.commit(model.move(self.parent, 5, 5))
+        assert model.get_children(moved) == elems[:2]
+
+    def test_single_event_and_undo_entry(self):
+        received = []
+        self.eb.register(Model_Changed, lambda evt: received.append(evt.data))
+        elems = self.model.insert_bulk(R, range(100), range(100), [1] * 100,
+                                       [1] * 100)
+        assert received == [[Insert(el) for el in elems]]
+        self.model.undo()
+        assert list(self.model.elems) == [self.parent]
+        assert received[-1] == [Remove(el) for el in elems]
+        self.model.redo()
+        assert list(self.model.elems) == [self.parent] + elems
+
+    def test_footprint_same_as_commit(self):
+        other = CanvasModel(EventBus())
+        other.commit([Insert(self.parent)])
+        elems = self.model.insert_bulk(R, range(10), range(10), [1] * 10,
+                                       [2] * 10)
+        other.commit([Insert(el) for el in elems])
+        assert self.model.history_footprint == other.history_footprint
+
+    def test_in_transaction(self):
+        with self.model.transaction():
+            elems = self.model.insert_bulk(R, [1, 2], [1, 2], [1, 1], [1, 1])
+            self.model.commit([Remove(elems[0])])
+        assert list(self.model.elems) == [self.parent, elems[1]]
+        assert len(self.model._changelog) == 2
+
+    def test_empty_input(self):
+        assert self.model.insert_bulk(R, [], [], [], []) == []
+        assert len(self.model._changelog) == 1
+
+    @pytest.mark.parametrize('args, message', [
+        ((Link, [1], [1], [1], [1]), "Only Rectangles and Ellipses can be "
+                                     "inserted in bulk"),
+        ((R, [1, 2], [1], [1], [1]), "Geometry sequences must have same "
+                                     "length"),
+        ((R, [1], [1], [0], [0]), "Cannot have zero dimensions"),
+        ((R, ['a'], [1], [1], [1]), None),
+        ((R, [1], [1], [1], [1], [None, None]), "Parents and geometry must "
+                                                "have same length"),
+        ((R, [1], [1], [1], [1], [R(0, 0, 1, 1)]), "Element's parent must be "
+                                                   "member of same model"),
+        ((R, [1, 1], [1, 1], [1, 1], [1, 1]), "Inserting same element "
+                                              "multiple times"),
+        ((R, [100], [100], [50], [50]), "Inserting element already present "
+                                        "in the model"),
+    ])
+    def test_invalid_input_inserts_nothing(self, args, message):
+        with pytest.raises(ValueError) as err:
+            self.model.insert_bulk(*args)
+        if message is not None:
+            assert err.value.message == message
+        assert list(self.model.elems) == [self.parent]
+        assert len(self.model._changelog) == 1
@@ -0,0 +1,187 @@
+import json
+import pytest
+from hsmpy import EventBus
+from my_project.model import (Insert, Modify, Remove, CanvasModel,
+                              Rectangle as R, Ellipse as E, Path, Link, Ref)
+from my_project.model.journal import Journal
+
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir.join('drawing.jsonl'))
+
+
+def open_model(path):
+    eb = EventBus()
+    model = CanvasModel(eb)
+    journal = Journal(path)
+    model.elems = journal.load()
+    journal.attach(eb)
+    return model, journal
+
+
+def reload(path):
+    journal = Journal(path)
+    elems = journal.load()
+    journal.close()
+    return elems
+
+
+def records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+class Test_Journal:
+    def test_creates_empty_document(self, path):
+        model, journal = open_model(path)
+        journal.close()
+        assert model.elems == []
+        assert reload(path) == []
+        assert records(path) == [['snapshot', 1, []]]
+
+    def test_appends_record_per_commit(self, path):
+        model, journal = open_model(path)
+        model.commit([Insert(R(1, 2, 3, 4)), Insert(E(5, 6, 7, 8))])
+        model.commit([Modify(R(1, 2, 3, 4), R(1, 2, 3, 5))])
+        journal.close()
+        recs = records(path)
+        assert len(recs) == 3
+        assert [r[0] for r in recs] == ['snapshot', 'commit', 'commit']
+        assert recs[2] == ['commit', [['~', 0, ['R', 1, 2, 3, 5, None]]]]
+
+    def test_replays_changes_in_paint_order(self, path):
+        model, journal = open_model(path)
+        a, b, c = R(1, 1, 1, 1), E(2, 2, 2, 2), Path([(0, 0), (3, 4)])
+        model.commit([Insert(a), Insert(b), Insert(c)])
+        model.commit([Modify(a, R(9, 9, 1, 1))])
+        model.commit([Remove(b)])
+        model.commit([Insert(E(5, 5, 5, 5))])
+        journal.close()
+        assert reload(path) == model.elems
+        assert model.elems == [R(9, 9, 1, 1), c, E(5, 5, 5, 5)]
+
+    def test_keeps_parents_and_links(self, path):
+        model, journal = open_model(path)
+        parent, other = R(0, 0, 100, 100), E(200, 200, 10, 10)
+        model.commit([Insert(parent), Insert(other)])
+        child = R(10, 10, 10, 10, parent)
+        model.commit([Insert(child)])
+        model.commit([Insert(Link(child, other))])
+        model.commit(model.move(parent, 5, 5))
+        journal.close()
+        elems = reload(path)
+        assert elems == model.elems
+        assert elems[2].parent is elems[0]
+        assert elems[3].a is elems[2]
+
+    def test_reopens_nested_and_linked_elements_like_app(self, path):
+        def open_like_app():  # same steps as app.run
+            eb = EventBus()
+            model = CanvasModel(eb, max_history_entries=1000,
+                                max_catchup_entries=1000)
+            journal = Journal(path)
+            model.elems = journal.load() or [E(20, 30, 40, 50)]
+            journal.compact(model.elems)
+            journal.attach(eb)
+            return model, journal
+
+        model, journal = open_like_app()
+        parent, other = R(0, 0, 100, 100), E(200, 200, 10, 10)
+        model.commit([Insert(parent), Insert(other)])
+        child = R(10, 10, 10, 10, parent)
+        model.commit([Insert(child), Insert(Link(parent, other))])
+        model.commit([Insert(Link(child, other))])
+        saved = list(model.elems)
+        journal.close()
+
+        model, journal = open_like_app()
+        assert model.elems == saved
+        assert model.get_children(parent) == [child]
+        assert len(model.get_links_for(other)) == 2
+        model.commit(model.move(parent, 5, 5))  # keeps recording
+        moved = list(model.elems)
+        journal.close()
+
+        model, journal = open_like_app()
+        journal.close()
+        assert model.elems == moved
+        assert model.get_children(moved[1]) == [moved[3]]
+
+    def test_records_undo_and_redo(self, path):
+        model, journal = open_model(path)
+        model.commit([Insert(R(1, 1, 1, 1))])
+        model.commit([Insert(R(2, 2, 2, 2))])
+        model.undo()
+        assert reload(path) == [R(1, 1, 1, 1)]
+        model.redo()
+        model.undo()
+        model.undo()
+        journal.close()
+        assert reload(path) == []
+
+    def test_continues_existing_document(self, path):
+        model, journal = open_model(path)
+        model.commit([Insert(R(1, 1, 1, 1)), Insert(R(2, 2, 2, 2))])
+        journal.close()
+        model, journal = open_model(path)
+        model.commit([Remove(R(1, 1, 1, 1))])
+        model.commit([Insert(R(3, 3, 3, 3))])
+        journal.close()
+        assert reload(path) == [R(2, 2, 2, 2), R(3, 3, 3, 3)]
+
+    def test_loading_starts_from_last_snapshot(self, path):
+        model, journal = open_model(path)
+        model.commit([Insert(R(1, 1, 1, 1))])
+        journal.snapshot(model.elems)
+        model.commit([Insert(R(2, 2, 2, 2))])
+        journal.close()
+        assert [r[0] for r in records(path)] == [
+            'snapshot', 'commit', 'snapshot', 'commit']
+        assert reload(path) == [R(1, 1, 1, 1), R(2, 2, 2, 2)]
+
+    def test_compact_leaves_single_snapshot(self, path):
+        model, journal = open_model(path)
+        for i in range(10):
+            model.commit([Insert(R(i, i, 1, 1))])
+        journal.compact(model.elems)
+        model.commit([Remove(R(0, 0, 1, 1))])
+        journal.close()
+        assert [r[0] for r in records(path)] == ['snapshot', 'commit']
+        assert reload(path) == model.elems
+
+    def test_discards_incomplete_last_record(self, path):
+        model, journal = open_model(path)
+        model.commit([Insert(R(1, 1, 1, 1))])
+        journal.close()
+        with open(path, 'ab') as f:
+            f.write('["commit",[["+",1,')  # interrupted write
+        model, journal = open_model(path)
+        assert model.elems == [R(1, 1, 1, 1)]
+        model.commit([Insert(R(2, 2, 2, 2))])
+        journal.close()
+        assert reload(path) == [R(1, 1, 1, 1), R(2, 2, 2, 2)]
+
+    def test_raises_on_corrupted_document(self, path):
+        with open(path, 'wb') as f:
+            f.write('["snapshot",1,[]]\nnot json\n["commit",[]]\n')
+        with pytest.raises(ValueError):
+            Journal(path).load()
+
+    def test_raises_on_unknown_element(self, path):
+        with open(path, 'wb') as f:
+            f.write('["snapshot",1,[]]\n["commit",[["-",7]]]\n')
+        with pytest.raises(ValueError) as err:
+            Journal(path).load()
+        assert err.value.message == "Unknown element id 7"
+
+    def test_rejects_elements_referencing_by_ref(self, path):
+        journal = Journal(path)
+        journal.load()
+        parent = R(0, 0, 10, 10)
+        journal.append([Insert(parent)])
+        with pytest.raises(ValueError):
+            journal.append([Insert(R(1, 1, 1, 1, Ref(0)))])
+        with pytest.raises(ValueError):
+            journal.snapshot([parent, Link(Ref(0), parent)])
+        journal.close()
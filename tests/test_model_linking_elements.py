@@ -1,4 +1,11 @@
 import pytest
+import random
+from hsmpy import EventBus
+from my_project.model.elements import Rectangle as R
+from my_project.model.elements import Link
+from my_project.model.CanvasModel import CanvasModel, Insert, Modify
+from my_project.model.CanvasModel import get_links_for, get_links_between
+from my_project.model.store import ElementStore
 
 
 def test_get_links_for_element():
@@ -25,6 +32,101 @@ def test_get_links_for_element():
     assert links_el3 == [l3, l4, l5, l6, l7]
 
 
+
+def test_get_links_for_element_in_store():
+    el1 = R(1, 2, 3, 4)
+    el2 = R(2, 3, 4, 5)
+    el3 = R(3, 4, 5, 6)
+    l1 = Link(el1, el2)
+    l2 = Link(el2, el1)
+    l3 = Link(el1, el3)
+    l5 = Link(el3, el1)
+    l6 = Link(el2, el3)
+    l7 = Link(el3, el3)
+
+    store = ElementStore([el1, el2, el3, l1, l2, l3, l5, l6, l7])
+
+    assert get_links_for(el1, store) == [l1, l2, l3, l5]
+    assert get_links_for(el2, store) == [l1, l2, l6]
+    assert get_links_for(el3, store) == [l3, l5, l6, l7]
+    assert store.links_from(el1) == [l1, l3]
+    assert store.links_to(el1) == [l2, l5]
+
+    assert get_links_between(el1, el2, store) == [l1, l2]
+    assert get_links_between(el2, el1, store) == [l1, l2]
+    assert get_links_between(el3, el3, store) == [l7]
+    assert get_links_between(el1, el1, store) == []
+
+
+def test_link_index_follows_changes():
+    el1 = R(1, 2, 3, 4)
+    el2 = R(2, 3, 4, 5)
+    new_el2 = R(9, 9, 9, 9)
+    l1 = Link(el1, el2)
+    l2 = Link(el2, el2)
+    store = ElementStore([el1, el2, l1, l2])
+
+    store.replace(el2, new_el2)
+    store.replace(l1, Link(el1, new_el2))
+    assert get_links_for(el2, store) == [l2]
+    assert get_links_for(new_el2, store) == [Link(el1, new_el2)]
+    assert get_links_for(el1, store) == [Link(el1, new_el2)]
+
+    store.remove(l2)
+    assert get_links_for(el2, store) == []
+    store.remove(Link(el1, new_el2))
+    assert get_links_for(el1, store) == []
+    assert get_links_for(new_el2, store) == []
+
+
+def test_retargeted_link_takes_its_paint_order_position():
+    el1, el2, el3 = R(1, 1, 1, 1), R(2, 2, 2, 2), R(3, 3, 3, 3)
+    l1, l2, l3 = Link(el1, el2), Link(el2, el3), Link(el3, el2)
+    store = ElementStore([el1, el2, el3, l1, l2, l3])
+    store.replace(l1, Link(el3, el1))
+    assert store.links_from(el3) == [Link(el3, el1), l3]
+    assert store.links_to(el1) == [Link(el3, el1)]
+    store.replace(l2, Link(el2, el1))
+    assert store.links_to(el1) == [Link(el3, el1), Link(el2, el1)]
+    assert store.links_for(el1) == [Link(el3, el1), Link(el2, el1)]
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_indexes_match_scan_after_random_changes(seed):
+    rnd = random.Random(seed)
+    model = CanvasModel(EventBus())
+    for step in range(60):
+        elems = [el for el in model.elems if not isinstance(el, Link)]
+        action = rnd.choice(['insert', 'link', 'move', 'reparent', 'undo',
+                             'goto'])
+        if action == 'insert' or len(elems) < 2:
+            parent = rnd.choice(elems + [None] * 3)
+            model.commit([Insert(R(step, step, 1, 1, parent))])
+        elif action == 'link':
+            lnk = Link(*rnd.sample(elems, 2))
+            if lnk not in model.elems:
+                model.commit([Insert(lnk)])
+        elif action == 'move':
+            model.commit(model.move(rnd.choice(elems), 100, 0))
+        elif action == 'reparent':
+            # links and children would have to be updated along
+            free = [e for e in elems if not model.get_children(e)
+                    and not model.get_links_for(e)]
+            el = rnd.choice(free) if free else None
+            parent = rnd.choice(elems + [None])
+            if el is not None and parent not in (el, el.parent):
+                model.commit([Modify(el, el._replace(parent=parent))])
+        elif action == 'undo' and model.revision > 0:
+            model.undo()
+        elif action == 'goto':
+            model.goto_revision(rnd.randint(0, model.revision))
+        elems = list(model.elems)
+        for el in elems:
+            assert model._elems.children_of(el) == [
+                ch for ch in elems if ch.parent == el]
+            assert model.get_links_for(el) == [
+                l for l in elems if isinstance(l, Link) and el in (l.a, l.b)]
+
 # link with nested element
 
 # model should check on commit:
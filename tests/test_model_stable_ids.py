@@ -0,0 +1,157 @@
+import pytest
+from hsmpy import EventBus
+from my_project.model import Insert, Modify, Remove, CanvasModel, Ref
+from my_project.model.elements import Rectangle as R, Link as L
+from my_project.model.store import ElementStore
+
+
+class Test_ElementStore_stable_ids:
+    def setup_method(self, method):
+        self.store = ElementStore(stable_ids=True)
+        self.parent = R(0, 0, 10, 10)
+        self.store.append(self.parent)
+        self.child = R(1, 1, 1, 1, self.store.ref(self.parent))
+        self.store.append(self.child)
+
+    def test_ref_resolves_to_element(self):
+        ref = self.store.ref(self.parent)
+        assert isinstance(ref, Ref)
+        assert self.store.resolve(ref) is self.parent
+        assert self.store.resolve(self.parent) is self.parent
+        assert ref in self.store
+
+    def test_ref_to_missing_element_raises(self):
+        with pytest.raises(ValueError):
+            self.store.ref(R(5, 5, 5, 5))
+
+    def test_ref_returns_element_without_stable_ids(self):
+        store = ElementStore([self.parent])
+        assert store.ref(self.parent) is self.parent
+
+    def test_replaced_element_keeps_id(self):
+        ref = self.store.ref(self.parent)
+        moved = self.parent.move(5, 5)
+        self.store.replace(self.parent, moved)
+        assert self.store.ref(moved) == ref
+        assert self.store.resolve(ref) is moved
+        assert self.store.children_of(moved) == [self.child]
+        assert self.store.ancestors(self.child) == [moved]
+
+    def test_removed_element_gets_id_back(self):
+        ref = self.store.ref(self.parent)
+        self.store.remove(self.parent)
+        assert ref not in self.store
+        assert self.store.resolve(ref) is None
+        self.store.append(self.parent)
+        assert self.store.ref(self.parent) == ref
+
+    def test_taken_id_is_not_given_back(self):
+        ref = self.store.ref(self.parent)
+        moved = self.parent.move(5, 5)
+        self.store.replace(self.parent, moved)
+        self.store.append(self.parent)
+        assert self.store.ref(self.parent) != ref
+        assert self.store.ref(moved) == ref
+
+    def test_raises_on_element_referenced_by_value(self):
+        with pytest.raises(ValueError):
+            self.store.append(R(2, 2, 1, 1, self.parent))
+        with pytest.raises(ValueError):
+            self.store.append(L(self.parent, self.store.ref(self.child)))
+        with pytest.raises(ValueError):
+            self.store.replace(self.child, R(2, 2, 1, 1, self.parent))
+        assert self.store.children_of(self.parent) == [self.child]
+
+    def test_links_found_by_element_and_ref(self):
+        other = R(20, 20, 5, 5)
+        self.store.append(other)
+        lnk = L(self.store.ref(self.parent), self.store.ref(other))
+        self.store.append(lnk)
+        assert self.store.links_for(self.parent) == [lnk]
+        assert self.store.links_to(self.store.ref(other)) == [lnk]
+        assert self.store.links_between(other, self.parent) == [lnk]
+
+
+
+class Test_CanvasModel_stable_ids:
+    def setup_method(self, method):
+        self.model = CanvasModel(EventBus(), stable_ids=True)
+        self.root = R(0, 0, 100, 100)
+        self.model.commit([Insert(self.root)])
+        ref = self.model.ref(self.root)
+        self.children = [R(i, i, 1, 1, ref) for i in range(10)]
+        self.model.commit([Insert(ch) for ch in self.children])
+        grandparent = self.model.ref(self.children[0])
+        self.grandchild = R(0, 0, 1, 1, grandparent)
+        self.other = R(200, 200, 10, 10)
+        self.model.commit([Insert(self.grandchild), Insert(self.other)])
+        self.link = L(self.model.ref(self.root), self.model.ref(self.other))
+        self.model.commit([Insert(self.link)])
+
+    def test_moving_container_changes_only_container(self):
+        changes = self.model.move(self.root, 5, 5)
+        assert changes == [Modify(self.root, self.root.move(5, 5))]
+        self.model.commit(changes)
+        moved = self.root.move(5, 5)
+        assert self.model.get_children(moved) == self.children
+        assert self.model.get_descendants(moved) == (self.children
+                                                     + [self.grandchild])
+        assert self.model.get_links_for(moved) == [self.link]
+        assert self.model.resolve(self.link.a) == moved
+
+    def test_moving_child_with_its_container_moves_container_only(self):
+        changes = self.model.move([self.children[0], self.root], 1, 1)
+        assert changes == [Modify(self.root, self.root.move(1, 1))]
+
+    def test_undo_and_redo_move(self):
+        self.model.commit(self.model.move(self.root, 5, 5))
+        self.model.undo()
+        assert self.model.resolve(self.link.a) is self.root
+        assert self.model.get_children(self.root) == self.children
+        self.model.redo()
+        assert self.model.resolve(self.link.a) == self.root.move(5, 5)
+
+    def test_undo_remove_restores_references(self):
+        self.model.commit([Remove(self.link)])
+        self.model.commit([Remove(self.other)])
+        assert self.model.resolve(self.link.b) is None
+        self.model.goto_revision(self.model.revision - 2)
+        assert self.model.resolve(self.link.b) is self.other
+        assert self.model.get_links_for(self.other) == [self.link]
+
+    def test_undo_remove_of_modified_element_restores_references(self):
+        moved = self.other.move(1, 1)
+        self.model.commit([Modify(self.other, moved)])
+        self.model.commit([Remove(self.link)])
+        self.model.commit([Remove(moved)])
+        self.model.goto_revision(self.model.revision - 3)
+        assert self.model.resolve(self.link.b) is self.other
+
+    def test_validates_refs(self):
+        self.model.commit([Insert(R(1, 2, 3, 4, self.model.ref(self.root)))])
+        gone = self.model.ref(self.other)
+        self.model.commit([Remove(self.link)])
+        self.model.commit([Remove(self.other)])
+        with pytest.raises(ValueError) as err:
+            self.model.commit([Insert(R(1, 2, 3, 4, gone))])
+        assert err.value.message == "Element's parent must be member of " \
+                                    "same model"
+        with pytest.raises(ValueError) as err:
+            self.model.commit([Insert(L(self.model.ref(self.root), gone))])
+        assert err.value.message == "Link's targets must be member of same " \
+                                    "model"
+
+    def test_rejects_parents_and_targets_given_by_value(self):
+        for changes in [[Insert(R(1, 2, 3, 4, self.root))],
+                        [Insert(L(self.root, self.model.ref(self.other)))],
+                        [Modify(self.link, L(self.model.ref(self.root),
+                                             self.other))],
+                        [Modify(self.other, self.other._replace(
+                            parent=self.root))]]:
+            with pytest.raises(ValueError) as err:
+                self.model.commit(changes)
+            assert err.value.message == "Parents and link targets must be " \
+                                        "Refs when keeping stable ids"
+        moved = self.root.move(5, 5)
+        self.model.commit(self.model.move(self.root, 5, 5))
+        assert self.model.get_children(moved) == self.children
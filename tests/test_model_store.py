@@ -0,0 +1,231 @@
+import pytest
+from my_project.model.store import ElementStore, ElementsView
+from my_project.model.elements import Rectangle as R, Ellipse as E, Link
+
+
+class Test_ElementStore:
+    def test_empty(self):
+        st = ElementStore()
+        assert len(st) == 0
+        assert list(st) == []
+        assert st == []
+
+    def test_keeps_insertion_order(self):
+        st = ElementStore([R(3, 3, 3, 3), R(1, 1, 1, 1), R(2, 2, 2, 2)])
+        assert st == [R(3, 3, 3, 3), R(1, 1, 1, 1), R(2, 2, 2, 2)]
+        assert [R(3, 3, 3, 3), R(1, 1, 1, 1), R(2, 2, 2, 2)] == st
+
+    def test_membership(self):
+        st = ElementStore([R(1, 1, 1, 1)])
+        assert R(1, 1, 1, 1) in st
+        assert R(2, 2, 2, 2) not in st
+        assert E(1, 1, 1, 1) not in st
+
+    def test_append(self):
+        st = ElementStore([R(1, 1, 1, 1)])
+        st.append(R(2, 2, 2, 2))
+        assert st == [R(1, 1, 1, 1), R(2, 2, 2, 2)]
+
+    def test_append_raises_on_duplicate(self):
+        st = ElementStore([R(1, 1, 1, 1)])
+        with pytest.raises(ValueError):
+            st.append(R(1, 1, 1, 1))
+
+    def test_remove(self):
+        st = ElementStore([R(1, 1, 1, 1), R(2, 2, 2, 2), R(3, 3, 3, 3)])
+        st.remove(R(2, 2, 2, 2))
+        assert st == [R(1, 1, 1, 1), R(3, 3, 3, 3)]
+        assert R(2, 2, 2, 2) not in st
+        with pytest.raises(ValueError):
+            st.remove(R(2, 2, 2, 2))
+
+    def test_replace_keeps_position(self):
+        st = ElementStore([R(1, 1, 1, 1), R(2, 2, 2, 2), R(3, 3, 3, 3)])
+        st.replace(R(2, 2, 2, 2), R(5, 5, 5, 5))
+        assert st == [R(1, 1, 1, 1), R(5, 5, 5, 5), R(3, 3, 3, 3)]
+        assert R(2, 2, 2, 2) not in st
+        assert R(5, 5, 5, 5) in st
+
+    def test_replace_raises_on_invalid_elements(self):
+        st = ElementStore([R(1, 1, 1, 1), R(2, 2, 2, 2)])
+        with pytest.raises(ValueError):
+            st.replace(R(9, 9, 9, 9), R(5, 5, 5, 5))
+        with pytest.raises(ValueError):
+            st.replace(R(1, 1, 1, 1), R(2, 2, 2, 2))
+        assert st == [R(1, 1, 1, 1), R(2, 2, 2, 2)]
+
+    def test_partitioned_by_type(self):
+        r1, r2, e = R(1, 1, 1, 1), R(2, 2, 2, 2), E(3, 3, 3, 3)
+        l = Link(r1, e)
+        st = ElementStore([r1, e, l, r2])
+        assert st.of_type(R) == [r1, r2]
+        assert st.of_type(E) == [e]
+        assert st.of_type(Link) == [l]
+        st.replace(r1, R(9, 9, 9, 9))
+        st.remove(e)
+        assert st.of_type(R) == [R(9, 9, 9, 9), r2]
+        assert st.of_type(E) == []
+
+    def test_partition_keeps_paint_order_when_type_changes(self):
+        st = ElementStore([R(1, 1, 1, 1), E(2, 2, 2, 2), E(3, 3, 3, 3)])
+        st.replace(R(1, 1, 1, 1), E(1, 1, 1, 1))
+        assert st.of_type(E) == [E(1, 1, 1, 1), E(2, 2, 2, 2),
+                                 E(3, 3, 3, 3)]
+        assert st.of_type(E) == list(st)
+        st.replace(E(2, 2, 2, 2), R(2, 2, 2, 2))
+        assert st.of_type(E) == [E(1, 1, 1, 1), E(3, 3, 3, 3)]
+        assert st.of_type(R) == [R(2, 2, 2, 2)]
+
+    def test_snapshot(self):
+        st = ElementStore([R(1, 1, 1, 1), R(2, 2, 2, 2)])
+        snap = st.snapshot()
+        assert snap == (R(1, 1, 1, 1), R(2, 2, 2, 2))
+        assert st.snapshot() is snap  # not copied again while unchanged
+        st.append(R(3, 3, 3, 3))
+        st.replace(R(1, 1, 1, 1), R(9, 9, 9, 9))
+        assert snap == (R(1, 1, 1, 1), R(2, 2, 2, 2))
+        assert st.snapshot() == (R(9, 9, 9, 9), R(2, 2, 2, 2), R(3, 3, 3, 3))
+        st.remove(R(2, 2, 2, 2))
+        assert st.snapshot() == (R(9, 9, 9, 9), R(3, 3, 3, 3))
+
+
+class Test_ElementsView:
+    def setup_method(self, method):
+        self.st = ElementStore([R(1, 1, 1, 1), R(2, 2, 2, 2)])
+
+    def test_sequence(self):
+        view = self.st.view()
+        assert isinstance(view, ElementsView)
+        assert len(view) == 2
+        assert list(view) == [R(1, 1, 1, 1), R(2, 2, 2, 2)]
+        assert view[1] == R(2, 2, 2, 2)
+        assert view[-1] == R(2, 2, 2, 2)
+        assert view[:1] == (R(1, 1, 1, 1),)
+        assert view.index(R(2, 2, 2, 2)) == 1
+        assert view == [R(1, 1, 1, 1), R(2, 2, 2, 2)]
+        assert view + [R(3, 3, 3, 3)] == [R(1, 1, 1, 1), R(2, 2, 2, 2),
+                                          R(3, 3, 3, 3)]
+
+    def test_membership(self):
+        view = self.st.view()
+        assert R(1, 1, 1, 1) in view
+        assert R(3, 3, 3, 3) not in view
+
+    def test_read_only(self):
+        view = self.st.view()
+        with pytest.raises(TypeError):
+            view[0] = R(3, 3, 3, 3)
+        with pytest.raises(AttributeError):
+            view.append(R(3, 3, 3, 3))
+
+    def test_reused_until_store_changes(self):
+        view = self.st.view()
+        assert self.st.view() is view
+        self.st.append(R(3, 3, 3, 3))
+        assert self.st.view() is not view
+
+    def test_keeps_state_after_store_changes(self):
+        view = self.st.view()
+        self.st.replace(R(1, 1, 1, 1), R(9, 9, 9, 9))
+        self.st.append(R(3, 3, 3, 3))
+        assert view == [R(1, 1, 1, 1), R(2, 2, 2, 2)]
+        assert R(1, 1, 1, 1) in view
+        assert R(9, 9, 9, 9) not in view
+        assert self.st.view() == [R(9, 9, 9, 9), R(2, 2, 2, 2),
+                                  R(3, 3, 3, 3)]
+
+    def test_store_changes_dont_copy_view(self):
+        view = self.st.view()
+        self.st.append(R(3, 3, 3, 3))
+        self.st.remove(R(1, 1, 1, 1))
+        assert view._elems is None
+        assert view == [R(1, 1, 1, 1), R(2, 2, 2, 2)]
+
+    def test_rolls_back_mixed_changes(self):
+        view = self.st.view()
+        self.st.remove(R(1, 1, 1, 1))
+        self.st.append(R(1, 1, 1, 1))
+        self.st.replace(R(2, 2, 2, 2), R(9, 9, 9, 9))
+        self.st.append(R(3, 3, 3, 3))
+        self.st.replace(R(9, 9, 9, 9), R(8, 8, 8, 8))
+        self.st.remove(R(3, 3, 3, 3))
+        later = self.st.view()
+        self.st.remove(R(8, 8, 8, 8))
+        assert view == [R(1, 1, 1, 1), R(2, 2, 2, 2)]
+        assert later == [R(8, 8, 8, 8), R(1, 1, 1, 1)]
+        assert R(8, 8, 8, 8) not in view
+        assert self.st.view() == [R(1, 1, 1, 1)]
+
+    def test_membership_by_ref_after_store_changes(self):
+        st = ElementStore(stable_ids=True)
+        st.append(R(1, 1, 1, 1))
+        st.append(R(2, 2, 2, 2))
+        first, second = st.ref(R(1, 1, 1, 1)), st.ref(R(2, 2, 2, 2))
+        view = st.view()
+        st.remove(R(1, 1, 1, 1))
+        st.replace(R(2, 2, 2, 2), R(9, 9, 9, 9))
+        st.append(R(3, 3, 3, 3))
+        assert first in view
+        assert second in view
+        assert st.ref(R(3, 3, 3, 3)) not in view
+        assert first not in st.view()
+
+
+class Test_ElementStore_hierarchy:
+    def setup_method(self, method):
+        self.root = R(0, 0, 100, 100)
+        self.par = R(1, 1, 50, 50, self.root)
+        self.ch1 = R(2, 2, 5, 5, self.par)
+        self.ch2 = E(3, 3, 5, 5, self.par)
+        self.other = R(9, 9, 9, 9)
+        self.st = ElementStore([self.root, self.par, self.ch1, self.other,
+                                self.ch2])
+
+    def test_children_of(self):
+        assert self.st.children_of(self.root) == [self.par]
+        assert self.st.children_of(self.par) == [self.ch1, self.ch2]
+        assert self.st.children_of(self.ch1) == []
+        assert self.st.children_of(R(7, 7, 7, 7)) == []
+
+    def test_ancestors(self):
+        assert self.st.ancestors(self.ch2) == [self.par, self.root]
+        assert self.st.ancestors(self.par) == [self.root]
+        assert self.st.ancestors(self.root) == []
+
+    def test_descendants(self):
+        assert self.st.descendants(self.root) == [self.par, self.ch1,
+                                                  self.ch2]
+        assert self.st.descendants(self.par) == [self.ch1, self.ch2]
+        assert self.st.descendants(self.other) == []
+
+    def test_index_follows_removal(self):
+        self.st.remove(self.ch1)
+        assert self.st.children_of(self.par) == [self.ch2]
+        self.st.remove(self.ch2)
+        assert self.st.children_of(self.par) == []
+
+    def test_index_follows_reparenting(self):
+        moved = self.ch1._replace(parent=self.other)
+        self.st.replace(self.ch1, moved)
+        assert self.st.children_of(self.par) == [self.ch2]
+        assert self.st.children_of(self.other) == [moved]
+
+    def test_reparented_child_takes_its_paint_order_position(self):
+        moved = self.other._replace(parent=self.par)
+        self.st.replace(self.other, moved)
+        assert self.st.children_of(self.par) == [self.ch1, moved, self.ch2]
+        moved = self.ch2._replace(parent=self.root)
+        self.st.replace(self.ch2, moved)
+        assert self.st.children_of(self.root) == [self.par, moved]
+
+    def test_index_keeps_order_when_parent_is_equal_copy(self):
+        par_copy = R(1, 1, 50, 50, R(0, 0, 100, 100))
+        assert par_copy == self.par and par_copy is not self.par
+        self.st.replace(self.ch1, self.ch1._replace(parent=par_copy, x=7))
+        assert self.st.children_of(self.par) == [
+            self.ch1._replace(x=7), self.ch2]
+
+    def test_index_keeps_order_of_modified_child(self):
+        self.st.replace(self.ch1, self.ch1.move(1, 1))
+        assert self.st.children_of(self.par) == [self.ch1.move(1, 1),
+                                                 self.ch2]
@@ -0,0 +1,225 @@
+import pytest
+from hsmpy import EventBus
+from my_project.events import Model_Changed
+from my_project.model import Remove, Modify, Insert, CanvasModel
+from my_project.model.elements import Rectangle as R, Link as L
+from my_project.model.CanvasModel import _normalize
+
+
+class Test_normalize:
+    def test_empty(self):
+        assert _normalize([]) == []
+        assert _normalize([[], []]) == []
+
+    def test_independent_changes_are_kept(self):
+        assert _normalize([
+            [Insert(R(1, 1, 1, 1))],
+            [Remove(R(2, 2, 2, 2))],
+            [Modify(R(3, 3, 3, 3), R(4, 4, 4, 4))],
+        ]) == [
+            Remove(R(2, 2, 2, 2)),
+            Modify(R(3, 3, 3, 3), R(4, 4, 4, 4)),
+            Insert(R(1, 1, 1, 1)),
+        ]
+
+    def test_chained_modifications_are_merged(self):
+        assert _normalize([
+            [Modify(R(1, 1, 1, 1), R(2, 2, 2, 2))],
+            [Modify(R(2, 2, 2, 2), R(3, 3, 3, 3))],
+        ]) == [Modify(R(1, 1, 1, 1), R(3, 3, 3, 3))]
+
+    def test_modification_of_inserted_becomes_insert(self):
+        assert _normalize([
+            [Insert(R(1, 1, 1, 1))],
+            [Modify(R(1, 1, 1, 1), R(2, 2, 2, 2))],
+        ]) == [Insert(R(2, 2, 2, 2))]
+
+    def test_removal_of_modified_becomes_removal_of_original(self):
+        assert _normalize([
+            [Modify(R(1, 1, 1, 1), R(2, 2, 2, 2))],
+            [Remove(R(2, 2, 2, 2))],
+        ]) == [Remove(R(1, 1, 1, 1))]
+
+    @pytest.mark.parametrize('changelists', [
+        [[Insert(R(1, 1, 1, 1))], [Remove(R(1, 1, 1, 1))]],
+        [[Remove(R(1, 1, 1, 1))], [Insert(R(1, 1, 1, 1))]],
+        [[Modify(R(1, 1, 1, 1), R(2, 2, 2, 2))],
+         [Modify(R(2, 2, 2, 2), R(1, 1, 1, 1))]],
+    ])
+    def test_changes_cancelling_out(self, changelists):
+        assert _normalize(changelists) == []
+
+    def test_original_coming_back_keeps_identity(self):
+        assert _normalize([
+            [Modify(R(1, 1, 1, 1), R(2, 2, 2, 2))],
+            [Insert(R(1, 1, 1, 1))],
+        ]) == [Insert(R(2, 2, 2, 2))]
+        assert _normalize([
+            [Modify(R(1, 1, 1, 1), R(2, 2, 2, 2))],
+            [Modify(R(3, 3, 3, 3), R(1, 1, 1, 1))],
+        ]) == [Modify(R(3, 3, 3, 3), R(2, 2, 2, 2))]
+
+    def test_raises_on_contradicting_changes(self):
+        with pytest.raises(ValueError) as err:
+            _normalize([[Remove(R(1, 1, 1, 1))], [Remove(R(1, 1, 1, 1))]])
+        assert "not in the model" in err.value.message
+        with pytest.raises(ValueError) as err:
+            _normalize([[Insert(R(1, 1, 1, 1))], [Insert(R(1, 1, 1, 1))]])
+        assert "already present" in err.value.message
+        with pytest.raises(ValueError) as err:
+            _normalize([[Insert(R(1, 1, 1, 1)), 'abc']])
+        assert "Invalid change" in err.value.message
+
+
+
+class Test_transaction:
+    def setup_method(self, method):
+        self.eb = EventBus()
+        self.events = []
+        self.eb.register(Model_Changed, lambda e: self.events.append(e))
+        self.model = CanvasModel(self.eb)
+        self.model.commit([Insert(R(1, 1, 1, 1)), Insert(R(2, 2, 2, 2))])
+        self.events[:] = []
+
+    def test_commits_once(self):
+        with self.model.transaction():
+            self.model.commit([Insert(R(3, 3, 3, 3))])
+            self.model.commit([Insert(R(4, 4, 4, 4))])
+            assert self.model.elems == [R(1, 1, 1, 1), R(2, 2, 2, 2)]
+            assert self.events == []
+        assert self.model.elems == [R(1, 1, 1, 1), R(2, 2, 2, 2),
+                                    R(3, 3, 3, 3), R(4, 4, 4, 4)]
+        assert len(self.events) == 1
+        assert self.events[0].data == [Insert(R(3, 3, 3, 3)),
+                                       Insert(R(4, 4, 4, 4))]
+        assert len(self.model._changelog) == 2
+        assert self.model._changelog[-1] == self.events[0].data
+
+    def test_allows_mixed_changes(self):
+        with self.model.transaction():
+            self.model.commit([Insert(R(3, 3, 3, 3))])
+            self.model.commit([Modify(R(3, 3, 3, 3), R(5, 5, 5, 5))])
+            self.model.commit([Remove(R(1, 1, 1, 1))])
+            self.model.commit([Modify(R(2, 2, 2, 2), R(6, 6, 6, 6))])
+        assert self.model.elems == [R(6, 6, 6, 6), R(5, 5, 5, 5)]
+        assert self.events[0].data == [
+            Remove(R(1, 1, 1, 1)),
+            Modify(R(2, 2, 2, 2), R(6, 6, 6, 6)),
+            Insert(R(5, 5, 5, 5)),
+        ]
+
+    def test_undo_and_redo_whole_transaction(self):
+        with self.model.transaction():
+            self.model.commit([Remove(R(1, 1, 1, 1))])
+            self.model.commit([Insert(R(3, 3, 3, 3))])
+        self.model.undo()
+        assert self.model.elems == [R(2, 2, 2, 2), R(1, 1, 1, 1)]
+        self.model.redo()
+        assert self.model.elems == [R(2, 2, 2, 2), R(3, 3, 3, 3)]
+        assert len(self.events) == 3
+
+    def test_nothing_committed_when_changes_cancel_out(self):
+        with self.model.transaction():
+            self.model.commit([Insert(R(3, 3, 3, 3))])
+            self.model.commit([Remove(R(3, 3, 3, 3))])
+        assert self.events == []
+        assert len(self.model._changelog) == 1
+
+    def test_inserts_parent_with_child(self):
+        parent = R(3, 3, 3, 3)
+        child = R(4, 4, 1, 1, parent)
+        with self.model.transaction():
+            self.model.commit([Insert(parent)])
+            self.model.commit([Insert(child)])
+        assert self.model.get_children(parent) == [child]
+        assert len(self.model._changelog) == 2
+
+    def test_inserts_link_with_its_targets(self):
+        a, b = R(3, 3, 3, 3), R(9, 9, 3, 3)
+        with self.model.transaction():
+            self.model.commit([Insert(a), Insert(b)])
+            self.model.commit([Insert(L(a, b))])
+        assert self.model.get_links_between(a, b) == [L(a, b)]
+
+    def test_link_to_missing_element_is_rejected(self):
+        with pytest.raises(ValueError):
+            with self.model.transaction():
+                self.model.commit([Insert(L(R(1, 1, 1, 1), R(3, 3, 3, 3)))])
+        assert self.model.elems == [R(1, 1, 1, 1), R(2, 2, 2, 2)]
+
+    def test_rollback_on_exception(self):
+        with pytest.raises(KeyError):
+            with self.model.transaction():
+                self.model.commit([Insert(R(3, 3, 3, 3))])
+                raise KeyError()
+        assert not self.model.in_transaction
+        assert self.model.elems == [R(1, 1, 1, 1), R(2, 2, 2, 2)]
+        assert self.events == []
+
+    def test_nested_transactions(self):
+        self.model.begin_transaction()
+        self.model.commit([Insert(R(3, 3, 3, 3))])
+        self.model.begin_transaction()
+        self.model.commit([Insert(R(4, 4, 4, 4))])
+        self.model.rollback_transaction()  # discards only inner changes
+        self.model.begin_transaction()
+        self.model.commit([Insert(R(5, 5, 5, 5))])
+        self.model.commit_transaction()
+        assert self.events == []
+        self.model.commit_transaction()
+        assert len(self.events) == 1
+        assert self.model.elems == [R(1, 1, 1, 1), R(2, 2, 2, 2),
+                                    R(3, 3, 3, 3), R(5, 5, 5, 5)]
+
+    def test_invalid_transaction_is_not_committed(self):
+        with pytest.raises(ValueError):
+            with self.model.transaction():
+                self.model.commit([Remove(R(1, 1, 1, 1))])
+                self.model.commit([Insert(R(2, 2, 2, 2))])
+        assert not self.model.in_transaction
+        assert self.model.elems == [R(1, 1, 1, 1), R(2, 2, 2, 2)]
+        assert self.events == []
+
+    def test_raises_when_not_in_transaction(self):
+        with pytest.raises(ValueError):
+            self.model.commit_transaction()
+        with pytest.raises(ValueError):
+            self.model.rollback_transaction()
+
+    def test_cant_undo_in_transaction(self):
+        with self.model.transaction():
+            with pytest.raises(ValueError):
+                self.model.undo()
+
+    def test_setting_elems_in_different_order(self):
+        self.model.elems = [R(2, 2, 2, 2), R(7, 7, 7, 7), R(1, 1, 1, 1)]
+        assert self.model.elems == [R(2, 2, 2, 2), R(7, 7, 7, 7),
+                                    R(1, 1, 1, 1)]
+        assert [e.data for e in self.events] == [
+            [Remove(R(1, 1, 1, 1))],
+            [Insert(R(7, 7, 7, 7)), Insert(R(1, 1, 1, 1))]]
+        self.model.undo()
+        assert self.model.elems == [R(2, 2, 2, 2)]
+        self.model.undo()
+        assert set(self.model.elems) == set([R(1, 1, 1, 1), R(2, 2, 2, 2)])
+        self.model.elems = [R(1, 1, 1, 1), R(2, 2, 2, 2)]
+        assert self.model.elems == [R(1, 1, 1, 1), R(2, 2, 2, 2)]
+
+    def test_invalid_reordering_keeps_elements(self):
+        with pytest.raises(ValueError):
+            self.model.elems = [R(2, 2, 2, 2), R(1, 1, 1, 1),
+                                R(3, 3, 3, 3, R(9, 9, 9, 9))]
+        assert set(self.model.elems) == set([R(1, 1, 1, 1), R(2, 2, 2, 2)])
+        assert self.model.revision == 1
+        self.model.elems = [R(1, 1, 1, 1), R(2, 2, 2, 2)]
+        with pytest.raises(ValueError):
+            with self.model.transaction():
+                self.model.elems = [R(2, 2, 2, 2), R(1, 1, 1, 1)]
+        assert self.model.elems == [R(1, 1, 1, 1), R(2, 2, 2, 2)]
+
+    def test_setting_elems_replaces_all_in_single_commit(self):
+        self.model.elems = [R(2, 2, 2, 2), R(7, 7, 7, 7)]
+        assert self.model.elems == [R(2, 2, 2, 2), R(7, 7, 7, 7)]
+        assert len(self.events) == 1
+        assert set(self.events[0].data) == set([Remove(R(1, 1, 1, 1)),
+                                                Insert(R(7, 7, 7, 7))])
@@ -81,8 +81,8 @@ class Test_undo:
             [ 'previous' ], [ 'changes' ],
         ]
         assert redo_log == [
-            [ Insert(R(1, 1, 1, 1)) ],
             [ 'future' ], [ 'changes'],
+            [ Insert(R(1, 1, 1, 1)) ],  # top of the stack
         ]
         assert model_elems == [ R(3, 3, 3, 3), R(2, 2, 2, 2) ]
 
@@ -104,8 +104,8 @@ class Test_undo:
             [ 'previous' ], [ 'changes' ],
         ]
         assert redo_log == [
-            [ Remove(R(1, 1, 1, 1)) ],
             [ 'future' ], [ 'changes'],
+            [ Remove(R(1, 1, 1, 1)) ],
         ]
         assert model_elems == [ R(2, 2, 2, 2), R(1, 1, 1, 1) ]
 
@@ -127,8 +127,8 @@ class Test_undo:
             [ 'previous' ], [ 'changes' ],
         ]
         assert redo_log == [
-            [ Modify(R(3, 3, 3, 3), R(1, 1, 1, 1)) ],
             [ 'future' ], [ 'changes'],
+            [ Modify(R(3, 3, 3, 3), R(1, 1, 1, 1)) ],
         ]
         assert model_elems == [ R(3, 3, 3, 3), R(2, 2, 2, 2) ]
 
@@ -149,7 +149,7 @@ class Test_redo:
     def test_redo_one_insert(self):
         change_log = [ [ 'previous' ], [ 'changes' ] ]
         model_elems = [ R(2, 2, 2, 2) ]
-        redo_log = [ [ Insert(R(1, 1, 1, 1)) ], [ 'future' ], [ 'changes'] ]
+        redo_log = [ [ 'future' ], [ 'changes'], [ Insert(R(1, 1, 1, 1)) ] ]
 
         _redo(change_log, redo_log, self.eb, model_elems)
 
@@ -167,7 +167,7 @@ class Test_redo:
     def test_redo_one_remove(self):
         change_log = [ [ 'previous' ], [ 'changes' ] ]
         model_elems = [ R(1, 1, 1, 1), R(2, 2, 2, 2) ]
-        redo_log = [ [ Remove(R(1, 1, 1, 1)) ], [ 'future' ], [ 'changes'] ]
+        redo_log = [ [ 'future' ], [ 'changes'], [ Remove(R(1, 1, 1, 1)) ] ]
 
         _redo(change_log, redo_log, self.eb, model_elems)
 
@@ -186,8 +186,8 @@ class Test_redo:
         change_log = [ [ 'previous' ], [ 'changes' ] ]
         model_elems = [ R(1, 1, 1, 1), R(2, 2, 2, 2) ]
         redo_log = [
+            [ 'future' ], [ 'changes'],
             [ Modify(R(1, 1, 1, 1), R(3, 3, 3, 3)) ],
-            [ 'future' ], [ 'changes']
         ]
 
         _redo(change_log, redo_log, self.eb, model_elems)
@@ -239,8 +239,8 @@ class Test_redo:
         assert model._elems == []
         assert model._changelog == []
         assert model._redolog == [
-            [ Insert(R(1, 1, 1, 1)) ],
             [ Insert(R(2, 2, 2, 2)) ],
+            [ Insert(R(1, 1, 1, 1)) ],  # redone next
         ]
 
         model.redo()
@@ -3,6 +3,7 @@ from my_project.model.elements import Rectangle as R
 from my_project.model.elements import Link
 from my_project.model import Remove, Modify, Insert
 from my_project.model.CanvasModel import _validate
+from my_project.model.store import ElementStore
 
 
 
@@ -207,3 +208,32 @@ def test_raises_when_modifying_link_target_into_element_not_in_existing(new):
     with pytest.raises(ValueError) as err:
         _validate([Modify(old, new)], elems)
     assert "target" in err.value.message
+
+
+def test_allows_modified_children_pointing_to_modified_parent():
+    par = R(1, 1, 100, 100)
+    child = R(2, 2, 5, 5, par)
+    new_par = par.move(10, 10)
+    cl = [
+        Modify(par, new_par),
+        Modify(child, child._replace(parent=new_par)),
+    ]
+    _validate(cl, [par, child])
+
+
+def test_raises_on_parent_not_in_model():
+    par = R(1, 1, 100, 100)
+    with pytest.raises(ValueError) as err:
+        _validate([Insert(R(2, 2, 5, 5, par))], elems)
+    assert "parent" in err.value.message
+
+
+def test_validates_against_element_store():
+    store = ElementStore(elems)
+    _validate([Modify(elems[0], R(1, 1, 1, 1))], store)
+    with pytest.raises(ValueError) as err:
+        _validate([Insert(elems[2])], store)
+    assert 'already present' in err.value.message
+    with pytest.raises(ValueError) as err:
+        _validate([Remove(R(9, 9, 9, 9))], store)
+    assert "Removing element that's not in the model" in err.value.message
@@ -0,0 +1,99 @@
+import random
+import pytest
+from my_project.spatial import SpatialIndex, NODE_CAPACITY
+
+
+def contains(b, x, y):
+    return b[0] <= x <= b[2] and b[1] <= y <= b[3]
+
+
+def overlap(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def inside(a, b):
+    return b[0] <= a[0] and a[2] <= b[2] and b[1] <= a[1] and a[3] <= b[3]
+
+
+def random_bounds(rnd, extent=1000, max_size=50):
+    x, y = rnd.uniform(-extent, extent), rnd.uniform(-extent, extent)
+    return (x, y, x + rnd.uniform(0, max_size), y + rnd.uniform(0, max_size))
+
+
+class Test_SpatialIndex:
+    def setup_method(self, method):
+        self.index = SpatialIndex()
+        self.rnd = random.Random(0)
+        self.items = {}  # item -> bounds, in order of insertion
+        self.order = []
+        for i in range(20 * NODE_CAPACITY):
+            self.insert(i, random_bounds(self.rnd))
+
+    def insert(self, item, bounds):
+        self.index.insert(item, bounds)
+        self.items[item] = bounds
+        self.order.append(item)
+
+    def expected(self, pred):
+        return [i for i in self.order if pred(self.items[i])]
+
+    def check_queries(self):
+        for _ in range(50):
+            x, y = self.rnd.uniform(-1100, 1100), self.rnd.uniform(-1100, 1100)
+            assert self.index.under(x, y) == self.expected(
+                lambda b: contains(b, x, y))
+            x2, y2 = x + self.rnd.uniform(0, 500), y + self.rnd.uniform(0, 500)
+            region = (x, y, x2, y2)
+            assert self.index.overlapping(region) == self.expected(
+                lambda b: overlap(b, region))
+            assert self.index.enclosed(region) == self.expected(
+                lambda b: inside(b, region))
+
+    def test_queries_match_linear_scan(self):
+        assert len(self.index) == len(self.items)
+        self.check_queries()
+
+    def test_remove(self):
+        for item in self.order[::3]:
+            self.index.remove(item)
+            del self.items[item]
+        self.order = [i for i in self.order if i in self.items]
+        assert len(self.index) == len(self.items)
+        self.check_queries()
+
+    def test_update_keeps_insertion_order(self):
+        for item in self.order[::2]:
+            bounds = random_bounds(self.rnd, extent=3000)
+            self.index.update(item, bounds)
+            self.items[item] = bounds
+            assert self.index.bounds(item) == bounds
+        self.check_queries()
+
+    def test_in_order(self):
+        items = self.order[::5]
+        shuffled = list(items)
+        self.rnd.shuffle(shuffled)
+        assert self.index.in_order(shuffled) == items
+        assert self.index.in_order(iter([])) == []
+
+    def test_grows_in_all_directions(self):
+        for bounds in [(5000, 5000, 5010, 5010), (-8000, 20, -7990, 30),
+                       (10, -9000, 20, -8990)]:
+            self.insert(len(self.order), bounds)
+        self.check_queries()
+        assert self.index.under(5005, 5005) == [len(self.order) - 3]
+
+    def test_many_items_at_same_place(self):
+        for i in range(5 * NODE_CAPACITY):
+            self.insert(('same', i), (1, 1, 1, 1))
+        assert self.index.under(1, 1) == self.expected(
+            lambda b: contains(b, 1, 1))
+
+    def test_invalid_operations(self):
+        with pytest.raises(ValueError):
+            self.index.insert(0, (0, 0, 1, 1))
+        with pytest.raises(ValueError):
+            self.index.remove('missing')
+        with pytest.raises(ValueError):
+            self.index.insert('inf', (0, 0, float('inf'), 1))
+        assert SpatialIndex().under(0, 0) == []
@@ -1,5 +1,7 @@
+import math
+import random
 import pytest
-from my_project.util import Dummy
+from my_project.util import Dummy, Record, simplify_polyline
 
 
 class Test_Dummy():
@@ -65,3 +67,81 @@ class Test_Dummy():
     def test_raise_on_unhashable_values(self):
         with pytest.raises(TypeError):
             Dummy(x=[])
+
+
+class Point(Record):
+    def __init__(self, x, y, parent=None):
+        self.x, self.y, self.parent = x, y, parent
+
+
+class Test_Record_slots():
+    def test_has_no_instance_dict(self):
+        assert not hasattr(Point(1, 2), '__dict__')
+
+    def test_hash_is_cached(self):
+        p = Point(1, 2, Point(3, 4))
+        assert p._hash == hash((Point, 1, 2, Point(3, 4)))
+        assert hash(p) == p._hash
+
+    def test_replace_computes_new_hash(self):
+        p = Point(1, 2)
+        p2 = p._replace(y=5)
+        assert hash(p2) == hash(Point(1, 5))
+        assert hash(p) == hash(Point(1, 2))
+
+    def test_not_equal(self):
+        assert not Point(1, 2) != Point(1, 2)
+        assert Point(1, 2) != Point(1, 3)
+        assert Point(1, 2, Point(0, 0)) != Point(1, 2, Point(0, 1))
+
+    def test_make_from_values(self):
+        p = Point._make((1, 2, None))
+        assert p == Point(1, 2)
+        assert hash(p) == hash(Point(1, 2))
+        with pytest.raises(TypeError):
+            p.x = 5
+        with pytest.raises(TypeError):
+            Point._make((1, 2))
+
+
+
+def distance_to_polyline(p, polyline):
+    def to_segment(a, b):
+        dx, dy = b[0] - a[0], b[1] - a[1]
+        length2 = float(dx * dx + dy * dy)
+        t = ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length2 \
+            if length2 else 0
+        t = min(1, max(0, t))
+        return math.hypot(a[0] + t * dx - p[0], a[1] + t * dy - p[1])
+    if len(polyline) == 1:
+        return math.hypot(p[0] - polyline[0][0], p[1] - polyline[0][1])
+    return min(to_segment(a, b) for a, b in zip(polyline, polyline[1:]))
+
+
+class Test_simplify_polyline():
+    def test_short_polylines_kept(self):
+        assert simplify_polyline([], 1) == []
+        assert simplify_polyline([(1, 2)], 1) == [(1, 2)]
+        assert simplify_polyline([(1, 2), (5, 6)], 1) == [(1, 2), (5, 6)]
+
+    def test_straight_line_keeps_endpoints(self):
+        line = [(x, 2 * x) for x in range(100)]
+        assert simplify_polyline(line, 0.1) == [(0, 0), (99, 198)]
+
+    def test_keeps_corners_larger_than_tolerance(self):
+        zigzag = [(0, 0), (10, 10), (20, 0), (30, 10)]
+        assert simplify_polyline(zigzag, 1) == zigzag
+        assert simplify_polyline(zigzag, 30) == [(0, 0), (30, 10)]
+
+    def test_deviation_within_tolerance(self):
+        rnd = random.Random(0)
+        walk = [(0.0, 0.0)]
+        for _ in range(500):
+            x, y = walk[-1]
+            walk.append((x + rnd.uniform(-1, 1), y + rnd.uniform(-1, 1)))
+        for tolerance in (0.5, 2, 10):
+            simplified = simplify_polyline(walk, tolerance)
+            assert simplified[0] == walk[0] and simplified[-1] == walk[-1]
+            assert len(simplified) < len(walk)
+            assert all(distance_to_polyline(p, simplified) <= tolerance
+                       for p in walk)